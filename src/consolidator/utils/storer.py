@@ -111,7 +111,9 @@ class Storer:
                     'score': decimal.Decimal(str(result['score'])),
                     'meta': {
                         'city': result['city'],
-                        'country_code': result['country_code']
+                        'country_code': result['country_code'],
+                        # winning provider, the router computes its fan-out from these
+                        'provider': result['provider']
                     }
                 }
 
@@ -0,0 +1,343 @@
+"""
+Daily quota budgets per provider and API key. Calls are counted per provider, key and day against
+the `budget` section of a provider in data/config.yml:
+
+    budget:
+      daily: 40000              # calls per API key per day
+      reserve: 0.2              # share of the daily budget kept for high priority tasks
+      timezone: US/Pacific      # time zone in which the day of the provider starts (UTC if not set)
+
+Low priority (bulk) traffic is paced over the day: at any time of the day it may only have spent
+the elapsed share of its budget, plus an hour of headroom (PACING_HEADROOM). A batch can therefore
+not burn the daily quota in the morning and starve the real-time updates of the afternoon. High
+priority tasks can use the whole budget, including the reserve.
+
+Tasks over budget are deferred until the pace allows them again (see BudgetDeferredError) and keys
+over budget are skipped until the day ends, instead of waiting for the provider to reject calls.
+
+Counts are shared by all workers through a counter store (DynamoDB when BUDGET_TABLE is set). Each
+worker fetches the shared count of a counter on its first use, counts locally and adds its calls to
+the shared counters at most every SYNC_INTERVAL seconds, so the counts of other workers are seen
+with a small delay. While the store is unavailable, workers keep counting locally and add their
+calls once it is back.
+"""
+import abc
+import collections
+import datetime
+import decimal
+import logging
+import math
+import os
+import threading
+import time
+
+import boto3
+import pytz
+from botocore.exceptions import BotoCoreError, ClientError
+
+from geocode import logger
+from geocode.helpers import BudgetDeferredError
+
+
+HIGH = 'high'               # real-time tasks, may use the reserve
+LOW = 'low'                 # bulk tasks, paced over the day
+
+DAY = 24 * 60 * 60
+PACING_HEADROOM = 1 / 24.0  # share of the day bulk traffic may run ahead of its pace
+RESERVE = 0.2               # share of the budget kept for high priority tasks if not configured
+SYNC_INTERVAL = 10          # seconds between syncs with the shared counters
+COUNTER_TTL = 2 * DAY       # seconds a shared counter is kept after its day ends
+STORE_ERRORS = (BotoCoreError, ClientError)
+
+
+class CounterStore(metaclass=abc.ABCMeta):
+    """
+    Store of call counters by name.
+    """
+    @abc.abstractmethod
+    def get(self, name : str) -> int:
+        """
+        Return the value of a counter, 0 if it does not exist.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add(self, name : str, amount : int, expires : float) -> int:
+        """
+        Add an amount to a counter and return its new value. The counter can be removed after the
+        expiry timestamp (epoch seconds).
+        """
+        raise NotImplementedError
+
+
+class MemoryCounterStore(CounterStore):
+    """
+    Counters kept in process memory.
+    """
+    def __init__(self):
+        self._counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            return self._counters[name]
+
+    def add(self, name, amount, expires):
+        with self._lock:
+            self._counters[name] += amount
+            return self._counters[name]
+
+
+class DynamoCounterStore(CounterStore):
+    """
+    Counters kept in a DynamoDB table with hash key 'name'. The expires attribute is the TTL
+    attribute of the table.
+    """
+    def __init__(self, table_name : str):
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def get(self, name):
+        item = self.table.get_item(Key={'name': name}, ConsistentRead=True).get('Item')
+
+        return int(item['calls']) if item else 0
+
+    def add(self, name, amount, expires):
+        response = self.table.update_item(
+            Key={'name': name},
+            UpdateExpression='ADD calls :amount SET expires = :expires',
+            ExpressionAttributeValues={
+                ':amount': decimal.Decimal(amount),
+                ':expires': decimal.Decimal(math.ceil(expires))
+            },
+            ReturnValues='UPDATED_NEW'
+        )
+
+        return int(response['Attributes']['calls'])
+
+
+def load_store():
+    """
+    Return the counter store for this environment.
+    """
+    if os.environ.get('BUDGET_TABLE'):
+        return DynamoCounterStore(os.environ['BUDGET_TABLE'])
+
+    return MemoryCounterStore()
+
+
+class Ledger:
+    """
+    Call counts per name and day. The shared count of a counter is fetched on first use, calls are
+    counted locally and added to the shared counters in batches, which also brings in the calls
+    counted by other workers.
+    """
+    def __init__(self, store : CounterStore, sync_interval=SYNC_INTERVAL):
+        self.store = store
+        self.sync_interval = sync_interval
+
+        self.totals = {}                        # shared count at the last sync
+        self.pending = collections.Counter()    # local calls not yet added to the shared count
+        self.expires = {}
+        self.synced = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def counter_name(name, day):
+        return '{name}@{day}'.format(name=name, day=day)
+
+    @staticmethod
+    def log_error(state, counter, error):
+        event = {
+            'state': state,
+            'value': {'counter': counter, 'error': str(error)}
+        }
+
+        logger.log_event(logging.WARNING, event)
+
+    def fetch(self, name : str, day : str):
+        """
+        Fetch the shared count of a counter unless it is known, so a new worker sees the calls of
+        other workers before its first sync.
+        """
+        with self._lock:
+            if (name, day) in self.totals:
+                return
+
+        try:
+            total = self.store.get(self.counter_name(name, day))
+        except STORE_ERRORS as error:
+            self.log_error('budget counter not fetched', self.counter_name(name, day), error)
+            total = 0
+
+        with self._lock:
+            self.totals.setdefault((name, day), total)
+
+    def count(self, name : str, day : str):
+        self.fetch(name, day)
+
+        with self._lock:
+            return self.totals.get((name, day), 0) + self.pending[(name, day)]
+
+    def spend(self, name : str, day : str, expires : float, amount=1):
+        self.fetch(name, day)
+
+        with self._lock:
+            self.pending[(name, day)] += amount
+            self.expires[(name, day)] = expires
+
+        self.sync()
+
+    def sync(self, force=False):
+        """
+        Add the local calls to the shared counters and refresh all counters of this worker. Calls
+        that could not be added are kept locally and added on the next sync. Counters this worker
+        did not spend on are fetched again on their next use.
+        """
+        with self._lock:
+            if not force and time.monotonic() - self.synced < self.sync_interval:
+                return
+
+            now = time.time()
+            counters = [(k, v) for k, v in self.expires.items() if v > now]
+            pending, self.pending = self.pending, collections.Counter()
+            self.expires = dict(counters)
+            self.synced = time.monotonic()
+
+        for (name, day), expires in counters:
+            try:
+                total = self.store.add(self.counter_name(name, day), pending[(name, day)], expires)
+            except STORE_ERRORS as error:
+                self.log_error('budget counter not synced', self.counter_name(name, day), error)
+
+                with self._lock:
+                    self.pending[(name, day)] += pending[(name, day)]
+
+                continue
+
+            with self._lock:
+                self.totals[(name, day)] = total
+
+        with self._lock:
+            for counter in list(self.totals):
+                if counter not in self.expires:
+                    del self.totals[counter]
+
+
+class Budget:
+    """
+    Daily budgets of all providers with a `budget` section, see the module documentation.
+    """
+    def __init__(self, config : dict, ledger=None):
+        self.config = config
+        self.ledger = ledger or Ledger(load_store())
+
+    def budget(self, provider : str):
+        """
+        Return the budget configuration of a provider, None if its calls are not budgeted.
+        """
+        return (self.config.get(provider) or {}).get('budget')
+
+    def day(self, provider : str, now=None):
+        """
+        Return the current day of a provider and the timestamps at which it starts and ends.
+        """
+        timezone = pytz.timezone(self.budget(provider).get('timezone', 'UTC'))
+        today = datetime.datetime.fromtimestamp(now or time.time(), tz=timezone).date()
+
+        start, end = [
+            timezone.localize(datetime.datetime.combine(date, datetime.time(0))).timestamp()
+            for date in (today, today + datetime.timedelta(days=1))
+        ]
+
+        return today.isoformat(), start, end
+
+    def spent(self, provider : str, name=None, now=None):
+        """
+        Return the number of calls of a provider (or one of its keys) on the current day.
+        """
+        day, _, _ = self.day(provider, now)
+
+        return self.ledger.count(name or provider, day)
+
+    def allowance(self, provider : str, priority : str, keys=1, now=None):
+        """
+        Return the number of calls a priority class may have spent at this time of the day.
+        """
+        budget = self.budget(provider)
+        limit = budget['daily'] * keys
+
+        if priority == HIGH:
+            return limit
+
+        _, start, end = self.day(provider, now)
+        elapsed = ((now or time.time()) - start) / (end - start)
+
+        return (1.0 - budget.get('reserve', RESERVE)) * limit * min(1.0, elapsed + PACING_HEADROOM)
+
+    def admit(self, provider : str, priority : str, keys=1, now=None):
+        """
+        Raise a BudgetDeferredError if a task of a priority class cannot be sent to a provider now,
+        with the time at which the pace allows it again.
+        """
+        budget = self.budget(provider)
+        if not budget:
+            return
+
+        spent = self.spent(provider, now=now)
+        if spent < self.allowance(provider, priority, keys, now):
+            return
+
+        _, start, end = self.day(provider, now)
+        paced = (1.0 - budget.get('reserve', RESERVE)) * budget['daily'] * keys
+
+        if priority == HIGH or spent >= paced:
+            available_at = end
+        else:
+            available_at = start + (spent / paced - PACING_HEADROOM) * (end - start)
+
+        raise BudgetDeferredError(provider, available_at)
+
+    def available(self, provider : str, name : str, now=None):
+        """
+        Whether a key (by key name) of a provider has budget left today.
+        """
+        budget = self.budget(provider)
+
+        return not budget or self.spent(provider, name, now) < budget['daily']
+
+    def spend(self, provider : str, name=None, now=None, calls=1):
+        """
+        Count calls to a provider, with the key name if the provider uses keys. A batch request
+        counts as one call per address.
+        """
+        if not self.budget(provider):
+            return
+
+        day, _, end = self.day(provider, now)
+
+        self.ledger.spend(provider, day, end + COUNTER_TTL, calls)
+
+        if name is not None and name != provider:
+            self.ledger.spend(name, day, end + COUNTER_TTL, calls)
+
+    def sync(self):
+        self.ledger.sync(force=True)
+
+    def log_statistics(self, now=None):
+        """
+        Log the calls spent today and the daily budget per provider.
+        """
+        for provider in self.config:
+            if not self.budget(provider):
+                continue
+
+            event = {
+                'state': 'budget statistics',
+                'field': 'calls',
+                'value': {
+                    'spent': self.spent(provider, now=now),
+                    'daily': self.budget(provider)['daily']
+                }
+            }
+
+            logger.log_event(logging.INFO, event, provider=provider)
@@ -0,0 +1,241 @@
+"""
+Bulk geocoding from the command line. Streams tasks from a CSV or JSON lines file through the
+provider layer and appends a result per row to a JSON lines file:
+
+    python -m geocode.bulk addresses.csv results.jsonl --provider osm --concurrency 8
+
+JSON lines rows hold tasks like the ones the lambda handler receives. CSV rows hold entity_id,
+entity_type, provider and batch_id columns, all other columns are address fields (guess_longitude
+and guess_latitude form the guess). --provider, --entity-type and --batch-id fill in missing values.
+Rows are bulk tasks (with a batch_id), so they are paced by the daily budgets (see budget).
+
+Rows are geocoded in chunks of --chunk-size: the tasks of each provider are sent as one chunk through
+Geocoder.geocode_many, so geocoders with a batch endpoint take them in batch requests, others get
+at most --concurrency requests at once (see main.geocode_tasks). Each output
+record carries the number of its row, and the output is flushed to disk after every chunk, so the
+output is the checkpoint of the run: running the same command again skips the rows that are already
+in the output (a torn last line is dropped). Rows that could not be geocoded for now (quota
+exhausted, over budget, server side faults) are not written and are sent again on the next run.
+"""
+import argparse
+import copy
+import csv
+import json
+import logging
+import os
+import sys
+
+import jsonschema
+
+from geocode import executor, helpers, logger, main
+
+
+CHUNK_SIZE = 1000
+BATCH_ID = 'bulk'
+TASK_FIELDS = ('entity_id', 'entity_type', 'provider', 'batch_id')
+
+
+def read_csv(f):
+    for row in csv.DictReader(f):
+        task = dict((k, row[k]) for k in TASK_FIELDS if row.get(k))
+        address = dict((k, v) for k, v in row.items() if k not in TASK_FIELDS and v)
+
+        if task.get('entity_id', '').isdigit():
+            task['entity_id'] = int(task['entity_id'])
+
+        if 'guess_longitude' in address and 'guess_latitude' in address:
+            address['guess'] = {
+                'longitude': float(address.pop('guess_longitude')),
+                'latitude': float(address.pop('guess_latitude'))
+            }
+
+        task['address'] = address
+
+        yield task
+
+
+def read_json_lines(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_tasks(path : str):
+    """
+    Yield the tasks of a CSV file (by extension) or a JSON lines file.
+    """
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            yield from read_csv(f)
+        else:
+            yield from read_json_lines(f)
+
+
+class FileSink:
+    """
+    Appends records to a JSON lines file. The rows of the records written by earlier runs are
+    known after opening the sink.
+    """
+    def __init__(self, path : str):
+        self.path = path
+        self.rows = set()
+
+        size = 0
+
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+
+                    self.rows.add(json.loads(line)['row'])
+                    size += len(line)
+
+        self.file = open(path, 'ab')
+        # drop a line torn by a crash
+        self.file.truncate(size)
+
+    def write(self, records : list):
+        for record in records:
+            self.file.write(json.dumps(record, default=str).encode('utf-8') + b'\n')
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+        self.rows.update(record['row'] for record in records)
+
+    def close(self):
+        self.file.close()
+
+
+def default_task(task : dict, defaults : dict):
+    for k, v in defaults.items():
+        if v is not None and not task.get(k):
+            task[k] = v
+
+    return task
+
+
+def geocode_chunk(chunk : list, concurrency=executor.WORKERS):
+    """
+    Geocode a chunk of (row, task) pairs. Return the records of the rows that are done, and the
+    number of rows to send again.
+    """
+    records, deferred = [], 0
+
+    valid = []
+    for row, task in chunk:
+        try:
+            jsonschema.validate(task, main.SCHEMA)
+            valid.append((row, task))
+        except jsonschema.ValidationError as error:
+            records.append(dict(row=row, status='INVALID TASK', status_code=-1, error=error.message))
+
+    tasks = main.canonicalize_tasks([task for _, task in valid])
+    outcomes = main.geocode_tasks(tasks, concurrency)
+
+    for (row, task), outcome in zip(valid, outcomes):
+        try:
+            if isinstance(outcome, Exception):
+                raise outcome
+
+            result = main.rebind_result(copy.deepcopy(outcome), task)
+            records.append(dict(result, row=row, status='OK', status_code=0))
+        except (helpers.NoResultsFoundError, helpers.InvalidRequestError) as error:
+            records.append(dict(
+                row=row,
+                entity_id=task['entity_id'],
+                entity_type=task['entity_type'],
+                provider=task['provider'],
+                status=error.status,
+                status_code=error.status_code
+            ))
+        except helpers.GeocoderError:
+            deferred += 1
+
+    records.sort(key=lambda record: record['row'])
+
+    return records, deferred
+
+
+def run(source : str, output : str, defaults : dict, concurrency=executor.WORKERS, chunk_size=CHUNK_SIZE):
+    """
+    Geocode the tasks of a source file into an output file, skipping rows already in the output.
+    Return the number of rows geocoded, skipped and deferred.
+    """
+    sink = FileSink(output)
+    counts = dict(geocoded=0, skipped=0, deferred=0)
+
+    def flush(chunk):
+        records, deferred = geocode_chunk(chunk, concurrency)
+        sink.write(records)
+
+        counts['geocoded'] += len(records)
+        counts['deferred'] += deferred
+
+        main.sync_budgets()
+        logger.log_event(logging.INFO, dict(state='bulk progress', value=dict(counts)))
+
+    try:
+        chunk = []
+
+        for row, task in enumerate(read_tasks(source)):
+            if row in sink.rows:
+                counts['skipped'] += 1
+                continue
+
+            chunk.append((row, default_task(task, defaults)))
+
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+
+        if chunk:
+            flush(chunk)
+    finally:
+        sink.close()
+
+    return counts
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m geocode.bulk',
+        description='Geocode a CSV or JSON lines file of tasks, resuming earlier runs.'
+    )
+    parser.add_argument('source', help='CSV (.csv) or JSON lines file of tasks')
+    parser.add_argument('output', help='JSON lines file the results are appended to')
+    parser.add_argument('--provider', help='provider of rows without one')
+    parser.add_argument('--entity-type', default='accommodation', help='entity type of rows without one')
+    parser.add_argument('--batch-id', default=BATCH_ID, help='batch ID of rows without one')
+    parser.add_argument('--concurrency', type=int, default=executor.WORKERS, help='concurrent requests per provider')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows per checkpoint')
+
+    return parser.parse_args(arguments)
+
+
+def cli(arguments=None):
+    """
+    Run the command line. Exits with status 1 if rows were deferred, run it again to send them.
+    """
+    arguments = parse_arguments(arguments)
+
+    counts = run(
+        arguments.source,
+        arguments.output,
+        dict(
+            provider=arguments.provider,
+            entity_type=arguments.entity_type,
+            batch_id=arguments.batch_id
+        ),
+        concurrency=arguments.concurrency,
+        chunk_size=arguments.chunk_size
+    )
+
+    print(json.dumps(counts))
+
+    return 1 if counts['deferred'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
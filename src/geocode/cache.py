@@ -0,0 +1,270 @@
+"""
+Two-tier cache for geocoder results. A bounded in-process LRU sits in front of Redis, so repeated
+addresses within a warm container never leave the process and replays across containers are served
+from Redis instead of spending provider quota.
+
+The deployed geocoder does not provision Redis (the function runs outside a VPC), so REDIS_HOST is
+not set and the second tier is LocalRedis: both tiers live in the container, and results and
+negative results are not shared across containers. Set REDIS_HOST (and REDIS_PORT) to a Redis
+reachable from the function to share them.
+
+Values are stored as JSON strings in both tiers. Every lookup therefore returns a fresh copy that
+callers can modify (e.g. to attach entity identifiers) without corrupting the cache.
+
+Entries expire in process like they do in Redis: entries written by this worker with their own
+ttl, entries read from Redis (whose remaining ttl is unknown) after at most LRU_TTL seconds.
+"""
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+import redis
+
+from geocode import logger
+
+
+LRU_SIZE = int(os.environ.get('CACHE_LRU_SIZE', 10000))     # entries kept in process
+NEGATIVE_LRU_SIZE = int(os.environ.get('NEGATIVE_CACHE_LRU_SIZE', 5000))
+NEGATIVE_TTL = int(os.environ.get('NEGATIVE_CACHE_TTL', 60*60*24*3))
+LRU_TTL = int(os.environ.get('CACHE_LRU_TTL', 60*60))    # seconds entries read from Redis are kept
+
+
+class LRUCache:
+    """
+    Thread safe least recently used cache with a fixed number of entries. Entries can expire.
+    """
+    def __init__(self, maxsize=LRU_SIZE):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key):
+        """
+        Return the value for a key and mark it as recently used, None if absent or expired.
+        """
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+
+            value, expires = self._data[key]
+
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                return None
+
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Insert a value that expires after ttl seconds (never if not set), evicting the least
+        recently used entry when the cache is full.
+        """
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class LocalPipeline:
+    """
+    Buffers commands for a LocalRedis instance until executed, like a Redis pipeline.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def get(self, key):
+        self.commands.append((self.client.get, (key,), {}))
+        return self
+
+    def set(self, key, value, ex=None):
+        self.commands.append((self.client.set, (key, value), {'ex': ex}))
+        return self
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        return [function(*args, **kwargs) for function, args, kwargs in commands]
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the subset of the Redis client used by the geocoder. It is used for
+    tests and whenever no Redis host is configured (e.g. running the lambda locally).
+    """
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (None, None))
+
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                return None
+
+            return value
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (
+                value.encode('utf-8') if isinstance(value, str) else value,
+                time.time() + ex if ex else None
+            )
+
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def flushall(self):
+        with self._lock:
+            self._data.clear()
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+
+def connect():
+    """
+    Return a Redis client for the configured host, or an in-process stand-in (kept per container)
+    if no host is configured, as in the deployed geocoder.
+    """
+    host = os.environ.get('REDIS_HOST')
+
+    if not host:
+        return LocalRedis()
+
+    return redis.StrictRedis(
+        host=host,
+        port=int(os.environ.get('REDIS_PORT', 6379)),
+        socket_timeout=1,
+        socket_connect_timeout=1
+    )
+
+
+class ResultCache:
+    """
+    Cache layer for geocoder results, keyed by the entity agnostic cache hash of a task. Lookups go
+    to the LRU first and only keys missing there are fetched from Redis, in one round trip. Writes
+    go to both tiers, to Redis in a single pipeline.
+
+    Hits and misses are counted per provider so the quota savings can be reported.
+    """
+    def __init__(self, client, maxsize=LRU_SIZE, ttl=None, name='cache'):
+        self.client = client
+        self.lru = LRUCache(maxsize)
+        self.ttl = ttl
+        self.name = name
+        self.stats = collections.defaultdict(collections.Counter)
+
+    def get_many(self, keys : list, providers : list):
+        """
+        Return the cached results for the given keys (None for misses) in the same order.
+        """
+        values = [self.lru.get(key) for key in keys]
+        remote = [i for i, value in enumerate(values) if value is None]
+        fetched = set(remote)
+
+        if remote:
+            try:
+                remote_values = self.client.mget([keys[i] for i in remote])
+            except redis.RedisError as error:
+                # the cache is an optimisation, fall back to the providers
+                logger.log_event(logging.WARNING, {
+                    'state': 'cache unavailable',
+                    'value': str(error)
+                })
+                remote_values = [None] * len(remote)
+
+            for i, value in zip(remote, remote_values):
+                if value is not None:
+                    value = value.decode('utf-8') if isinstance(value, bytes) else value
+                    self.lru.set(keys[i], value, min(self.ttl or LRU_TTL, LRU_TTL))
+                    self.stats[providers[i]]['redis_hits'] += 1
+
+                values[i] = value
+
+        for i, value in enumerate(values):
+            if value is None:
+                self.stats[providers[i]]['misses'] += 1
+            elif i not in fetched:
+                self.stats[providers[i]]['lru_hits'] += 1
+
+        return [json.loads(value) if value is not None else None for value in values]
+
+    def set_many(self, items):
+        """
+        Store (key, result, ttl) items in both tiers. The ttl defaults to the cache ttl.
+        """
+        pipe = self.client.pipeline(transaction=False)
+
+        for key, result, ttl in items:
+            value = json.dumps(result)
+
+            self.lru.set(key, value, ttl or self.ttl)
+            pipe.set(key, value, ex=ttl or self.ttl)
+
+        try:
+            pipe.execute()
+        except redis.RedisError as error:
+            logger.log_event(logging.WARNING, {
+                'state': 'cache unavailable',
+                'value': str(error)
+            })
+
+    def log_statistics(self):
+        """
+        Log and reset the hit and miss counters for each provider.
+        """
+        for provider, counter in self.stats.items():
+            event = {
+                'state': '{name} statistics'.format(name=self.name),
+                'value': dict(counter)
+            }
+
+            logger.log_event(logging.INFO, event, provider=provider)
+
+        self.stats.clear()
+
+
+class NegativeCache(ResultCache):
+    """
+    Cache of addresses for which a provider returned no results, even with all optional fields
+    omitted. Keys are the cache hashes of tasks (address and provider version) in their own
+    namespace. Entries expire sooner than results and fewer are kept in process.
+    """
+    PREFIX = 'negative:'
+
+    def __init__(self, client, maxsize=NEGATIVE_LRU_SIZE, ttl=NEGATIVE_TTL):
+        super(NegativeCache, self).__init__(client, maxsize=maxsize, ttl=ttl, name='negative cache')
+
+    def contains(self, key : str, provider : str):
+        """
+        Return whether the provider recently found no results for this key.
+        """
+        return self.get_many([self.PREFIX + key], [provider])[0] is not None
+
+    def add(self, key : str):
+        self.set_many([(self.PREFIX + key, {'timestamp': int(time.time())}, None)])
@@ -0,0 +1,115 @@
+"""
+Canonical form of task addresses. Upstream systems send the same address in many shapes (casing,
+whitespace, accents, house number as part of the street), each of which would get its own cache
+hash and its own provider call. Addresses are therefore canonicalized before they are hashed and
+sent to a provider:
+
+- unicode is NFKC normalized, accents are removed from latin characters and text is case folded,
+- whitespace is collapsed and repeated or dangling punctuation is removed,
+- a house number that is part of the street is moved to the house_number field,
+- country codes are upper case ISO 3166-1 alpha-2 (e.g. UK becomes GB).
+
+Canonicalization is memoized per address.
+"""
+import functools
+import json
+import re
+import unicodedata
+
+
+MEMO_SIZE = 10000       # canonical addresses kept in memory
+
+COUNTRY_CODE_ALIASES = {
+    'UK': 'GB',
+    'EL': 'GR'
+}
+
+# street types after which a trailing number is a house number (e.g. Hauptstrasse 5, but Calle 10)
+STREET_SUFFIXES = (
+    'strasse', 'str.', 'weg', 'gasse', 'allee', 'platz', 'ring', 'damm', 'straat', 'laan', 'plein',
+    'gracht', 'kade', 'gade', 'vej', 'gatan', 'vagen', 'road', 'street', 'avenue', 'lane'
+)
+
+WHITESPACE = re.compile(r'\s+')
+REPEATED_PUNCTUATION = re.compile(r'\s*([,;.\-/])(\s*[,;.\-/])+\s*')
+SPACE_BEFORE_PUNCTUATION = re.compile(r'\s+([,;.])')
+LEADING_NUMBER = re.compile(r'^(\d+[a-z]?)\s*,?\s+(\D.*)$')
+TRAILING_NUMBER = re.compile(r'^(.*\D)\s*,?\s+(\d+[a-z]?)$')
+
+
+def fold(text : str):
+    """
+    Normalize unicode, strip accents from latin characters and case fold.
+    """
+    text = unicodedata.normalize('NFKC', text)
+
+    characters = []
+    for character in unicodedata.normalize('NFD', text):
+        if unicodedata.combining(character) and characters and \
+                unicodedata.name(characters[-1], '').startswith('LATIN'):
+            continue
+
+        characters.append(character)
+
+    return unicodedata.normalize('NFC', ''.join(characters)).casefold()
+
+
+def collapse(text : str):
+    """
+    Collapse whitespace and repeated punctuation, strip dangling punctuation.
+    """
+    text = WHITESPACE.sub(' ', text)
+    text = REPEATED_PUNCTUATION.sub(lambda match: match.group(1) + ' ', text)
+    text = SPACE_BEFORE_PUNCTUATION.sub(r'\1', text)
+
+    return text.strip(' ,;.-/')
+
+
+def split_house_number(street : str):
+    """
+    Split a street into a house number and a street name, the house number is None if the street
+    does not contain one.
+    """
+    match = LEADING_NUMBER.match(street)
+    if match:
+        return match.group(1), match.group(2)
+
+    match = TRAILING_NUMBER.match(street)
+    if match and (',' in street or match.group(1).rstrip(' ,').endswith(STREET_SUFFIXES)):
+        return match.group(2), match.group(1).rstrip(' ,')
+
+    return None, street
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def _canonicalize(serialized : str):
+    address = json.loads(serialized)
+    canonical = {}
+
+    for field, value in address.items():
+        if isinstance(value, str):
+            value = collapse(fold(value))
+
+            if not value:
+                continue
+
+        canonical[field] = value
+
+    if 'country_code' in canonical:
+        country_code = canonical['country_code'].upper()
+        canonical['country_code'] = COUNTRY_CODE_ALIASES.get(country_code, country_code)
+
+    if 'street' in canonical and 'house_number' not in canonical:
+        house_number, street = split_house_number(canonical['street'])
+
+        if house_number:
+            canonical.update(house_number=house_number, street=street)
+
+    return json.dumps(canonical, sort_keys=True)
+
+
+def canonicalize(address : dict):
+    """
+    Return the canonical form of an address (a new dictionary).
+    """
+    return json.loads(_canonicalize(json.dumps(address, sort_keys=True)))
@@ -0,0 +1,56 @@
+"""
+Request coalescing for geocoder tasks. Tasks for the same address and provider share the entity
+agnostic cache hash, so they can share a single provider call:
+
+- within a batch, tasks are grouped by cache hash and only the first task of a group is sent,
+- across batches, a call that is already in flight is joined instead of being sent again.
+
+Results are shared between entities, so callers must copy them before attaching entity data.
+"""
+import collections
+import concurrent.futures
+import threading
+
+
+def group_by_key(pairs):
+    """
+    Group (key, task) pairs by key, preserving the order in which keys are first seen.
+    """
+    groups = collections.OrderedDict()
+
+    for key, task in pairs:
+        groups.setdefault(key, []).append(task)
+
+    return groups
+
+
+class SingleFlight:
+    """
+    Makes sure only one call per key is in flight. Callers arriving while the call runs wait for it
+    and receive the same result or exception.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self._calls[key] = concurrent.futures.Future()
+
+        if leader:
+            try:
+                call.set_result(function(*args, **kwargs))
+            except Exception as error:
+                call.set_exception(error)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+
+        return call.result()
@@ -1,17 +1,29 @@
 """
 Retrieves API keys from Amazon Simple Systems Manager (SSM).
+
+Requests are spread over all healthy keys of a provider (see KeyScheduler), so that throughput
+grows with the number of keys. Keys with exhausted quota are skipped and keys that keep failing
+are quarantined for a while.
 """
 import collections
+import hashlib
 import itertools
 import json
 import logging
+import threading
+import time
 
 import boto3
 
+from geocode.helpers import FailedRequestError, InvalidRequestError
+
 
 LOGGER = logging.getLogger('trvcoder.credentials')
 LOGGER.setLevel(logging.INFO)
 
+QUARANTINE_ERRORS = 3       # consecutive failed requests before a key is quarantined
+QUARANTINE_TIME = 600       # seconds a key is quarantined
+
 
 class Singleton(type):
     """
@@ -25,6 +37,77 @@ class Singleton(type):
         return cls._instances[cls]
 
 
+class KeyScheduler:
+    """
+    Distributes requests over the keys of a provider with smooth weighted round robin: over any
+    window, each healthy key gets a share of the requests proportional to its weight, without
+    bursts on a single key. Usage, requests in flight and errors are tracked per key.
+    """
+    def __init__(self, keys : list, weights=None):
+        self.keys = list(keys)
+        self.weights = list(weights or [1] * len(self.keys))
+
+        self.current = [0] * len(self.keys)
+        self.in_flight = [0] * len(self.keys)
+        self.usage = [0] * len(self.keys)
+        self.errors = [0] * len(self.keys)
+        self.quarantined_until = [0.0] * len(self.keys)
+        self._lock = threading.Lock()
+
+    def healthy(self, available=None, now=None):
+        """
+        Return the indices of keys that are not quarantined and available.
+        """
+        now = now or time.monotonic()
+
+        return [
+            i for i, key in enumerate(self.keys)
+            if self.quarantined_until[i] <= now and (available is None or available(key))
+        ]
+
+    def acquire(self, available=None):
+        """
+        Return the next key to use. Without healthy keys, all keys are considered so the request
+        can still fail with the error of the provider.
+        """
+        candidates = self.healthy(available) or list(range(len(self.keys)))
+
+        with self._lock:
+            total = sum(self.weights[i] for i in candidates)
+
+            for i in candidates:
+                self.current[i] += self.weights[i]
+
+            best = max(candidates, key=lambda i: self.current[i])
+            self.current[best] -= total
+            self.in_flight[best] += 1
+            self.usage[best] += 1
+
+        return self.keys[best]
+
+    def release(self, key, error=None):
+        """
+        Return a key after a request. Keys are quarantined after repeated failed requests.
+        """
+        i = self.keys.index(key)
+
+        with self._lock:
+            self.in_flight[i] -= 1
+
+            if error is None:
+                self.errors[i] = 0
+            elif isinstance(error, (FailedRequestError, InvalidRequestError)):
+                self.errors[i] += 1
+
+                if self.errors[i] >= QUARANTINE_ERRORS:
+                    self.errors[i] = 0
+                    self.quarantined_until[i] = time.monotonic() + QUARANTINE_TIME
+
+                    return True
+
+        return False
+
+
 class KeyHandler(metaclass=Singleton):
     """
     Class to manage all free and business keys for geocoding APIs. Keys can be rotated in case of
@@ -38,6 +121,9 @@ class KeyHandler(metaclass=Singleton):
         # set first active keys for each provider
         self.active_keys = dict((k, next(v)) for k, v in self.api_keys.items())
 
+        # request distribution over all keys of a provider
+        self.schedulers = dict((k, KeyScheduler(v)) for k, v in keys.items())
+
     def _retrieve_parameter(self, sm_name, sm_id):
         """
         Retrieve all API keys from EC2 parameter store.
@@ -49,12 +135,66 @@ class KeyHandler(metaclass=Singleton):
 
         return json.loads(value)
 
-    def get_key(self, provider):
+    def get_key(self, provider, available=None):
         """
-        Return the current active key for the supplied provider.
+        Return the current active key for the supplied provider. If a filter for available keys is
+        supplied, keys are cycled until an available key is active (if there is one).
         """
+        if available is not None:
+            for _ in range(self.key_count[provider]):
+                if available(self.active_keys[provider]):
+                    break
+
+                self.cycle_key(provider)
+
         return self.active_keys[provider]
 
+    def weigh(self, provider, weights):
+        """
+        Set the share of requests for each key of a provider (in the order of the secret).
+        """
+        self.schedulers[provider].weights = list(weights)
+
+    def acquire_key(self, provider, available=None):
+        """
+        Return a key for a single request, spreading requests over all healthy keys of the
+        provider. Keys must be returned with release_key.
+        """
+        return self.schedulers[provider].acquire(available)
+
+    def release_key(self, provider, key, error=None):
+        """
+        Return a key after a request, with the error raised by the request if any.
+        """
+        if self.schedulers[provider].release(key, error):
+            LOGGER.info(dict(
+                provider=provider,
+                event={
+                    'status': 'quarantining key',
+                    'value': self.key_name(provider, key)
+                }
+            ))
+
+    def usage(self, provider):
+        """
+        Returns the number of requests and requests in flight per key name for a provider.
+        """
+        scheduler = self.schedulers[provider]
+
+        return dict(
+            (self.key_name(provider, key), {'requests': usage, 'in_flight': in_flight})
+            for key, usage, in_flight in zip(scheduler.keys, scheduler.usage, scheduler.in_flight)
+        )
+
+    @staticmethod
+    def key_name(provider, key):
+        """
+        Returns a name for a key that identifies it without revealing it (e.g. for quota state).
+        """
+        digest = hashlib.md5(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+        return '{provider}#{digest}'.format(provider=provider, digest=digest[:12])
+
     def cycle_key(self, provider):
         """
         Cycles the key for the supplied provider.
@@ -0,0 +1,143 @@
+"""
+Concurrent execution of geocoder tasks. Tasks run on a shared thread pool, but the number of
+requests in flight is capped per provider. Providers with strict rate limits (e.g. OSM, Geonames)
+are processed one task at a time while the calls for other providers overlap.
+
+Tasks waiting for a provider slot are queued instead of occupying a worker thread, so a backlog
+for one provider never blocks tasks for another.
+
+Queued tasks are kept in lanes per priority class (e.g. real-time and bulk). A free slot goes to the
+next task of a lane chosen by fair share: while several lanes have tasks waiting, each gets a share
+of the slots proportional to its weight, and lanes without waiting tasks leave their share to the
+others. Real-time tasks therefore do not wait behind a large batch, while the batch still uses all
+capacity that real-time tasks leave.
+"""
+import collections
+import concurrent.futures
+import os
+import threading
+
+
+WORKERS = int(os.environ.get('WORKERS', 1))     # size of the thread pool, 1 runs tasks serially
+
+
+class Lanes:
+    """
+    Queues of tasks per priority class, served by smooth weighted round robin. Lanes without a
+    weight have weight 1.
+    """
+    def __init__(self, weights=None):
+        self.weights = weights or {}
+        self.queues = collections.OrderedDict()
+        self.current = collections.Counter()
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def weight(self, lane):
+        return self.weights.get(lane, 1)
+
+    def append(self, lane, item):
+        self.queues.setdefault(lane, collections.deque()).append(item)
+
+    def top(self):
+        """
+        Return the highest weight of the lanes with waiting tasks, None if there are none.
+        """
+        return max((self.weight(lane) for lane, queue in self.queues.items() if queue), default=None)
+
+    def popleft(self):
+        """
+        Remove and return the next task by fair share, heavier lanes first in case of ties.
+        """
+        lanes = sorted(
+            (lane for lane, queue in self.queues.items() if queue),
+            key=self.weight,
+            reverse=True
+        )
+
+        if not lanes:
+            raise IndexError('pop from empty lanes')
+
+        for lane in lanes:
+            self.current[lane] += self.weight(lane)
+
+        lane = max(lanes, key=lambda lane: self.current[lane])
+        self.current[lane] -= sum(self.weight(lane) for lane in lanes)
+
+        return self.queues[lane].popleft()
+
+
+class TaskExecutor:
+    """
+    Runs a function over geocoder tasks with per-provider concurrency limits. The limit function
+    returns the maximum number of in-flight tasks for a provider (None means no provider limit).
+    The priority function returns the lane of a task, lanes share slots by their weights.
+    """
+    def __init__(self, workers=WORKERS, limit=None, priority=None, weights=None):
+        self.workers = workers
+        self.limit = limit or (lambda provider: None)
+        self.priority = priority or (lambda task: None)
+        self.weights = weights
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def pool(self):
+        # created lazily and reused across warm invocations
+        if self._pool is None:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+        return self._pool
+
+    def map(self, function, tasks : list):
+        """
+        Schedule function(task) for each task and return a future per task, in the same order.
+        With a single worker, tasks are run immediately in the calling thread (by fair share over
+        the lanes).
+        """
+        futures = [concurrent.futures.Future() for _ in tasks]
+
+        if self.workers <= 1:
+            lanes = Lanes(self.weights)
+            for task, future in zip(tasks, futures):
+                lanes.append(self.priority(task), (task, future))
+
+            while lanes:
+                self._run(function, *lanes.popleft())
+
+            return futures
+
+        queues = collections.defaultdict(lambda: Lanes(self.weights))
+        for task, future in zip(tasks, futures):
+            queues[task['provider']].append(self.priority(task), (task, future))
+
+        # providers with tasks in the heaviest lanes get worker threads first
+        for provider, queue in sorted(queues.items(), key=lambda item: -item[1].top()):
+            slots = min(self.limit(provider) or self.workers, len(queue))
+
+            for _ in range(slots):
+                self.pool.submit(self._work, function, queue)
+
+        return futures
+
+    def _run(self, function, task, future):
+        try:
+            future.set_result(function(task))
+        except Exception as error:
+            future.set_exception(error)
+
+    def _work(self, function, queue):
+        """
+        Run the next queued task of a provider, chosen when a worker thread picks up the slot. When
+        it finishes, the slot is handed to the next task in the same queue.
+        """
+        with self._lock:
+            if not queue:
+                return
+
+            task, future = queue.popleft()
+
+        self._run(function, task, future)
+
+        self.pool.submit(self._work, function, queue)
@@ -0,0 +1,218 @@
+"""
+Hedged requests across providers. A single slow response of a provider can hold up a whole
+invocation. For providers with a `hedge` section in data/config.yml, a task that has not been
+answered within the observed latency percentile of the provider is also sent to a backup provider,
+and the first successful result is taken:
+
+    hedge:
+      backup: arcgis        # provider that receives the address when this one is slow
+      percentile: 95        # latency percentile after which the backup is sent
+      budget: 0.05          # hedged tasks as a share of all tasks of this provider
+
+The hedge budget caps the extra quota spent on the backup: every task earns the provider `budget`
+hedges (up to BURST), every hedge spends one. Tasks are not hedged until MIN_SAMPLES latencies of
+the provider are observed.
+
+The backup request runs through geocode_task like any other task, so quota, budgets and rate
+limits of the backup provider apply. It is not counted against the concurrency limit of the
+backup provider, so choose a backup without a strict concurrency limit.
+
+When the backup wins, the primary request is not cancelled (it may already be sent) and keeps its
+slot of the `concurrency` limit of the primary provider until it finishes. The next task of that
+provider waits for the slot, so hedging never exceeds the limit (e.g. one request at a time for
+osm).
+"""
+import collections
+import concurrent.futures
+import logging
+import math
+import os
+import threading
+import time
+
+from geocode import logger
+
+
+SAMPLES = 200           # latencies kept per provider
+MIN_SAMPLES = 20        # latencies needed before hedging
+PERCENTILE = 95
+BUDGET = 0.05
+BURST = 5               # hedges a provider can save up
+
+
+class LatencyTracker:
+    """
+    Recent latencies of a provider.
+    """
+    def __init__(self, samples=SAMPLES):
+        self.latencies = collections.deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds : float):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def percentile(self, percentile : float):
+        """
+        Return a latency percentile in seconds, None until enough latencies are observed.
+        """
+        with self._lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return None
+
+            latencies = sorted(self.latencies)
+
+        index = int(math.ceil(percentile / 100.0 * len(latencies))) - 1
+
+        return latencies[index]
+
+
+class HedgeBudget:
+    """
+    Share of tasks that may be hedged: each task earns a fraction of a hedge, each hedge spends one.
+    """
+    def __init__(self, share=BUDGET, burst=BURST):
+        self.share = share
+        self.burst = burst
+        self.tokens = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.share)
+
+    def spend(self):
+        """
+        Take a hedge from the budget, False if the budget is spent.
+        """
+        with self._lock:
+            if self.tokens < 1.0:
+                return False
+
+            self.tokens -= 1.0
+            return True
+
+
+class Hedger:
+    """
+    Runs tasks with hedging for the providers configured for it.
+    """
+    def __init__(self, config : dict, workers=None):
+        self.config = config
+        self.workers = workers or int(os.environ.get('HEDGE_WORKERS', 8))
+        self.trackers = collections.defaultdict(LatencyTracker)
+        self.budgets = {}
+        self.slots = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def pool(self):
+        # created lazily and reused across warm invocations
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+
+            return self._pool
+
+    def hedge(self, provider : str):
+        """
+        Return the hedge configuration of a provider, None if its tasks are not hedged.
+        """
+        return (self.config.get(provider) or {}).get('hedge')
+
+    def budget(self, provider : str):
+        with self._lock:
+            if provider not in self.budgets:
+                self.budgets[provider] = HedgeBudget(self.hedge(provider).get('budget', BUDGET))
+
+            return self.budgets[provider]
+
+    def slot(self, provider : str):
+        """
+        Return the semaphore of the in-flight primary requests of a provider, None if its
+        concurrency is not limited.
+        """
+        with self._lock:
+            if provider not in self.slots:
+                limit = (self.config.get(provider) or {}).get('concurrency')
+                self.slots[provider] = threading.BoundedSemaphore(limit) if limit else None
+
+            return self.slots[provider]
+
+    def delay(self, provider : str):
+        """
+        Return the seconds after which a task of a provider is hedged, None if not known yet.
+        """
+        return self.trackers[provider].percentile(self.hedge(provider).get('percentile', PERCENTILE))
+
+    def _timed(self, function, task):
+        start = time.monotonic()
+
+        try:
+            return function(task)
+        finally:
+            self.trackers[task['provider']].observe(time.monotonic() - start)
+
+    def run(self, task : dict, function):
+        """
+        Return function(task), or function of the task for the backup provider if that succeeds
+        first. If both fail, the error of the primary request is raised.
+        """
+        provider = task['provider']
+        hedge = self.hedge(provider)
+
+        if not hedge:
+            return function(task)
+
+        self.budget(provider).earn()
+
+        slot = self.slot(provider)
+        if slot is not None:
+            slot.acquire()
+
+        try:
+            primary = self.pool.submit(self._timed, function, task)
+        except Exception:
+            if slot is not None:
+                slot.release()
+            raise
+
+        if slot is not None:
+            # held until the primary request finishes, also when the backup wins
+            primary.add_done_callback(lambda future: slot.release())
+
+        try:
+            return primary.result(timeout=self.delay(provider))
+        except concurrent.futures.TimeoutError:
+            if not self.budget(provider).spend():
+                return primary.result()
+
+        event = dict(
+            state='hedging request',
+            field='provider',
+            value=hedge['backup']
+        )
+
+        logger.log_event(
+            logging.INFO,
+            event,
+            provider=provider,
+            entity_id=task.get('entity_id'),
+            entity_type=task.get('entity_type')
+        )
+
+        backup = self.pool.submit(function, dict(task, provider=hedge['backup']))
+        pending = {primary, backup}
+
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+
+            for future in (primary, backup):
+                if future in done and future.exception() is None:
+                    return future.result()
+
+        return primary.result()
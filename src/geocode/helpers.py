@@ -3,12 +3,14 @@ Helper functions for the geocoder lambda.
 """
 import decimal
 import json
+import math
 import random
 from six import string_types, integer_types, binary_type
 import time
 
 import boto3
 from boto3.dynamodb.table import BatchWriter
+from boto3.dynamodb.types import Binary
 from botocore.exceptions import ClientError
 
 
@@ -62,6 +64,27 @@ class NoResultsFoundError(GeocoderError):
     status_code = 5
 
 
+class NegativeCacheHitError(NoResultsFoundError):
+    """
+    Error class for addresses that recently could not be geocoded by some API (negative cache).
+    """
+    status = 'NEGATIVE CACHE'
+    status_code = 6
+
+
+class BudgetDeferredError(GeocoderError):
+    """
+    Error class for tasks that exceed the daily budget of a provider at this time of the day. The
+    task can be sent again at available_at (epoch seconds).
+    """
+    status = 'BUDGET DEFERRED'
+    status_code = 7
+
+    def __init__(self, provider, available_at):
+        super(BudgetDeferredError, self).__init__(provider)
+        self.available_at = available_at
+
+
 def dynamo_sanitize(data):
     """Sanitize an object so it can be updated to dynamodb (recursive).
     Here are the various conversions:
@@ -100,6 +123,63 @@ def dynamo_sanitize(data):
     return new_data
 
 
+# serialize_number, serialize_value, serialize_item and ClientBatchWriterOCC are copied in
+# router.utils.stasher: each Lambda package only ships its own source folder. Keep the copies identical
+# (checked by tests/router/test_stasher.py).
+def serialize_number(data):
+    if isinstance(data, float) and not math.isfinite(data) or \
+            isinstance(data, decimal.Decimal) and not data.is_finite():
+        raise TypeError('Infinity and NaN are not supported by DynamoDB')
+
+    return str(data)
+
+
+def serialize_value(data):
+    """
+    Return the low-level DynamoDB AttributeValue of a Python value, in a single pass. Values are
+    converted like dynamo_sanitize followed by the serializer of the boto3 resource layer: blank
+    strings and empty sets are stored as NULL, floats as numbers and dictionary keys as strings.
+    """
+    if data is None:
+        return {'NULL': True}
+    if isinstance(data, string_types):
+        return {'S': data} if data.strip() else {'NULL': True}
+    if isinstance(data, bool):
+        return {'BOOL': data}
+    if isinstance(data, (float, decimal.Decimal) + integer_types):
+        return {'N': serialize_number(data)}
+    if isinstance(data, dict):
+        return {'M': dict(
+            (key if isinstance(key, string_types) else str(key), serialize_value(value))
+            for key, value in data.items()
+        )}
+    if isinstance(data, (list, tuple)):
+        return {'L': [serialize_value(item) for item in data]}
+    if isinstance(data, (binary_type, bytearray)):
+        return {'B': bytes(data)}
+    if isinstance(data, Binary):
+        return {'B': data.value}
+    if isinstance(data, (set, frozenset)):
+        if not data:
+            return {'NULL': True}
+        if all(isinstance(item, string_types) for item in data):
+            return {'SS': list(data)}
+        if all(isinstance(item, (float, decimal.Decimal) + integer_types) and not isinstance(item, bool) for item in data):
+            return {'NS': [serialize_number(item) for item in data]}
+        if all(isinstance(item, (binary_type, bytearray, Binary)) for item in data):
+            return {'BS': [bytes(getattr(item, 'value', item)) for item in data]}
+
+    raise TypeError('Unsupported type "{}" for value "{}"'.format(type(data), data))
+
+
+def serialize_item(item : dict):
+    """
+    Return a DynamoDB item in the low-level AttributeValue format (see serialize_value), as
+    expected by the client-level batch_write_item.
+    """
+    return dict((key, serialize_value(value)) for key, value in item.items())
+
+
 class BatchWriterOCC(BatchWriter):
     """
     Implements optimistic concurrency control (OCC) as specified in aws_. This class provides a
@@ -164,6 +244,29 @@ class BatchWriterOCC(BatchWriter):
             self._flush_with_back_off_and_jitter()
 
 
+class ClientBatchWriterOCC(BatchWriterOCC):
+    """
+    BatchWriterOCC on the low-level DynamoDB client. Items are serialized in a single pass (see
+    serialize_item) instead of being sanitized and serialized again by the boto3 resource layer.
+    """
+    def __init__(self, table_name, client, flush_amount=25, overwrite_by_pkeys=None, nr_of_retries=10):
+        BatchWriter.__init__(
+            self,
+            table_name,
+            client,
+            flush_amount=flush_amount,
+            overwrite_by_pkeys=overwrite_by_pkeys
+        )
+
+        self.back_off = 1
+        self.cap = 60
+        self.base = 1
+        self.nr_of_retries = nr_of_retries
+
+    def put_item(self, Item):
+        super(ClientBatchWriterOCC, self).put_item(Item=serialize_item(Item))
+
+
 def load_validation_schema():
     """
     Loads country codes as a dictionary indexed by ISO-3166-2 country codes. The value for each key
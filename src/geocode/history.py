@@ -0,0 +1,248 @@
+"""
+Historization of geocoder results. Every result written to DynamoDB is also appended to a history
+sink, so provider quality can be analyzed offline without scanning the live table. The full
+results are kept (raw payload included, see projection for the stored items).
+
+Results are buffered in memory and handed to a background thread once MAX_RECORDS results are
+buffered or the oldest buffered result is MAX_AGE seconds old. The thread writes them as gzip
+compressed JSON lines, in batches of at most MAX_BYTES (uncompressed), to the backend:
+
+- FirehoseBackend: a record per batch for a delivery stream (HISTORY_STREAM),
+- S3Backend: an object per batch under an hourly prefix (HISTORY_BUCKET),
+- DirectoryBackend: a file per batch (HISTORY_DIRECTORY, for local runs and tests).
+
+Adding results never waits for the backend, encoding and writing happen on the background thread.
+The handler flushes the sink before it returns (see flush), so nothing is left buffered while a
+container is frozen. The flush waits at most FLUSH_TIMEOUT seconds: results the backend has not
+taken by then are lost if the container is frozen or reclaimed before the thread catches up, their
+number is logged. Batches that cannot be encoded or that the backend fails to take are logged and
+dropped.
+"""
+import abc
+import datetime
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+import boto3
+
+from geocode import logger
+
+
+MAX_RECORDS = 500
+MAX_BYTES = 512 * 1024      # a Firehose record holds at most 1000 KB
+MAX_AGE = 60                # seconds
+FLUSH_TIMEOUT = 10          # seconds flush waits for the backend
+
+
+class Backend(abc.ABC):
+    """
+    Destination of compressed batches of JSON lines.
+    """
+    @abc.abstractmethod
+    def put(self, data : bytes, records : int):
+        raise NotImplementedError
+
+    @staticmethod
+    def object_name(now=None):
+        now = now or datetime.datetime.utcnow()
+
+        return '{hour}/{name}.jsonl.gz'.format(hour=now.strftime('%Y/%m/%d/%H'), name=uuid.uuid4().hex)
+
+
+class FirehoseBackend(Backend):
+    def __init__(self, stream : str):
+        self.stream = stream
+        self.client = boto3.client('firehose')
+
+    def put(self, data, records):
+        self.client.put_record(DeliveryStreamName=self.stream, Record={'Data': data})
+
+
+class S3Backend(Backend):
+    def __init__(self, bucket : str, prefix=''):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3')
+
+    def put(self, data, records):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self.prefix + self.object_name(),
+            Body=data,
+            ContentType='application/x-ndjson',
+            ContentEncoding='gzip'
+        )
+
+
+class DirectoryBackend(Backend):
+    def __init__(self, directory : str):
+        self.directory = directory
+
+    def put(self, data, records):
+        path = os.path.join(self.directory, self.object_name())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as f:
+            f.write(data)
+
+
+def load_backend():
+    """
+    Return the history backend for this environment, None if results are not historized.
+    """
+    if os.environ.get('HISTORY_STREAM'):
+        return FirehoseBackend(os.environ['HISTORY_STREAM'])
+    if os.environ.get('HISTORY_BUCKET'):
+        return S3Backend(os.environ['HISTORY_BUCKET'], os.environ.get('HISTORY_PREFIX', ''))
+    if os.environ.get('HISTORY_DIRECTORY'):
+        return DirectoryBackend(os.environ['HISTORY_DIRECTORY'])
+
+    return None
+
+
+def encode(records : list, max_bytes=MAX_BYTES):
+    """
+    Yield (compressed JSON lines, number of records) in batches of at most max_bytes uncompressed
+    (a larger record makes a batch of its own).
+    """
+    lines, size = [], 0
+
+    for record in records:
+        line = json.dumps(record, default=str, separators=(',', ':')).encode('utf-8') + b'\n'
+
+        if lines and size + len(line) > max_bytes:
+            yield gzip.compress(b''.join(lines)), len(lines)
+            lines, size = [], 0
+
+        lines.append(line)
+        size += len(line)
+
+    if lines:
+        yield gzip.compress(b''.join(lines)), len(lines)
+
+
+class HistorySink:
+    """
+    Buffers results and writes them to a backend on a background thread.
+    """
+    def __init__(self, backend : Backend, max_records=MAX_RECORDS, max_bytes=MAX_BYTES, max_age=MAX_AGE):
+        self.backend = backend
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        self.records = []
+        self.oldest = None      # monotonic time the oldest buffered record was added
+        self.batches = queue.Queue()
+        self.pending = 0        # records handed over but not yet taken by the backend
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _due(self, now):
+        return len(self.records) >= self.max_records or \
+            (self.oldest is not None and now - self.oldest >= self.max_age)
+
+    def _hand_over(self):
+        # called with the lock held
+        records, self.records, self.oldest = self.records, [], None
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='history', daemon=True)
+            self._thread.start()
+
+        self.pending += len(records)
+        self.batches.put(records)
+
+    def add(self, records):
+        """
+        Buffer results, handing them to the background thread once a threshold is reached.
+        """
+        if self.backend is None:
+            return
+
+        now = time.monotonic()
+
+        with self._lock:
+            for record in records:
+                self.records.append(record)
+
+                if self.oldest is None:
+                    self.oldest = now
+
+            if self.records and self._due(now):
+                self._hand_over()
+
+    def tick(self):
+        """
+        Hand the buffered results to the background thread if they are due by age.
+        """
+        with self._lock:
+            if self.records and self._due(time.monotonic()):
+                self._hand_over()
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """
+        Hand over all buffered results and wait until the backend took them, at most timeout
+        seconds. Return whether all results were handed to the backend, results still pending after
+        the timeout are logged.
+        """
+        with self._lock:
+            if self.records:
+                self._hand_over()
+
+        deadline = time.monotonic() + timeout
+
+        with self.batches.all_tasks_done:
+            while self.batches.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    event = {
+                        'state': 'history flush timed out',
+                        'value': {'batches': self.batches.unfinished_tasks, 'records': self.pending}
+                    }
+
+                    logger.log_event(logging.WARNING, event)
+
+                    return False
+
+                self.batches.all_tasks_done.wait(remaining)
+
+        return True
+
+    def _run(self):
+        while True:
+            records = self.batches.get()
+
+            try:
+                for data, count in encode(records, self.max_bytes):
+                    self._put(data, count)
+            except Exception as error:
+                # the thread must survive, later batches would never be written
+                self._dropped(len(records), error)
+            finally:
+                with self._lock:
+                    self.pending -= len(records)
+
+                self.batches.task_done()
+
+    def _put(self, data, count):
+        try:
+            self.backend.put(data, count)
+        except Exception as error:
+            self._dropped(count, error)
+
+    @staticmethod
+    def _dropped(count, error):
+        event = {
+            'state': 'dropped history batch',
+            'value': {'records': count, 'error': str(error)}
+        }
+
+        logger.log_event(logging.ERROR, event)
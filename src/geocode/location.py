@@ -1,28 +1,290 @@
 """
-Geospatial computations.
+Geospatial computations on NumPy arrays. Points are dictionaries with a longitude and latitude in
+degrees; the batch functions take lists of them and return arrays.
+
+Two models of the earth are available:
+
+- 'ellipsoidal' (default): Vincenty's formulae on the WGS-84 ellipsoid, the same formulae as
+  geopy's vincenty. Accurate to within a millimeter. The inverse formula does not converge for
+  (nearly) antipodal points, in which case a ValueError is raised.
+- 'spherical': haversine and great circle formulae on a sphere with the mean earth radius. Several
+  times faster, with a relative error of at most 0.56% (typically below 0.3%) with respect to the
+  ellipsoid.
 """
-import geopy
-import geopy.distance
+import numpy as np
+
 
+WGS84 = (6378137.0, 6356752.3142, 1 / 298.257223563)     # major, minor axis (m), flattening
+EARTH_RADIUS = 6371008.8    # mean earth radius in meters
+VINCENTY_ITERATIONS = 20    # same iteration limit as geopy
+VINCENTY_TOLERANCE = 10e-12
 
-def bounding_box(point : dict, buffer_size):
+
+def _coordinates(points):
     """
-    Computes the bounding box around a point by buffer_size (unit: meters).
+    Return latitudes and longitudes in radians for a point or a list of points.
+    """
+    if isinstance(points, dict):
+        return np.radians(float(points['latitude'])), np.radians(float(points['longitude']))
+
+    latitudes = np.array([point['latitude'] for point in points], dtype=float)
+    longitudes = np.array([point['longitude'] for point in points], dtype=float)
+
+    return np.radians(latitudes), np.radians(longitudes)
+
+
+def _wrap_longitude(longitude):
+    return (longitude + 180.0) % 360.0 - 180.0
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """
+    Great circle distances in meters between (broadcastable) arrays of coordinates in radians.
+    """
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty_inverse(lat1, lng1, lat2, lng2):
+    """
+    Ellipsoidal distances in meters between (broadcastable) arrays of coordinates in radians. Each
+    pair is iterated until it converges, like the scalar formula.
+    """
+    major, minor, f = WGS84
+    lat1, lng1, lat2, lng2 = (np.array(a, dtype=float) for a in np.broadcast_arrays(lat1, lng1, lat2, lng2))
+    shape = lat1.shape
+    lat1, lng1, lat2, lng2 = (a.ravel() for a in (lat1, lng1, lat2, lng2))
+
+    delta_lng = lng2 - lng1
+
+    reduced_lat1 = np.arctan((1 - f) * np.tan(lat1))
+    reduced_lat2 = np.arctan((1 - f) * np.tan(lat2))
+
+    sin_reduced1, cos_reduced1 = np.sin(reduced_lat1), np.cos(reduced_lat1)
+    sin_reduced2, cos_reduced2 = np.sin(reduced_lat2), np.cos(reduced_lat2)
+
+    lambda_lng = delta_lng.copy()
+    sin_sigma, cos_sigma, sigma, cos_sq_alpha, cos2_sigma_m = (np.zeros_like(lat1) for _ in range(5))
+
+    active = np.ones(lat1.shape, dtype=bool)
+    coincident = np.zeros(lat1.shape, dtype=bool)
+    for _ in range(VINCENTY_ITERATIONS):
+        if not active.any():
+            break
+
+        sin_lambda_lng, cos_lambda_lng = np.sin(lambda_lng[active]), np.cos(lambda_lng[active])
+
+        sin_sigma[active] = np.sqrt(
+            (cos_reduced2[active] * sin_lambda_lng) ** 2 +
+            (cos_reduced1[active] * sin_reduced2[active] -
+             sin_reduced1[active] * cos_reduced2[active] * cos_lambda_lng) ** 2
+        )
+
+        coincident |= active & (sin_sigma == 0)
+        active &= ~coincident
+
+        sin_lambda_lng, cos_lambda_lng = np.sin(lambda_lng[active]), np.cos(lambda_lng[active])
+        s1, c1, s2, c2 = sin_reduced1[active], cos_reduced1[active], sin_reduced2[active], cos_reduced2[active]
+
+        cos_sigma[active] = s1 * s2 + c1 * c2 * cos_lambda_lng
+        sigma[active] = np.arctan2(sin_sigma[active], cos_sigma[active])
+
+        sin_alpha = c1 * c2 * sin_lambda_lng / sin_sigma[active]
+        cos_sq_alpha[active] = 1 - sin_alpha ** 2
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos2_sigma_m[active] = np.where(
+                cos_sq_alpha[active] != 0,
+                cos_sigma[active] - 2 * (s1 * s2 / cos_sq_alpha[active]),
+                0.0     # equatorial line
+            )
+
+        C = f / 16. * cos_sq_alpha[active] * (4 + f * (4 - 3 * cos_sq_alpha[active]))
+
+        lambda_prime = lambda_lng[active]
+        lambda_lng[active] = delta_lng[active] + (1 - C) * f * sin_alpha * (
+            sigma[active] + C * sin_sigma[active] * (
+                cos2_sigma_m[active] + C * cos_sigma[active] * (-1 + 2 * cos2_sigma_m[active] ** 2)
+            )
+        )
+
+        active[active] = np.abs(lambda_lng[active] - lambda_prime) > VINCENTY_TOLERANCE
+    else:
+        if active.any():
+            raise ValueError('Vincenty formula failed to converge!')
+
+    u_sq = cos_sq_alpha * (major ** 2 - minor ** 2) / minor ** 2
+
+    A = 1 + u_sq / 16384. * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    B = u_sq / 1024. * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+
+    delta_sigma = B * sin_sigma * (
+        cos2_sigma_m + B / 4. * (
+            cos_sigma * (-1 + 2 * cos2_sigma_m ** 2) -
+            B / 6. * cos2_sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos2_sigma_m ** 2)
+        )
+    )
+
+    distances = np.where(coincident, 0.0, minor * A * (sigma - delta_sigma))
+
+    return distances.reshape(shape)
+
+
+def great_circle_destination(lat1, lng1, bearing, distance):
+    """
+    Destinations (latitudes, longitudes in radians) on a sphere from (broadcastable) arrays of
+    coordinates, bearings in radians and distances in meters.
+    """
+    delta = np.asarray(distance, dtype=float) / EARTH_RADIUS
+
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(delta) + np.cos(lat1) * np.sin(delta) * np.cos(bearing))
+    lng2 = lng1 + np.arctan2(
+        np.sin(bearing) * np.sin(delta) * np.cos(lat1),
+        np.cos(delta) - np.sin(lat1) * np.sin(lat2)
+    )
+
+    return lat2, lng2
+
+
+def vincenty_direct(lat1, lng1, bearing, distance):
+    """
+    Destinations (latitudes, longitudes in radians) on the WGS-84 ellipsoid from (broadcastable)
+    arrays of coordinates, bearings in radians and distances in meters.
     """
-    start = geopy.Point(**point)
-    translate = geopy.distance.VincentyDistance(meters=100000)
+    major, minor, f = WGS84
+    lat1, lng1, bearing, distance = (
+        np.array(a, dtype=float) for a in np.broadcast_arrays(lat1, lng1, bearing, distance)
+    )
+
+    tan_reduced1 = (1 - f) * np.tan(lat1)
+    cos_reduced1 = 1 / np.sqrt(1 + tan_reduced1 ** 2)
+    sin_reduced1 = tan_reduced1 * cos_reduced1
+
+    sin_bearing, cos_bearing = np.sin(bearing), np.cos(bearing)
+
+    sigma1 = np.arctan2(tan_reduced1, cos_bearing)
+    sin_alpha = cos_reduced1 * sin_bearing
+    cos_sq_alpha = 1 - sin_alpha ** 2
+    u_sq = cos_sq_alpha * (major ** 2 - minor ** 2) / minor ** 2
+
+    A = 1 + u_sq / 16384. * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    B = u_sq / 1024. * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+
+    sigma = distance / (minor * A)
+    for _ in range(VINCENTY_ITERATIONS):
+        cos2_sigma_m = np.cos(2 * sigma1 + sigma)
+        sin_sigma, cos_sigma = np.sin(sigma), np.cos(sigma)
+
+        delta_sigma = B * sin_sigma * (
+            cos2_sigma_m + B / 4. * (
+                cos_sigma * (-1 + 2 * cos2_sigma_m ** 2) -
+                B / 6. * cos2_sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos2_sigma_m ** 2)
+            )
+        )
+
+        sigma_prime, sigma = sigma, distance / (minor * A) + delta_sigma
+
+        if np.all(np.abs(sigma - sigma_prime) <= VINCENTY_TOLERANCE):
+            break
+
+    cos2_sigma_m = np.cos(2 * sigma1 + sigma)
+    sin_sigma, cos_sigma = np.sin(sigma), np.cos(sigma)
+
+    lat2 = np.arctan2(
+        sin_reduced1 * cos_sigma + cos_reduced1 * sin_sigma * cos_bearing,
+        (1 - f) * np.sqrt(sin_alpha ** 2 + (sin_reduced1 * sin_sigma - cos_reduced1 * cos_sigma * cos_bearing) ** 2)
+    )
+
+    lambda_lng = np.arctan2(
+        sin_sigma * sin_bearing,
+        cos_reduced1 * cos_sigma - sin_reduced1 * sin_sigma * cos_bearing
+    )
+
+    C = f / 16. * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+
+    delta_lng = lambda_lng - (1 - C) * f * sin_alpha * (
+        sigma + C * sin_sigma * (cos2_sigma_m + C * cos_sigma * (-1 + 2 * cos2_sigma_m ** 2))
+    )
+
+    return lat2, lng1 + delta_lng
+
+
+def _distances(lat1, lng1, lat2, lng2, mode):
+    if mode == 'spherical':
+        return haversine(lat1, lng1, lat2, lng2)
+    elif mode == 'ellipsoidal':
+        return vincenty_inverse(lat1, lng1, lat2, lng2)
+    else:
+        raise ValueError('Unknown mode: {mode}'.format(mode=mode))
+
+
+def bounding_boxes(points : list, buffer_size, mode='ellipsoidal'):
+    """
+    Computes the bounding boxes around points by buffer_size (unit: meters, one value or one per
+    point). Returns arrays of north, south, east and west coordinates in degrees.
+    """
+    latitudes, longitudes = _coordinates(points)
+
+    if mode == 'spherical':
+        destination = great_circle_destination
+    elif mode == 'ellipsoidal':
+        destination = vincenty_direct
+    else:
+        raise ValueError('Unknown mode: {mode}'.format(mode=mode))
+
+    # bearings north, south, east and west
+    bearings = np.radians([0.0, 180.0, 90.0, 270.0])
+    lat2, lng2 = destination(
+        latitudes[..., np.newaxis],
+        longitudes[..., np.newaxis],
+        bearings,
+        np.asarray(buffer_size, dtype=float)[..., np.newaxis]
+    )
+
+    lat2, lng2 = np.degrees(lat2), _wrap_longitude(np.degrees(lng2))
 
     return {
-        'north': translate.destination(point=start, bearing=0).latitude,
-        'south': translate.destination(point=start, bearing=180).latitude,
-        'east': translate.destination(point=start, bearing=90).longitude,
-        'west': translate.destination(point=start, bearing=270).longitude
+        'north': lat2[..., 0],
+        'south': lat2[..., 1],
+        'east': lng2[..., 2],
+        'west': lng2[..., 3]
     }
 
 
-def distance_geocodes(p1: dict, p2 : dict):
+def bounding_box(point : dict, buffer_size, mode='ellipsoidal'):
+    """
+    Computes the bounding box around a point by buffer_size (unit: meters).
+    """
+    return dict((k, float(v)) for k, v in bounding_boxes(point, buffer_size, mode=mode).items())
+
+
+def distances_geocodes(p1 : dict, points : list, mode='ellipsoidal'):
+    """
+    Computes the distances in meters between a point and many points at once.
+    """
+    lat1, lng1 = _coordinates(p1)
+    lat2, lng2 = _coordinates(points)
+
+    return _distances(lat1, lng1, lat2, lng2, mode)
+
+
+def pairwise_distances(points1 : list, points2 : list, mode='ellipsoidal'):
+    """
+    Computes the distances in meters between all pairs of points, as a len(points1) x len(points2)
+    matrix.
+    """
+    lat1, lng1 = _coordinates(points1)
+    lat2, lng2 = _coordinates(points2)
+
+    return _distances(lat1[:, np.newaxis], lng1[:, np.newaxis], lat2, lng2, mode)
+
+
+def distance_geocodes(p1: dict, p2 : dict, mode='ellipsoidal'):
     """
     Computes the distance in meters between two point.
     """
-    return geopy.distance.vincenty(geopy.Point(**p1), geopy.Point(**p2)).meters
+    lat1, lng1 = _coordinates(p1)
+    lat2, lng2 = _coordinates(p2)
 
+    return float(_distances(lat1, lng1, lat2, lng2, mode))
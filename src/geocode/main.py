@@ -3,27 +3,46 @@ Retrieves coordinates for entities (accommodations, points of interest and desti
 includes enough information to determine the entity (ID and type) and its location (e.g. address for
 accommodations).
 
-The geocoder can be triggered using the Kinesis stream. Output is written to DynamoDB.
+The geocoder can be triggered using the Kinesis stream. Output is written to DynamoDB, and
+historized through a buffered sink (see history).
 
 More complex functionality:
-- Results are stored in a cache database for a certain amount of time (CACHE_TTL). This prevents
-  unnecessary quota spending (e.g. Kafka changes on irrelevant fields).
+- Results are cached for a certain amount of time (CACHE_TTL). This prevents unnecessary quota
+  spending (e.g. Kafka changes on irrelevant fields). Without REDIS_HOST (as deployed) the cache is
+  kept per container (see cache).
+- Addresses for which a provider finds no results are kept in a negative cache for a shorter
+  time, so they are not sent to the provider again on every change event.
 - The DynamoDB table has time-to-live enabled to conform to storage restrictions imposed by
   individual providers. In case of no restrictions, results are kept indefinitely unless updated.
 - Automatic provider disabling and reenabling in case of quota exhaustion.
-- Tasks that fail due to server side faults or quota exhaustion are rescheduled the next day.
+- Calls are counted against a daily budget per provider and key. Bulk tasks (with a batch_id) are
+  paced over the day and leave a reserve for real-time tasks (see budget).
+- Real-time and bulk tasks are queued in separate lanes that share the provider slots by weight,
+  so real-time tasks are not held up by large batches (see executor).
+- Tasks for slow providers can be hedged: a backup provider receives the address once the provider
+  takes longer than usual, and the first result is kept (see hedge).
+- Tasks that fail due to server side faults or quota exhaustion are rescheduled through the buffer
+  queue, once the quota of the provider resets (see reschedule).
+- Tasks of later provider fan-out stages (see router.planner) are skipped if the consolidation of
+  the entity already reached their consolidation threshold.
+- Items in DynamoDB only hold the fields read by the consolidator, the rest of a result is stored
+  compressed or dropped (see projection).
+- Addresses are canonicalized (casing, accents, whitespace, house numbers, country codes) before
+  they are hashed and sent to a provider.
 - Address information supplied to a provider is reduced interatively until a result is obtained.
   You can specify address fields which should always be supplied (e.g. country code)
 - In many cases you can supply a guess coordinate to bias results.
 """
+import atexit
 import base64
 import collections
+import copy
 import hashlib
-import itertools
 import json
 import logging
 import os
 import datetime
+import threading
 import time
 
 import boto3
@@ -31,7 +50,8 @@ import jsonschema
 import redis
 import rollbar
 
-from geocode import entity, logger, helpers
+from geocode import budget, cache, canonical, coalesce, entity, executor, hedge, history, logger, helpers, projection, quota, reschedule, transport
+from geocode.providers.base import CONFIG as PROVIDER_CONFIG
 
 print("Main imports")
 
@@ -49,37 +69,51 @@ if ROLLBAR['environment'] in ('production',):
 SCHEMA = helpers.load_validation_schema()
 
 # Parameters
-EXHAUSTED = dict()  # providers for which quota is exhausted
+QUOTA = quota.STORE  # providers and keys for which quota is exhausted (shared by all workers)
+QUOTA_LOCK = threading.Lock()
 CACHE_TTL = 60*60*24*30     # time spent in cache layer in seconds
+PRIORITY_WEIGHTS = {        # share of provider slots per priority class while both have tasks waiting
+    budget.HIGH: 4,
+    budget.LOW: 1
+}
 
+# Cache layer (in-process LRU in front of Redis)
+CACHE = cache.ResultCache(cache.connect(), ttl=CACHE_TTL)
 
-def batch(iterable, batch_size=1):
-    """
-    Batches an iterable in chunks of size batch_size.
-    """
-    sourceiter = iter(iterable)
-    while True:
-        batchiter = itertools.islice(sourceiter, batch_size)
-        yield itertools.chain([next(batchiter)], batchiter)
+# Negative cache layer (addresses without results, shorter TTL)
+NEGATIVE_CACHE = cache.NegativeCache(CACHE.client)
 
+# Task execution (thread pool with per-provider concurrency limits and priority lanes)
+EXECUTOR = executor.TaskExecutor(
+    limit=lambda provider: provider_concurrency(provider),
+    priority=lambda task: task_priority(task),
+    weights=PRIORITY_WEIGHTS
+)
 
-def send_to_buffer_queue(task_batch):
-    """
-    Sends geocoder tasks to the buffer stream to be processed at a later date.
-    """
-    queue = boto3.resource('sqs').get_queue_by_name(QueueName=os.environ.get('QUEUE'))
+# Request coalescing (identical in-flight requests share one provider call)
+SINGLE_FLIGHT = coalesce.SingleFlight()
+
+# Hedging (slow tasks are raced against the backup provider, on a pool of their own)
+HEDGER = hedge.Hedger(PROVIDER_CONFIG)
+
+# DynamoDB client shared by all writes to the geocoder table (created on first use)
+DYNAMODB = None
+DYNAMODB_LOCK = threading.Lock()
+
+# Stored item sizes (full results versus projected items)
+PROJECTION_STATISTICS = projection.Statistics()
+
+# Historization (buffered, written on a background thread)
+HISTORY = history.HistorySink(history.load_backend())
+atexit.register(HISTORY.flush)
 
-    for sqs_batch in batch(task_batch, batch_size=10):
-        response = queue.send_messages(
-            Entries=[
-                {
-                    'Id': str(i),
-                    'MessageBody': json.dumps(task)
-                } for i, task in enumerate(sqs_batch)
-            ]
-        )
+# City index of the local provider, a deployed geocoder fails its cold start without destinations
+if os.environ.get('DESTINATIONS'):
+    from geocode.providers import local
+    local.load_index()
 
-    return response
+# Rescheduling (delayed via the buffer queue, or parked until the provider is reenabled)
+RESCHEDULER = reschedule.Rescheduler(reschedule.load_backlog())
 
 
 def load_provider(provider):
@@ -112,21 +146,82 @@ def check_exhausted_quota():
     """
     current_timestamp = datetime.datetime.now().timestamp()
 
-    reenable = []
-    for k, v in EXHAUSTED.items():
-        if current_timestamp > v:
-            reenable.append(k)
+    with QUOTA_LOCK:
+        reenable = []
+        for k, v in QUOTA.disabled().items():
+            if current_timestamp > v:
+                reenable.append(k)
 
-            event = {
-                'state': 'provider reenabling',
-                'field': 'timestamp',
-                'value': v
-            }
+                event = {
+                    'state': 'provider reenabling',
+                    'field': 'timestamp',
+                    'value': v
+                }
+
+                logger.log_event(logging.INFO, event, provider=k)
+
+        for provider in reenable:
+            QUOTA.enable(provider)
+
+
+def disable_provider(provider):
+    """
+    Disable processing for a provider until its quota resets. Safe to call from concurrent tasks,
+    the provider is only disabled (and logged) once per container.
+    """
+    with QUOTA_LOCK:
+        if QUOTA.is_disabled(provider):
+            return
+
+        provider_object = load_provider(provider)
+        reset_timestamp = provider_object.quota_reset()
+        QUOTA.disable(provider, reset_timestamp)
+
+        event = {
+            'state': 'provider disabling',
+            'field': 'timestamp',
+            'value': reset_timestamp
+        }
 
-            logger.log_event(logging.INFO, event, provider=k)
+        logger.log_event(logging.INFO, event, provider=provider)
 
-    for provider in reenable:
-        del EXHAUSTED[provider]
+
+def drain_backlog():
+    """
+    Readmit parked tasks for all enabled providers, paced by their rate limit.
+    """
+    from geocode.providers.base import CONFIG
+
+    for provider, config in CONFIG.items():
+        if not isinstance(config, dict) or QUOTA.is_disabled(provider):
+            continue
+
+        RESCHEDULER.drain(provider, qps=(config.get('rate_limit') or {}).get('qps'))
+
+
+def sync_budgets():
+    """
+    Share the calls counted by this container with all workers and log the budget statistics.
+    """
+    from geocode.providers.base import BUDGET
+
+    BUDGET.sync()
+    BUDGET.log_statistics()
+
+
+def task_priority(task : dict):
+    """
+    Return the priority class of a task (see budget): tasks that are part of a batch are bulk
+    traffic, others are real-time updates.
+    """
+    return budget.LOW if task.get('batch_id') else budget.HIGH
+
+
+def provider_concurrency(provider):
+    """
+    Return the maximum number of concurrent requests for a provider, None if unlimited.
+    """
+    return load_provider(provider).concurrency
 
 
 def cache_hash(task, geocoder_version):
@@ -187,31 +282,123 @@ def load_tasks(records : list):
     return tasks
 
 
-# def load_cache(tasks : list):
-#     """
-#     Returns cache keys and if present, cache results for the given tasks, None otherwise.
-#     """
-#     keys = []
-#
-#     read_pipe = REDIS.pipeline()
-#
-#     for task in tasks:
-#         provider = load_provider(task['provider'])
-#
-#         key = cache_hash(task, provider.version)
-#
-#         read_pipe.get(key)
-#         keys.append(key)
-#
-#
-#     cache = None
-#     while not cache:
-#         try:
-#             cache = map(lambda x: json.loads(x) if x else None, read_pipe.execute())
-#         except TimeoutError:
-#             time.sleep(5)
-#
-#     return keys, cache
+def canonicalize_tasks(tasks : list):
+    """
+    Replace the address of each task by its canonical form, so that the same address in another
+    shape shares cache entries and provider calls. Logs how many distinct keys were merged.
+    """
+    received, merged = set(), set()
+
+    for task in tasks:
+        received.add((task['provider'], json.dumps(task['address'], sort_keys=True)))
+
+        task['address'] = canonical.canonicalize(task['address'])
+
+        merged.add((task['provider'], json.dumps(task['address'], sort_keys=True)))
+
+    if tasks:
+        event = {
+            'state': 'address canonicalization',
+            'value': {
+                'tasks': len(tasks),
+                'keys': len(merged),
+                'merged': len(received) - len(merged)
+            }
+        }
+
+        logger.log_event(logging.INFO, event)
+
+    return tasks
+
+
+def load_consolidation_scores(entities : list):
+    """
+    Returns the score of the current consolidation per entity key, for entities that have one.
+    """
+    dynamodb = boto3.resource('dynamodb')
+    table_name = os.environ.get('TABLE')
+    provider = 'consolidated_{environment}'.format(environment=os.environ.get('ENVIRONMENT'))
+
+    scores = {}
+
+    for i in range(0, len(entities), 100):
+        request = {
+            table_name: {
+                'Keys': [{'entity': entity, 'provider': provider} for entity in entities[i:i + 100]],
+                'ProjectionExpression': 'entity, score'
+            }
+        }
+
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+
+            for item in response['Responses'].get(table_name, []):
+                scores[item['entity']] = float(item['score'])
+
+            request = response.get('UnprocessedKeys')
+
+    return scores
+
+
+def filter_staged_tasks(tasks : list):
+    """
+    Drops tasks of later fan-out stages (tasks with a consolidation_threshold) for entities whose
+    consolidation already reached the threshold, these provider calls are not needed anymore.
+    """
+    staged = [task for task in tasks if 'consolidation_threshold' in task]
+
+    if not staged:
+        return tasks
+
+    scores = load_consolidation_scores(
+        sorted(set('{entity_type}:{entity_id}'.format(**task) for task in staged))
+    )
+
+    remaining = []
+    for task in tasks:
+        score = scores.get('{entity_type}:{entity_id}'.format(**task))
+
+        if 'consolidation_threshold' in task and score is not None and \
+                score >= task['consolidation_threshold']:
+            log_task = dict((k, task.get(k)) for k in ('entity_id', 'entity_type', 'batch_id', 'provider'))
+            logger.log_status(logging.INFO, 'SKIPPED', status_code=-3, **log_task)
+        else:
+            remaining.append(task)
+
+    return remaining
+
+
+def load_cache(tasks : list):
+    """
+    Returns cache keys and if present, cache results for the given tasks, None otherwise.
+    """
+    keys = []
+
+    for task in tasks:
+        provider = load_provider(task['provider'])
+
+        keys.append(cache_hash(task, provider.version))
+
+    cache_results = CACHE.get_many(keys, [task['provider'] for task in tasks])
+
+    return keys, cache_results
+
+
+def rebind_result(result : dict, task : dict):
+    """
+    Attach the entity identifiers of a task to a result obtained for another entity with the same
+    address (cache hits and coalesced requests).
+    """
+    result.update(dict(
+        entity_id=task['entity_id'],
+        entity_type=task['entity_type'],
+        provider=task['provider'],
+        batch_id=task.get('batch_id')
+    ))
+
+    result['entity'] = '{entity_type}:{entity_id}'.format(**task)
+
+    return result
 
 
 def filter_tasks(keys : list, tasks : list, cache : list):
@@ -219,20 +406,11 @@ def filter_tasks(keys : list, tasks : list, cache : list):
     Returns keys and tasks for which cache results are inexistent or irrelevant (not same address).
     Complete tasks get written to DynamoDB.
     """
-    table = boto3.resource('dynamodb').Table(os.environ.get('TABLE'))
-
-    with helpers.BatchWriterOCC(table, overwrite_by_pkeys=('entity', 'provider')) as batch_writer:
+    with helpers.ClientBatchWriterOCC(os.environ.get('TABLE'), dynamodb_client(), overwrite_by_pkeys=('entity', 'provider')) as batch_writer:
         for key, task, cache_result in zip(keys, tasks, cache):
             if cache_result and task['address'] == cache_result['meta'].get('address'):
                 # add entity identifiers
-                cache_result.update(dict(
-                    entity_id=task['entity_id'],
-                    entity_type=task['entity_type'],
-                    provider=task['provider'],
-                    batch_id=task.get('batch_id')
-                ))
-
-                cache_result['entity'] = '{entity_type}:{entity_id}'.format(**task)
+                cache_result = rebind_result(cache_result, task)
 
                 task = dict(
                     entity_id=task['entity_id'],
@@ -249,7 +427,7 @@ def filter_tasks(keys : list, tasks : list, cache : list):
                 logger.log_status(logging.INFO, 'CACHE', status_code=0, **task)
 
                 batch_writer.put_item(
-                    Item=helpers.dynamo_sanitize(cache_result)
+                    Item=store_item(cache_result)
                 )
             else:
                 yield key, task
@@ -258,44 +436,148 @@ def filter_tasks(keys : list, tasks : list, cache : list):
 def geocode_task(task : dict):
     """
     Runs a task through the specified geocoding API. If the quota for the provider is exceeded,
-    return None.
+    the provider is disabled so that concurrent and later tasks fail fast. Tasks over the daily
+    budget of the provider are deferred. Addresses for which the provider recently found no results
+    are not sent again.
     """
-    if task['provider'] in EXHAUSTED:
+    if QUOTA.is_disabled(task['provider']):
         raise helpers.QuotaExhaustedError(task['provider'])
 
     provider_object = load_provider(task['provider'])
+    provider_object.admit(task_priority(task))
+    key = cache_hash(task, provider_object.version)
+
+    if NEGATIVE_CACHE.contains(key, task['provider']):
+        raise helpers.NegativeCacheHitError(task['provider'])
+
     entity_object = load_entity(
         task['entity_id'],
         task['entity_type'],
         task['address']
     )
 
-    result = provider_object.geocode(entity_object)
+    try:
+        result = provider_object.geocode(entity_object)
+    except helpers.QuotaExhaustedError:
+        disable_provider(task['provider'])
+        raise
+    except helpers.NoResultsFoundError:
+        NEGATIVE_CACHE.add(key)
+        raise
 
     return result
 
 
-def store_results(results : dict):
+def geocode_task_hedged(task : dict):
+    """
+    Runs a task like geocode_task, hedged with the backup provider of the task provider if one is
+    configured. The result can come from the backup provider (see its provider field).
+    """
+    return HEDGER.run(task, geocode_task)
+
+
+def geocode_task_coalesced(task : dict):
+    """
+    Runs a task like geocode_task_hedged, but a request for the same address and provider that is
+    already in flight is joined instead of sent again. The result is shared, copy it before
+    modifying.
     """
-    Writes results to DynamoDB, Firehose (historization) and update cache layer.
+    key = cache_hash(task, load_provider(task['provider']).version)
+
+    return SINGLE_FLIGHT.do(key, geocode_task_hedged, task)
+
+
+def geocode_tasks(tasks : list, concurrency=None):
+    """
+    Runs tasks like geocode_task, the tasks of each provider sent as one chunk through
+    Geocoder.geocode_many (batch requests for geocoders with a batch endpoint). Tasks sharing an
+    address and provider are sent once. Returns the result or the error raised per task, in the
+    order of the tasks. Results are shared, copy them before modifying. Tasks are not hedged.
+    """
+    outcomes = [None] * len(tasks)
+    chunks = collections.defaultdict(collections.OrderedDict)     # provider: key: (entity, task indices)
+
+    for i, task in enumerate(tasks):
+        try:
+            if QUOTA.is_disabled(task['provider']):
+                raise helpers.QuotaExhaustedError(task['provider'])
+
+            provider_object = load_provider(task['provider'])
+            provider_object.admit(task_priority(task))
+            key = cache_hash(task, provider_object.version)
+
+            if NEGATIVE_CACHE.contains(key, task['provider']):
+                raise helpers.NegativeCacheHitError(task['provider'])
+
+            entity_object = load_entity(task['entity_id'], task['entity_type'], task['address'])
+        except helpers.GeocoderError as error:
+            outcomes[i] = error
+            continue
+
+        chunks[task['provider']].setdefault(key, (entity_object, []))[1].append(i)
+
+    for provider, chunk in chunks.items():
+        results = load_provider(provider).geocode_many([e for e, _ in chunk.values()], concurrency)
+
+        for (key, (_, indices)), result in zip(chunk.items(), results):
+            if isinstance(result, helpers.QuotaExhaustedError):
+                disable_provider(provider)
+            elif isinstance(result, helpers.NoResultsFoundError):
+                NEGATIVE_CACHE.add(key)
+
+            for i in indices:
+                outcomes[i] = result
+
+    return outcomes
+
+
+def dynamodb_client():
+    """
+    Return the DynamoDB client of this container, connections are reused across writes.
+    """
+    global DYNAMODB
+
+    with DYNAMODB_LOCK:
+        if DYNAMODB is None:
+            DYNAMODB = boto3.client('dynamodb')
+
+        return DYNAMODB
+
+
+def store_item(result : dict):
+    """
+    Return the DynamoDB item for a result (see projection).
+    """
+    item = projection.project(result)
+    PROJECTION_STATISTICS.observe(result, item)
+
+    return item
+
+
+def store_results(results : list):
+    """
+    Writes results to DynamoDB, the history sink and update cache layer. Results are supplied as
+    (cache key, result) pairs.
     """
     if not results:
         return
 
-    # write_pipe = REDIS.pipeline()
+    # to the history sink, written in the background
+    HISTORY.add(result for _, result in results)
 
-    # for k, v in results.items():
-    #     write_pipe.set(k, json.dumps(v), CACHE_TTL)
-    
-    # write_pipe.execute()
+    # to cache layer, never longer than the provider allows results to be stored
+    items = []
+    for key, result in results:
+        ttl = load_provider(result['provider']).ttl
+        items.append((key, result, min(ttl, CACHE_TTL) if ttl else CACHE_TTL))
 
-    # to DynamoDB
-    table = boto3.resource('dynamodb').Table(os.environ.get('TABLE'))
+    CACHE.set_many(items)
 
-    with helpers.BatchWriterOCC(table, overwrite_by_pkeys=('entity', 'provider')) as batch_writer:
-        for result in results:
+    # to DynamoDB
+    with helpers.ClientBatchWriterOCC(os.environ.get('TABLE'), dynamodb_client(), overwrite_by_pkeys=('entity', 'provider')) as batch_writer:
+        for _, result in results:
             batch_writer.put_item(
-                Item=helpers.dynamo_sanitize(result)
+                Item=store_item(result)
             )
 
 
@@ -332,61 +614,83 @@ def lambda_handler(event, context):
     """
     try:
         check_exhausted_quota()
+        drain_backlog()
 
-        tasks = load_tasks(event['Records'])
-        # keys, cache = load_cache(tasks)
+        tasks = filter_staged_tasks(canonicalize_tasks(load_tasks(event['Records'])))
+        keys, cache_results = load_cache(tasks)
 
         results = []
         reschedules = []
 
-        # for key, task in filter_tasks(keys, tasks, cache):
-        for task in tasks:
-            log_data = dict(
-                entity_id=task['entity_id'],
-                entity_type=task['entity_type'],
-                batch_id=task.get('batch_id'),
-                provider=task['provider']
-            )
+        # tasks sharing an address and provider are sent once
+        pending = coalesce.group_by_key(filter_tasks(keys, tasks, cache_results))
+
+        # a request shared by real-time and bulk tasks is sent with the real-time priority
+        for group in pending.values():
+            group.sort(key=lambda task: task_priority(task) != budget.HIGH)
+
+        futures = EXECUTOR.map(geocode_task_coalesced, [group[0] for group in pending.values()])
+
+        for (key, group), future in zip(pending.items(), futures):
+            for task in group:
+                log_data = dict(
+                    entity_id=task['entity_id'],
+                    entity_type=task['entity_type'],
+                    batch_id=task.get('batch_id'),
+                    provider=task['provider']
+                )
+
+                if task is not group[0]:
+                    event = dict(
+                        state='sharing coalesced request'
+                    )
+
+                    logger.log_event(logging.INFO, event, **log_data)
+
+                try:
+                    task_result = copy.deepcopy(future.result())
+
+                    if task_result['provider'] != task['provider']:
+                        # answered by the backup provider, stored as a result of that provider
+                        hedged_task = dict(task, provider=task_result['provider'])
+                        hedged_key = cache_hash(hedged_task, load_provider(hedged_task['provider']).version)
+
+                        results.append((hedged_key, rebind_result(task_result, hedged_task)))
+                    else:
+                        results.append((key, rebind_result(task_result, task)))
+
+                    logger.log_status(logging.INFO, 'OK', status_code=0, **log_data)
+                except helpers.NoResultsFoundError as error:
+                    logger.log_status(logging.INFO, error.status, status_code=error.status_code, **log_data)
+                except (helpers.FailedRequestError, helpers.RateLimitExceededError) as error:
+                    # Task failed on geocoder end or too many retries
+                    logger.log_status(logging.WARNING, error.status, status_code=error.status_code, **log_data)
+                except helpers.InvalidRequestError as error:
+                    # Error on our end, report the task and return no results
+                    logger.log_status(logging.WARNING, error.status, status_code=error.status_code, **log_data)
+                    rollbar.report_exc_info(payload_data=task['address'])
+                except helpers.BudgetDeferredError as error:
+                    # over the budget for this time of the day, retry once the pace allows it
+                    logger.log_status(logging.INFO, 'RESCHEDULE', status_code=-2, **log_data)
+                    reschedules.append((task, error.available_at))
+                except helpers.QuotaExhaustedError:
+                    # provider is disabled by geocode_task, retry once the quota resets
+                    logger.log_status(logging.INFO, 'RESCHEDULE', status_code=-2, **log_data)
+                    reschedules.append((task, QUOTA.disabled().get(task['provider'])))
+                except helpers.GeocoderError:
+                    # retry after a short delay
+                    logger.log_status(logging.WARNING, 'RESCHEDULE', status_code=-2, **log_data)
+                    reschedules.append((task, None))
 
-            try:
-                task_result = geocode_task(task)
-                task_result['batch_id'] = task.get('batch_id')
-                results.append(task_result)
-
-                logger.log_status(logging.INFO, 'OK', status_code=0, **log_data)
-            except helpers.NoResultsFoundError as error:
-                logger.log_status(logging.INFO, error.status, status_code=error.status_code, **log_data)
-            except (helpers.FailedRequestError, helpers.RateLimitExceededError) as error:
-                # Task failed on geocoder end or too many retries
-                logger.log_status(logging.WARNING, error.status, status_code=error.status_code, **log_data)
-            except helpers.InvalidRequestError as error:
-                # Error on our end, report the task and return no results
-                logger.log_status(logging.WARNING, error.status, status_code=error.status_code, **log_data)
-                rollbar.report_exc_info(payload_data=task['address'])
-            except helpers.QuotaExhaustedError:
-                provider = task['provider']
-
-                if provider not in EXHAUSTED:
-                    # disable processing for provider
-                    provider_object = load_provider(provider)
-                    EXHAUSTED[provider] = provider_object.quota_reset()
-
-                    event = {
-                        'state': 'provider disabling',
-                        'field': 'timestamp',
-                        'value': EXHAUSTED[provider]
-                    }
-
-                    logger.log_event(logging.INFO, event, provider=provider)
-
-                logger.log_status(logging.INFO, 'RESCHEDULE', status_code=-2, **log_data)
-                reschedules.append(task)
-            except helpers.GeocoderError:
-                reschedules.append(task)
-        
         store_results(results)
-        # if reschedules:
-        #     send_to_buffer_queue(reschedules)
+        CACHE.log_statistics()
+        NEGATIVE_CACHE.log_statistics()
+        PROJECTION_STATISTICS.log_statistics()
+        transport.SESSIONS.log_statistics()
+        sync_budgets()
+
+        if reschedules:
+            RESCHEDULER.reschedule(reschedules)
 
     except Exception as error:
         logger.log_exception(error)
@@ -396,3 +700,6 @@ def lambda_handler(event, context):
             rollbar.report_exc_info()
 
         raise error
+    finally:
+        # a frozen or reclaimed container never writes its buffer, see history
+        HISTORY.flush()
@@ -0,0 +1,100 @@
+"""
+Adaptive result paging for providers that return many candidates per request (maxRows). Instead of
+always asking for 100 results, a provider starts with a small page and only asks for a wider page
+when the best candidate scores below a confidence threshold. Configured by the `paging` section of
+a provider in data/config.yml:
+
+    paging:
+      initial: 10       # page size until enough winners are observed
+      minimum: 25       # page size is never tuned below this (default initial or maximum / GROWTH)
+      maximum: 100      # page size is never widened beyond this
+      confidence: 0.6   # fraction of the maximum score that is accepted (0 never widens)
+
+The page size is tuned per provider from the observed positions of the winning candidates: once
+enough winners are observed, the page covers the 95th percentile of their positions.
+
+Every widened page is another paid request. A page of `minimum` rows takes up to
+log_GROWTH(maximum / minimum) extra requests to reach the maximum, so a low minimum trades fewer
+rows per request for more paid requests on a miss. The default minimum is maximum / GROWTH, which
+costs at most one, unless the initial page is smaller: tuning never asks for more rows than the
+initial page.
+"""
+import collections
+import math
+import threading
+
+
+OBSERVATIONS = 200      # winner positions kept per provider
+MIN_OBSERVATIONS = 50   # winner positions needed before tuning
+PERCENTILE = 95         # percentile of winner positions covered by the page
+CONFIDENCE = 0.6
+GROWTH = 4              # factor by which a page is widened
+
+
+class PageSizer:
+    """
+    Page size of one provider, tuned from the positions of winning candidates.
+    """
+    def __init__(self, initial=10, minimum=None, maximum=100, confidence=CONFIDENCE):
+        self.initial = initial
+        self.minimum = minimum if minimum is not None else min(initial, max(1, maximum // GROWTH))
+        self.maximum = maximum
+        self.confidence = confidence
+
+        self.positions = collections.deque(maxlen=OBSERVATIONS)
+        self._lock = threading.Lock()
+
+    def size(self):
+        """
+        Return the page size for the next request.
+        """
+        with self._lock:
+            if len(self.positions) < MIN_OBSERVATIONS:
+                return self.initial
+
+            positions = sorted(self.positions)
+
+        index = int(math.ceil(PERCENTILE / 100.0 * len(positions))) - 1
+
+        return max(self.minimum, min(self.maximum, positions[index] + 1))
+
+    def widen(self, size : int):
+        """
+        Return the next page size after a page of the given size was not good enough, None if the
+        page cannot be widened.
+        """
+        if size >= self.maximum:
+            return None
+
+        return min(self.maximum, size * GROWTH)
+
+    def confident(self, score : float, max_score : float):
+        """
+        Return whether a candidate score is high enough to stop widening.
+        """
+        return score >= self.confidence * max_score
+
+    def observe(self, position : int):
+        """
+        Register the position of the winning candidate in a response.
+        """
+        with self._lock:
+            self.positions.append(position)
+
+
+class Pager:
+    """
+    Registry of page sizers per provider, None for providers without paging.
+    """
+    def __init__(self, config : dict):
+        self.config = config
+        self.sizers = {}
+        self._lock = threading.Lock()
+
+    def sizer(self, provider : str):
+        with self._lock:
+            if provider not in self.sizers:
+                paging = (self.config.get(provider) or {}).get('paging')
+                self.sizers[provider] = PageSizer(**paging) if paging else None
+
+            return self.sizers[provider]
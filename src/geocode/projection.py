@@ -0,0 +1,151 @@
+"""
+Compact stored representation of geocoder results. A result holds the whole response of the
+geocoder package (raw payload included), but the consolidator only reads the keys, coordinates,
+quality fields and returned address of an item (see consolidator.utils.fetcher). Items written to
+the geocodes table are projected on those fields.
+
+The rest of the result is kept gzip compressed in the binary PAYLOAD attribute if STORE_PAYLOAD is
+set (the default), and dropped otherwise. Payloads larger than PAYLOAD_LIMIT after compression are
+always dropped. Use expand to restore a result from an item.
+
+DynamoDB charges a write unit per started KB of an item and a read unit per started 4 KB (half for
+eventually consistent reads). Item sizes are estimated the way DynamoDB counts them, so the units
+saved by the projection can be logged (see Statistics).
+"""
+import collections
+import gzip
+import json
+import logging
+import math
+import os
+import threading
+
+from geocode import logger
+
+
+KEYS = ('entity', 'provider', 'entity_id', 'entity_type', 'batch_id', 'timestamp')
+FIELDS = ('longitude', 'latitude', 'accuracy', 'confidence', 'quality', 'score')
+META_FIELDS = ('address_out', 'address', 'distance')
+PAYLOAD = 'payload'
+PAYLOAD_LIMIT = 64 * 1024   # compressed bytes, items are limited to 400 KB
+STORE_PAYLOAD = os.environ.get('STORE_PAYLOAD', 'true').lower() == 'true'
+WRITE_UNIT = 1024
+READ_UNIT = 4096
+
+
+def compress(data : dict):
+    return gzip.compress(json.dumps(data, default=str, separators=(',', ':')).encode('utf-8'))
+
+
+def decompress(data : bytes):
+    return json.loads(gzip.decompress(bytes(data)).decode('utf-8'))
+
+
+def project(result : dict, store_payload=None):
+    """
+    Return the item stored for a result: the fields read by the consolidator, and the rest of the
+    result compressed if payloads are stored.
+    """
+    if store_payload is None:
+        store_payload = STORE_PAYLOAD
+
+    item = dict((k, result[k]) for k in KEYS + FIELDS if result.get(k) is not None)
+
+    meta = result.get('meta') or {}
+    item['meta'] = dict((k, meta[k]) for k in META_FIELDS if meta.get(k) is not None)
+
+    if store_payload:
+        rest = dict((k, v) for k, v in result.items() if k not in item)
+        rest['meta'] = dict((k, v) for k, v in meta.items() if k not in item['meta'])
+
+        payload = compress(rest)
+        if len(payload) <= PAYLOAD_LIMIT:
+            item[PAYLOAD] = payload
+
+    return item
+
+
+def expand(item : dict):
+    """
+    Return the result an item was projected from, as far as it was stored.
+    """
+    result = dict((k, v) for k, v in item.items() if k != PAYLOAD)
+
+    if item.get(PAYLOAD) is not None:
+        rest = decompress(getattr(item[PAYLOAD], 'value', item[PAYLOAD]))
+        meta = dict(rest.pop('meta', {}), **result.get('meta', {}))
+
+        result.update(rest)
+        result['meta'] = meta
+
+    return result
+
+
+def value_size(value):
+    """
+    Estimate the size of an attribute value as DynamoDB counts it.
+    """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(len(str(k).encode('utf-8')) + value_size(v) + 1 for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 3 + sum(value_size(v) + 1 for v in value)
+
+    # numbers: 1 byte per 2 significant digits, plus 1
+    digits = str(value).lstrip('-').replace('.', '').strip('0') or '0'
+    return int(math.ceil(len(digits) / 2.0)) + 1
+
+
+def item_size(item : dict):
+    """
+    Estimate the size of an item in bytes, as DynamoDB counts it.
+    """
+    return sum(len(k.encode('utf-8')) + value_size(v) for k, v in item.items())
+
+
+def write_units(size : int):
+    return int(math.ceil(size / WRITE_UNIT))
+
+
+def read_units(size : int):
+    return int(math.ceil(size / READ_UNIT))
+
+
+class Statistics:
+    """
+    Bytes and capacity units per provider, of the full results and of the stored items.
+    """
+    def __init__(self):
+        self.counts = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+
+    def observe(self, result : dict, item : dict):
+        full, stored = item_size(result), item_size(item)
+
+        with self._lock:
+            self.counts[result['provider']].update(dict(
+                items=1,
+                full_bytes=full,
+                stored_bytes=stored,
+                full_write_units=write_units(full),
+                stored_write_units=write_units(stored),
+                full_read_units=read_units(full),
+                stored_read_units=read_units(stored)
+            ))
+
+    def log_statistics(self):
+        with self._lock:
+            counts, self.counts = self.counts, collections.defaultdict(collections.Counter)
+
+        for provider, value in counts.items():
+            event = {
+                'state': 'result projection',
+                'value': dict(value)
+            }
+
+            logger.log_event(logging.INFO, event, provider=provider)
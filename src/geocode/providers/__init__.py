@@ -7,3 +7,4 @@ from .mapquest import Mapquest
 from .osm import Osm
 from .tomtom import Tomtom
 from .geonames import Geonames
+from .local import Local
@@ -1,11 +1,17 @@
 """
 Arcgis geocoder.
 """
+import json
+
 import geocoder
 
 from geocode import helpers
 from geocode.providers.base import Geocoder, geocoder_process
 
+
+BATCH_URL = 'https://geocode.arcgis.com/arcgis/rest/services/World/GeocodeServer/geocodeAddresses'
+
+
 class Arcgis(Geocoder):
     """
     Arcgis geocoding service.
@@ -27,7 +33,7 @@ class Arcgis(Geocoder):
         ] if i in address])
 
     @geocoder_process
-    def _geocode(self, address):
+    def _geocode(self, address, max_rows=100):
         """
         Error handling is based on Arcgis geocoding API documentation.
 
@@ -38,7 +44,7 @@ class Arcgis(Geocoder):
         try:
             query = self.format_address(address)
             #response = geocoder.arcgis(query, maxRows=100, **key)
-            response = geocoder.arcgis(query, maxRows=100)
+            response = geocoder.arcgis(query, maxRows=max_rows, **self._request_options())
 
             if response.ok:
                 return map(lambda x: x.json, response)
@@ -62,6 +68,58 @@ class Arcgis(Geocoder):
 
         raise helpers.NoResultsFoundError(self.name)
 
+    def _geocode_batch(self, addresses):
+        """
+        Geocode addresses with the geocodeAddresses operation, which returns the best candidate per
+        address. Batch geocoding requires a token.
+
+        .. _Arcgis: https://developers.arcgis.com/rest/geocode/api-reference/geocoding-geocode-addresses.htm
+        """
+        records = [
+            {'attributes': {'OBJECTID': i, 'SingleLine': self.format_address(address)}}
+            for i, address in enumerate(addresses)
+        ]
+
+        params = {
+            'f': 'json',
+            'addresses': json.dumps({'records': records})
+        }
+
+        key = self._active_key()
+        if key:
+            params['token'] = key['key']
+
+        try:
+            response = self.session.post(self.endpoint or BATCH_URL, data=params, timeout=self.timeout)
+            content = response.json()
+        except Exception:
+            raise helpers.FailedRequestError(self.name)
+
+        if 'error' in content:
+            if content['error'].get('code') == 400:
+                raise helpers.InvalidRequestError(self.name, content['error'].get('message'))
+            raise helpers.FailedRequestError(self.name)
+
+        responses = [[] for _ in addresses]
+
+        for location in content.get('locations', []):
+            attributes = location.get('attributes', {})
+            coordinates = location.get('location') or {}
+
+            if not location.get('score') or 'x' not in coordinates:
+                continue
+
+            responses[attributes['ResultID']].append({
+                'lng': coordinates['x'],
+                'lat': coordinates['y'],
+                'address': location.get('address'),
+                'score': location.get('score'),
+                'quality': attributes.get('Addr_type'),
+                'raw': location
+            })
+
+        return responses
+
     def _parse_returned_address(self, result):
         #TODO
         return {}
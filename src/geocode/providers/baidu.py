@@ -27,7 +27,8 @@ class Baidu(Geocoder):
         try:
             response = geocoder.baidu(
                 address.street,
-                **key
+                **key,
+                **self._request_options()
             )
 
             if response.ok:
@@ -2,6 +2,8 @@
 Base functionality for a geocode provider.
 """
 import abc
+import concurrent.futures
+import contextvars
 import datetime
 import functools
 import itertools
@@ -9,21 +11,43 @@ import logging
 import math
 import os
 import random
-import time
+import threading
 import yaml
 
 from fuzzywuzzy import fuzz
 from packaging import version
 import rollbar
 
-from geocode import credentials, location, logger
-from geocode.helpers import RateLimitExceededError, QuotaExhaustedError, NoResultsFoundError, FailedRequestError
+from geocode import budget, credentials, location, logger, paging, quota, ratelimit, scoring, transport
+from geocode.helpers import GeocoderError, RateLimitExceededError, QuotaExhaustedError, NoResultsFoundError, FailedRequestError
 
 
 CONFIG = yaml.safe_load(open('data/config.yml'))
 
+# seconds per HTTP request for providers without a `timeout`, a hung socket never holds a worker
+TIMEOUT = float(os.environ.get('PROVIDER_TIMEOUT', 10))
+
 KEY_HANDLER = credentials.KeyHandler(os.environ['SECRET_NAME'], os.environ['GEOCODER_API_KEYS'])
 
+RATE_LIMITER = ratelimit.RateLimiter(CONFIG)
+
+PAGER = paging.Pager(CONFIG)
+
+BUDGET = budget.Budget(CONFIG)
+
+# key used by the request running in the current thread or task (provider, key)
+KEY_LEASE = contextvars.ContextVar('key_lease', default=None)
+
+# Speculative field omission (reduced address variants sent at once)
+SPECULATION_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('SPECULATION_WORKERS', 8))
+)
+
+# Entities of geocode_many geocoded one by one
+BATCH_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BATCH_WORKERS', 8))
+)
+
 
 def rate_result(returned_address, returned_coordinates, address):
     """
@@ -78,53 +102,92 @@ def rate_result(returned_address, returned_coordinates, address):
     return score
 
 
+def filter_responses(responses):
+    """
+    Delete obsolete or sensitive fields from responses and rename their coordinates. Responses
+    without coordinates are dropped.
+    """
+    fields = (
+        'client',
+        'client_secret',
+        'key',
+        'ak',
+        'sk',
+        'ok'
+    )
+
+    filtered_responses = []
+
+    for result in responses:
+        try:
+            for field in fields:
+                if field in result:
+                    del result[field]
+
+            result['longitude'] = result.pop('lng')
+            result['latitude'] = result.pop('lat')
+
+            filtered_responses.append(result)
+        except KeyError:
+            continue
+
+    return filtered_responses
+
+
 def geocoder_process(function):
     """
-    Decorator to clean up responses returned from the geocoder package.
+    Decorator to clean up responses returned from the geocoder package. For providers with paging,
+    the page of results is widened until the best candidate is good enough (see paging). Every
+    wider page is sent as a request of its own (see Geocoder._send).
     """
     @functools.wraps(function)
     def _geocoder_process(self, address):
-        def filter_best_candidate(results, address):
-            return max(results, key=lambda x: rate_result(
-                self.parse_returned_address(x),
-                {
-                    'longitude': x['longitude'],
-                    'latitude': x['latitude'],
-                },
+        def rank_candidates(results, address):
+            # all results are scored at once, with the same scores as rate_result
+            return scoring.rank(
+                results,
+                [self.parse_returned_address(x) for x in results],
                 address
-            ))
-
-        responses = list(function(self, address))
-
-        # delete obsolete or sentitive fields
-        fields = (
-            'client',
-            'client_secret',
-            'key',
-            'ak',
-            'sk',
-            'ok'
-        )
+            )
 
-        filtered_responses = []
+        sizer = PAGER.sizer(self.name)
+        if sizer is None:
+            filtered_responses = filter_responses(list(function(self, address)))
 
-        for result in responses:
-            try:
-                for field in fields:
-                    if field in result:
-                        del result[field]
+            if filtered_responses:
+                index, _ = rank_candidates(filtered_responses, address)
+                return filtered_responses[index]
+            else:
+                raise NoResultsFoundError(self.name)
 
-                result['longitude'] = result.pop('lng')
-                result['latitude'] = result.pop('lat')
+        size = sizer.size()
+        responses = list(function(self, address, max_rows=size))
+        while True:
+            filtered_responses = filter_responses(responses)
 
-                filtered_responses.append(result)
-            except KeyError:
-                continue
+            if not filtered_responses:
+                raise NoResultsFoundError(self.name)
 
-        if filtered_responses:
-            return filter_best_candidate(filtered_responses, address)
-        else:
-            raise NoResultsFoundError(self.name)
+            index, score = rank_candidates(filtered_responses, address)
+            wider = sizer.widen(size)
+
+            if sizer.confident(score, scoring.max_score(address)) or len(responses) < size or not wider:
+                break
+
+            event = dict(
+                state='widening page',
+                field='maxRows',
+                value=wider
+            )
+
+            logger.log_event(logging.INFO, event, provider=self.name)
+
+            size = wider
+            responses = self._send(lambda x: list(function(self, x, max_rows=size)), address)
+
+        sizer.observe(index)
+
+        return filtered_responses[index]
 
     return _geocoder_process
 
@@ -157,7 +220,7 @@ def back_off_and_jitter(function):
                             raise error
 
                     event = dict(
-                        state='Sleeping %g seconds' % back_off
+                        state='Backing off %g seconds' % back_off
                     )
 
                     logger.log_event(
@@ -166,10 +229,19 @@ def back_off_and_jitter(function):
                         provider=self.name
                     )
 
-                    time.sleep(back_off)
+                    # the next request for this provider and key waits for the back off
+                    RATE_LIMITER.bucket(self.name, getattr(error, 'key', None)).defer(back_off)
                     back_off = random.uniform(0, min(cap, base * 2 ** attempts))
                     attempts += 1
             except QuotaExhaustedError as error:
+                key = getattr(error, 'key', None)
+                if key is not None:
+                    # share the exhaustion of this key with all workers
+                    quota.STORE.disable(
+                        KEY_HANDLER.key_name(self.name, key),
+                        self.quota_reset()
+                    )
+
                 if keys_used < KEY_HANDLER.number_of_keys(self.name):
                     # rotate keys, quota for current key is exhausted
                     KEY_HANDLER.cycle_key(self.name)
@@ -212,12 +284,23 @@ class Geocoder(metaclass=GeocoderMeta):
         supplied. Priority fields are optional fields ordered from most to least important.
 
         The geocoder will always start with all required and priority fields and shed fields from
-        the priority fields tailwise until a response is received.
+        the priority fields tailwise until a response is received. With `speculation: N` in the
+        provider config, up to N of these reduced addresses are sent at once.
         """
         self.name = name
         self.required_fields = CONFIG[name].get('requested')
         self.priority_fields = CONFIG[name].get('arbitrary')
         self.mapping = CONFIG[name].get('mapping')
+        # maximum number of concurrent requests (None if unlimited)
+        self.concurrency = CONFIG[name].get('concurrency')
+        # maximum number of reduced addresses sent at once per task (None if serial)
+        self.speculation = CONFIG[name].get('speculation')
+        # maximum number of addresses per batch request (None if the provider has no batch endpoint)
+        self.batch_size = CONFIG[name].get('batch_size')
+
+        # share of requests per API key, in the order of the secret (equal if not set)
+        if CONFIG[name].get('key_weights'):
+            KEY_HANDLER.weigh(name, CONFIG[name]['key_weights'])
 
         # number of retries when API requests fails or is throttled
         self.nr_of_retries = nr_of_retries
@@ -226,6 +309,12 @@ class Geocoder(metaclass=GeocoderMeta):
         # when throttling retries fail, treat as quota exceeding or not
         self.quota_exceed_on_throttle = quota_exceed_on_throttle
 
+        # transport options: the shared keep-alive session, a request timeout (seconds to connect
+        # and between bytes of the response) and an endpoint override (e.g. a local stub, see stub)
+        self.session = transport.SESSIONS.session(name, self.concurrency)
+        self.timeout = CONFIG[name].get('timeout', TIMEOUT)
+        self.endpoint = None
+
     def _map(self, address):
         """
         If a mapping specified between supplied address components and fields relevant to the
@@ -245,11 +334,118 @@ class Geocoder(metaclass=GeocoderMeta):
         else:
             raise ValueError
             
+    def _key_available(self, key):
+        """
+        Whether the quota of a key is not known to be exhausted and its daily budget is not spent.
+        """
+        name = KEY_HANDLER.key_name(self.name, key)
+
+        return not quota.STORE.is_disabled(name) and BUDGET.available(self.name, name)
+
+    def _budget_name(self, key):
+        """
+        Name under which the calls with a key are counted, the provider name without keys.
+        """
+        return self.name if key is None else KEY_HANDLER.key_name(self.name, key)
+
+    def admit(self, priority):
+        """
+        Raise a BudgetDeferredError if a task of the given priority (see budget) exceeds the daily
+        budget of this provider at this time of the day.
+        """
+        try:
+            keys = KEY_HANDLER.number_of_keys(self.name)
+        except KeyError:
+            keys = 1
+
+        BUDGET.admit(self.name, priority, keys)
+
     def _request_key(self):
         """
-        Gets the current key for this provider.
+        Gets the key for the running request, or the current key for this provider (skipping keys
+        known to be exhausted) outside of a request.
+        """
+        lease = KEY_LEASE.get()
+        if lease is not None and lease[0] == self.name:
+            return lease[1]
+
+        return KEY_HANDLER.get_key(self.name, available=self._key_available)
+
+    def _active_key(self):
+        """
+        Gets the current key for this provider, None for providers without keys.
+        """
+        try:
+            return self._request_key()
+        except KeyError:
+            return None
+
+    def _request(self, address):
+        """
+        Sends a request with the next key of this provider (see credentials.KeyScheduler) through
+        the rate limiter of this provider and key. Throttling responses lower the rate for
+        subsequent requests, successful responses raise it again. Errors carry the key that was
+        used. A key without budget left is treated as exhausted without calling the provider.
+        """
+        return self._send(self._geocode, address)
+
+    def _request_batch(self, addresses):
+        """
+        Sends a batch request like _request. The batch counts as one call per address against the
+        budget.
         """
-        return KEY_HANDLER.get_key(self.name)
+        return self._send(self._geocode_batch, addresses, calls=len(addresses))
+
+    def _send(self, function, payload, calls=1):
+        try:
+            key = KEY_HANDLER.acquire_key(self.name, available=self._key_available)
+        except KeyError:
+            key = None
+
+        lease = KEY_LEASE.set((self.name, key))
+        bucket = RATE_LIMITER.bucket(self.name, key)
+
+        try:
+            if not BUDGET.available(self.name, self._budget_name(key)):
+                raise QuotaExhaustedError(self.name)
+
+            bucket.wait()
+            BUDGET.spend(self.name, self._budget_name(key), calls=calls)
+
+            try:
+                result = function(payload)
+            except RateLimitExceededError:
+                RATE_LIMITER.throttled(self.name, key)
+                raise
+        except Exception as error:
+            if isinstance(error, GeocoderError):
+                error.key = key
+
+            if key is not None:
+                KEY_HANDLER.release_key(self.name, key, error)
+            raise
+        finally:
+            KEY_LEASE.reset(lease)
+
+        if key is not None:
+            KEY_HANDLER.release_key(self.name, key)
+
+        bucket.reward()
+
+        return result
+
+    def _request_options(self):
+        """
+        Transport options passed to the geocoder package: a pooled session, a request timeout and
+        an endpoint override. Only options that are set are returned.
+        """
+        options = dict(
+            session=self.session,
+            timeout=self.timeout,
+            url=self.endpoint
+        )
+
+        return dict((k, v) for k, v in options.items() if v is not None)
 
     @property
     def ttl(self):
@@ -291,54 +487,52 @@ class Geocoder(metaclass=GeocoderMeta):
         """
         raise NotImplementedError
 
-    @back_off_and_jitter
-    def geocode(self, entity):
+    def _geocode_batch(self, addresses):
         """
-        Check whether the geocoder has enough information to geocode this entity and return the
-        geocoder response if this is the case.
+        Geocoders with a batch endpoint (and `batch_size` in their config) geocode several addresses
+        in one request. Return the unfiltered responses per address, in the order of the addresses
+        (an empty list for addresses without results).
         """
-        address = entity.address
+        raise NotImplementedError
 
+    def _supplied_address(self, entity):
+        """
+        Return the address fields of an entity used by this geocoder, and its priority fields.
+        """
         priority = list(filter(lambda i: i in entity.address, self.priority_fields))
 
         address = dict(filter(lambda pair: pair[0] in itertools.chain(
             self.required_fields,
             priority
-        ) , address.items()))
+        ) , entity.address.items()))
 
-        discarded = []
+        return address, priority
+
+    @back_off_and_jitter
+    def geocode(self, entity):
+        """
+        Check whether the geocoder has enough information to geocode this entity and return the
+        geocoder response if this is the case.
+        """
+        address, priority = self._supplied_address(entity)
 
         # attempt all fields
         try:
-            result = self._geocode(address)
+            result = self._request(address)
+            discarded = []
         except (TypeError, NoResultsFoundError):
             # start removing optional fields
-            while priority:
-                omission = priority.pop()
-                discarded.append(omission)
-
-                event = dict(
-                    state='field omission',
-                    field=omission,
-                    value=address.pop(omission)
-                )
+            result, discarded = self._omit_fields(entity, address, priority)
 
-                logger.log_event(
-                    logging.INFO,
-                    event,
-                    provider=self.name,
-                    entity_id=entity.entity_id,
-                    entity_type=entity.entity_type
-                )
+            for omission in discarded:
+                address.pop(omission)
 
-                try:
-                    result = self._geocode(address)
-                    break
-                except NoResultsFoundError:
-                    continue
-            else:
-                raise NoResultsFoundError(self.name)
+        return self._complete(entity, address, result, discarded)
 
+    def _complete(self, entity, address, result, discarded):
+        """
+        Add the meta data, time to live and keys of an entity to a geocoder response.
+        """
         result['meta'] = {
             'rejected': discarded,
             'supplied': list(address.keys()),
@@ -375,3 +569,134 @@ class Geocoder(metaclass=GeocoderMeta):
         ))
 
         return result
+
+    def geocode_many(self, entities, concurrency=None):
+        """
+        Geocode a chunk of entities. Return the geocoder response or the error raised per entity,
+        in the order of the entities.
+
+        Geocoders with a batch endpoint send the full addresses in batches of `batch_size`.
+        Entities without a result in their batch (or of a failed batch), and all entities of other
+        geocoders, are geocoded one by one, at most `concurrency` at once (the lower of the given
+        and the configured limit).
+        """
+        entities = list(entities)
+        results = [None] * len(entities)
+        pending = list(range(len(entities)))
+
+        if self.batch_size:
+            pending = []
+
+            for start in range(0, len(entities), self.batch_size):
+                batch = entities[start:start + self.batch_size]
+
+                for i, result in enumerate(self._geocode_batched(batch), start):
+                    if result is None:
+                        pending.append(i)
+                    else:
+                        results[i] = result
+
+        limits = [n for n in (concurrency, self.concurrency) if n]
+        limit = threading.BoundedSemaphore(min(limits) if limits else len(pending) or 1)
+
+        def attempt(entity):
+            with limit:
+                try:
+                    return self.geocode(entity)
+                except Exception as error:
+                    return error
+
+        futures = [BATCH_POOL.submit(attempt, entities[i]) for i in pending]
+
+        for i, future in zip(pending, futures):
+            results[i] = future.result()
+
+        return results
+
+    def _geocode_batched(self, entities):
+        """
+        Geocode the full addresses of entities with one batch request. Return the geocoder response
+        per entity, None for entities left to geocode one by one.
+        """
+        addresses = [self._supplied_address(entity)[0] for entity in entities]
+
+        try:
+            responses = self._request_batch(addresses)
+        except GeocoderError as error:
+            event = dict(
+                state='batch request failed',
+                field='status',
+                value=error.status
+            )
+
+            logger.log_event(logging.WARNING, event, provider=self.name)
+
+            return [None] * len(entities)
+
+        results = []
+
+        for entity, address, response in zip(entities, addresses, responses):
+            candidates = filter_responses(list(response))
+
+            if not candidates:
+                results.append(None)
+                continue
+
+            try:
+                index, _ = scoring.rank(
+                    candidates,
+                    [self.parse_returned_address(x) for x in candidates],
+                    address
+                )
+
+                results.append(self._complete(entity, address, candidates[index], []))
+            except Exception as error:
+                results.append(error)
+
+        return results
+
+    def _omit_fields(self, entity, address, priority):
+        """
+        Shed priority fields tailwise until a result is obtained. Return the result and the
+        omitted fields, in order of omission.
+
+        In speculative mode, the first `speculation` reduced addresses are sent at once and the most
+        complete one that succeeds is returned, as if the omissions were attempted one by one.
+        Further reductions are attempted one by one.
+        """
+        omissions = list(reversed(priority))
+
+        def reduce(i, state):
+            logger.log_event(
+                logging.INFO,
+                dict(state=state, field=omissions[i - 1], value=address[omissions[i - 1]]),
+                provider=self.name,
+                entity_id=entity.entity_id,
+                entity_type=entity.entity_type
+            )
+
+            return dict((k, v) for k, v in address.items() if k not in omissions[:i])
+
+        budget = min(self.speculation or 0, len(omissions))
+        futures = [
+            SPECULATION_POOL.submit(self._request, reduce(i, 'speculative field omission'))
+            for i in range(1, budget + 1)
+        ]
+
+        try:
+            for i, future in enumerate(futures, 1):
+                try:
+                    return future.result(), omissions[:i]
+                except NoResultsFoundError:
+                    continue
+        finally:
+            for future in futures:
+                future.cancel()
+
+        for i in range(budget + 1, len(omissions) + 1):
+            try:
+                return self._request(reduce(i, 'field omission')), omissions[:i]
+            except NoResultsFoundError:
+                continue
+
+        raise NoResultsFoundError(self.name)
@@ -24,7 +24,14 @@ class Bing(Geocoder):
         key = self._request_key()
 
         try:
-            response = geocoder.bing(None, maxRows=100, method='details', **key, **self._map(address))
+            response = geocoder.bing(
+                None,
+                maxRows=100,
+                method='details',
+                **key,
+                **self._map(address),
+                **self._request_options()
+            )
 
             if response.ok:
                 return map(lambda x: x.json, response)
@@ -4,7 +4,6 @@ Geonames geocoder.
 import collections
 
 import geocoder
-import ratelim
 
 from geocode import helpers, location
 from geocode.providers.base import Geocoder, geocoder_process
@@ -20,7 +19,6 @@ class Geonames(Geocoder):
         super(Geonames, self).__init__('geonames')
 
     @geocoder_process
-    @ratelim.patient(1, 1)
     def _geocode(self, address):
         """
         TODO ERRORS
@@ -39,6 +37,8 @@ class Geonames(Geocoder):
                 )
                 kwargs = {**kwargs, **bbox}
 
+            kwargs.update(self._request_options())
+
             response = geocoder.geonames(**kwargs)
             if response.ok:
                 return map(lambda x: x.json, response)
@@ -68,6 +68,8 @@ class Google(Geocoder):
                 )
                 kwargs['bounds'] = '{south},{west}|{north},{east}'.format(**bbox)
 
+            kwargs.update(self._request_options())
+
             response = geocoder.google(
                 mapped_address.pop('address', None),
                 components=self.parse_components(mapped_address),
@@ -171,6 +173,8 @@ class GooglePlaces(Geocoder):
                 )
                 kwargs['bounds'] = '{south},{west}|{north},{east}'.format(**bbox)
 
+            kwargs.update(self._request_options())
+
             response = geocoder.google(
                 mapped_address.pop('address'),
                 components=self.parse_components(mapped_address),
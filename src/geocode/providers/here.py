@@ -19,7 +19,7 @@ class Here(Geocoder):
         super(Here, self).__init__('here')
 
     @geocoder_process
-    def _geocode(self, address):
+    def _geocode(self, address, max_rows=100):
         key = self._request_key()
 
         try:
@@ -31,7 +31,8 @@ class Here(Geocoder):
                 )
 
             kwargs.update(key)
-            kwargs['maxRows'] = 100
+            kwargs['maxRows'] = max_rows
+            kwargs.update(self._request_options())
 
             response = geocoder.here(None, **kwargs)
 
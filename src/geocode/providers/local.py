@@ -0,0 +1,161 @@
+"""
+Local city-level geocoder. Answers city queries from an in-memory index of the destinations data
+(data/destinations.json, the same data the consolidator uses for its city fallback), so city-only
+tasks cost no quota and no network round trip.
+
+Cities are looked up per country: first by their exact (folded) name, then by trigram similarity.
+All cities with the best name are returned, the one closest to the guess first.
+
+Without destinations every city lookup would miss, so a missing or empty destinations file is an
+error. Deployed geocoders load the index at cold start (see main), `make package` refuses to package
+the geocoder without the file (see `make destinations`).
+"""
+import collections
+import json
+import logging
+import os
+import threading
+
+import ngram
+
+from geocode import canonical, helpers, location, logger
+from geocode.providers.base import Geocoder, geocoder_process
+
+
+DESTINATIONS = os.environ.get('DESTINATIONS', 'data/destinations.json')
+TRIGRAM_THRESHOLD = 0.5     # minimum trigram similarity of a city name
+
+
+def normalize(name : str):
+    return canonical.collapse(canonical.fold(name))
+
+
+def normalize_country_code(country_code : str):
+    country_code = country_code.upper()
+
+    return canonical.COUNTRY_CODE_ALIASES.get(country_code, country_code)
+
+
+class CityIndex:
+    """
+    Index of destinations by country and normalized name, with a trigram search layer per country.
+    """
+    def __init__(self, destinations : list):
+        self.cities = collections.defaultdict(lambda: collections.defaultdict(list))
+
+        for destination in destinations:
+            country_code = normalize_country_code(destination['country_code'])
+            self.cities[country_code][normalize(destination['name'])].append(destination)
+
+        self.search_layers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=DESTINATIONS):
+        """
+        Load the index from a destinations file. Raise a ValueError if the file is missing or
+        holds no destinations.
+        """
+        try:
+            with open(path) as f:
+                destinations = json.load(f)
+        except FileNotFoundError:
+            destinations = []
+
+        if not destinations:
+            event = {
+                'state': 'missing destinations',
+                'value': path
+            }
+
+            logger.log_event(logging.CRITICAL, event, provider='local')
+
+            raise ValueError('no destinations in {path}'.format(path=path))
+
+        return cls(destinations)
+
+    def search_layer(self, country_code : str):
+        # built on first use per country, most countries are never queried
+        with self._lock:
+            if country_code not in self.search_layers:
+                self.search_layers[country_code] = ngram.NGram(self.cities[country_code].keys())
+
+            return self.search_layers[country_code]
+
+    def lookup(self, city : str, country_code : str):
+        """
+        Return the destinations matching a city name in a country, exact matches first, an empty
+        list if there are none.
+        """
+        country_code = normalize_country_code(country_code)
+        if country_code not in self.cities:
+            return []
+
+        cities = self.cities[country_code]
+        name = normalize(city)
+
+        if name in cities:
+            return cities[name]
+
+        matches = self.search_layer(country_code).search(name, threshold=TRIGRAM_THRESHOLD)
+        if matches:
+            return cities[matches[0][0]]
+
+        return []
+
+
+INDEX = None
+INDEX_LOCK = threading.Lock()
+
+
+def load_index():
+    """
+    Return the city index, loaded once per container.
+    """
+    global INDEX
+
+    with INDEX_LOCK:
+        if INDEX is None:
+            INDEX = CityIndex.load()
+
+        return INDEX
+
+
+class Local(Geocoder):
+    """
+    Local city-level geocoding from the destinations data.
+    """
+    _version = '1.0.0'
+
+    def __init__(self):
+        super(Local, self).__init__('local')
+
+    @geocoder_process
+    def _geocode(self, address):
+        try:
+            destinations = load_index().lookup(address['city'], address['country_code'])
+        except KeyError:
+            raise helpers.NoResultsFoundError(self.name)
+
+        if not destinations:
+            raise helpers.NoResultsFoundError(self.name)
+
+        if 'guess' in address and len(destinations) > 1:
+            distances = location.distances_geocodes(address['guess'], destinations)
+            destinations = [destinations[i] for i in distances.argsort(kind='stable')]
+
+        return [
+            {
+                'lng': destination['longitude'],
+                'lat': destination['latitude'],
+                'address': destination['name'],
+                'city_id': destination.get('city_id'),
+                'raw': destination
+            } for destination in destinations
+        ]
+
+    def _parse_returned_address(self, result):
+        return {
+            'city': result['raw']['name'],
+            'country_code': result['raw']['country_code']
+        }
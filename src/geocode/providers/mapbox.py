@@ -47,6 +47,8 @@ class Mapbox(Geocoder):
                     bbox['west'], bbox['south'], bbox['east'], bbox['north']
                 ]
 
+            kwargs.update(self._request_options())
+
             response = geocoder.mapbox(query, **key, **kwargs)
 
             if response.ok:
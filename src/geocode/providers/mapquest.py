@@ -47,6 +47,8 @@ class Mapquest(Geocoder):
                 )
                 kwargs['bbox'] = [bbox['west'], bbox['south'], bbox['east'], bbox['north']]
 
+            kwargs.update(self._request_options())
+
             response = geocoder.mapquest(query, **kwargs)
 
             if response.ok:
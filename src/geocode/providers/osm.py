@@ -4,7 +4,6 @@ OpenStreetMap geocoder.
 import collections
 
 import geocoder
-import ratelim
 
 from geocode import helpers, location
 from geocode.providers.base import Geocoder, geocoder_process
@@ -22,7 +21,6 @@ class Osm(Geocoder):
         super(Osm, self).__init__('osm')
 
     @geocoder_process
-    @ratelim.patient(1, 1)
     def _geocode(self, address):
         """
         Error handling is based on OpenStreetMap documentation on Nominatim, a tool to search OSM
@@ -44,6 +42,8 @@ class Osm(Geocoder):
                 kwargs['viewbox'] = '{west},{south},{east},{north}'.format(**bbox)
                 kwargs['bounded'] = '1'
 
+            kwargs.update(self._request_options())
+
             response = geocoder.osm(None, **kwargs)
 
             if response.ok:
@@ -28,14 +28,14 @@ class Tomtom(Geocoder):
         ] if i in address])
 
     @geocoder_process
-    def _geocode(self, address):
+    def _geocode(self, address, max_rows=100):
         key = self._request_key()
 
         try:
             query = self.format_address(address)
             kwargs = {
                 'countrySet': address['country_code'],
-                'maxRows': 100
+                'maxRows': max_rows
             }
             kwargs.update(key)
 
@@ -44,6 +44,8 @@ class Tomtom(Geocoder):
                 kwargs['lat'] = address['guess']['latitude']
                 kwargs['radius'] = 100000
 
+            kwargs.update(self._request_options())
+
             response = geocoder.tomtom(query, **kwargs)
 
             if response.ok:
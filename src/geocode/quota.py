@@ -0,0 +1,213 @@
+"""
+Quota exhaustion state shared by all geocoder workers. When a provider (or one of its API keys)
+runs out of quota, it is disabled until the quota resets (see Geocoder.quota_reset). Storing this
+state centrally means only the first container to hit the limit pays for failing calls, all others
+skip the provider straight away.
+
+Names in the store are provider names (e.g. 'google') for disabled providers and key names (see
+credentials.KeyHandler.key_name) for exhausted API keys.
+
+Stores:
+- DynamoQuotaStore: shared between containers, used when QUOTA_TABLE is set.
+- SQLiteQuotaStore: shared between processes on one machine (local runs, tests).
+- MemoryQuotaStore: per process.
+
+Workers read the state through a CachedQuotaStore, which keeps a local copy for a few seconds. When
+the store cannot be read, the last known state is kept and the read is retried after the ttl.
+"""
+import abc
+import decimal
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+from geocode import logger
+
+
+STORE_ERRORS = (BotoCoreError, ClientError, sqlite3.Error)
+
+
+class QuotaStore(metaclass=abc.ABCMeta):
+    """
+    Store of disabled-until timestamps (epoch seconds) by name.
+    """
+    @abc.abstractmethod
+    def disabled(self) -> dict:
+        """
+        Return all disabled names with the timestamp until which they are disabled.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def disable(self, name : str, until : float):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def enable(self, name : str):
+        raise NotImplementedError
+
+    def is_disabled(self, name : str, now=None):
+        until = self.disabled().get(name)
+        return until is not None and until > (now or time.time())
+
+
+class MemoryQuotaStore(QuotaStore):
+    """
+    Quota state kept in process memory.
+    """
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def disabled(self):
+        with self._lock:
+            return dict(self._state)
+
+    def disable(self, name, until):
+        with self._lock:
+            self._state[name] = max(until, self._state.get(name, until))
+
+    def enable(self, name):
+        with self._lock:
+            self._state.pop(name, None)
+
+
+class SQLiteQuotaStore(QuotaStore):
+    """
+    Quota state kept in a SQLite database file.
+    """
+    def __init__(self, path=':memory:'):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS quota (name TEXT PRIMARY KEY, disabled_until REAL)'
+            )
+
+    def disabled(self):
+        with self._lock:
+            return dict(self._connection.execute('SELECT name, disabled_until FROM quota'))
+
+    def disable(self, name, until):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO quota (name, disabled_until) VALUES '
+                '(?, MAX(?, COALESCE((SELECT disabled_until FROM quota WHERE name = ?), 0)))',
+                (name, until, name)
+            )
+
+    def enable(self, name):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM quota WHERE name = ?', (name,))
+
+
+class DynamoQuotaStore(QuotaStore):
+    """
+    Quota state kept in a DynamoDB table with hash key 'name'. The disabled_until attribute doubles
+    as the TTL attribute of the table, so stale entries disappear on their own.
+    """
+    def __init__(self, table_name : str):
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def disabled(self):
+        items = []
+        kwargs = {}
+
+        while True:
+            response = self.table.scan(**kwargs)
+            items.extend(response['Items'])
+
+            if 'LastEvaluatedKey' not in response:
+                break
+
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        return dict((item['name'], float(item['disabled_until'])) for item in items)
+
+    def disable(self, name, until):
+        try:
+            # never shorten a period set by another worker
+            self.table.update_item(
+                Key={'name': name},
+                UpdateExpression='SET disabled_until = :until',
+                ConditionExpression='attribute_not_exists(disabled_until) OR disabled_until < :until',
+                ExpressionAttributeValues={':until': decimal.Decimal(math.ceil(until))}
+            )
+        except ClientError as exception:
+            error_code = exception.response.get('Error', {}).get('Code')
+
+            if error_code != 'ConditionalCheckFailedException':
+                raise exception
+
+    def enable(self, name):
+        self.table.delete_item(Key={'name': name})
+
+
+class CachedQuotaStore(QuotaStore):
+    """
+    Read-through cache in front of a (remote) quota store. The state is refreshed at most once per
+    ttl seconds; changes made by this worker are applied locally right away. Errors of the store
+    are logged and the last known state is used until the next refresh.
+    """
+    def __init__(self, store : QuotaStore, ttl=30):
+        self.store = store
+        self.ttl = ttl
+        self._state = {}
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    def disabled(self):
+        with self._lock:
+            if self._loaded is None or time.monotonic() - self._loaded > self.ttl:
+                try:
+                    self._state = self.store.disabled()
+                except STORE_ERRORS as error:
+                    event = {
+                        'state': 'quota state not refreshed',
+                        'value': {'error': str(error)}
+                    }
+
+                    logger.log_event(logging.WARNING, event)
+
+                self._loaded = time.monotonic()
+
+            return dict(self._state)
+
+    def disable(self, name, until):
+        self.store.disable(name, until)
+
+        with self._lock:
+            self._state[name] = max(until, self._state.get(name, until))
+
+    def enable(self, name):
+        self.store.enable(name)
+
+        with self._lock:
+            self._state.pop(name, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = None
+
+
+def load_store():
+    """
+    Return the quota store for this environment.
+    """
+    if os.environ.get('QUOTA_TABLE'):
+        return DynamoQuotaStore(os.environ['QUOTA_TABLE'])
+
+    if os.environ.get('QUOTA_DATABASE'):
+        return SQLiteQuotaStore(os.environ['QUOTA_DATABASE'])
+
+    return MemoryQuotaStore()
+
+
+STORE = CachedQuotaStore(load_store(), ttl=int(os.environ.get('QUOTA_CACHE_TTL', 30)))
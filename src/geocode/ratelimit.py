@@ -0,0 +1,140 @@
+"""
+Token bucket rate limiting for geocoding APIs, shared by all workers in a container. There is one
+bucket per provider and API key, configured by the `rate_limit` section of a provider in
+data/config.yml:
+
+    rate_limit:
+      qps: 50       # requests per second allowed by the provider
+      burst: 10     # requests that can be sent at once (defaults to 1)
+
+Instead of sleeping on a failure and retrying blindly, requests reserve a slot in the bucket and
+wait until their slot comes up. Back off is applied to the bucket, so all requests for that
+provider and key respect it. The rate adapts to the provider (AIMD): it is halved on every
+throttling response and recovers gradually with each successful request, up to the configured
+limit.
+
+Waiting for a slot does block the worker thread that sent the request (see TokenBucket.wait). A
+task is not requeued, since it may already have made paid requests (e.g. for iterative addresses
+or pages). The executor caps the workers per provider, so only the threads of that provider wait.
+
+Buckets and their adapted rates are kept per container. With N warm containers a provider can see
+up to N times the configured `qps`, so it is the rate of a single container.
+"""
+import json
+import logging
+import threading
+import time
+
+from geocode import logger
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out request slots. A rate of None means unlimited, but back off still
+    applies.
+    """
+    def __init__(self, qps=None, burst=1, min_qps=None, recovery=0.05):
+        self.max_rate = qps
+        self.rate = qps
+        self.min_rate = min_qps or (qps / 10.0 if qps else None)
+        self.burst = burst
+        self.recovery = recovery    # fraction of the configured rate regained per success
+
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Reserve a slot and return the number of seconds until it can be used.
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self.blocked_until - now)
+
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.tokens -= 1.0
+                delay = max(delay, -self.tokens / self.rate)
+
+            self.updated = now
+
+            return delay
+
+    def wait(self):
+        """
+        Block the calling worker until a reserved slot is available and return the seconds waited.
+        """
+        delay = self.reserve()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+    def defer(self, seconds):
+        """
+        Hold back all requests on this bucket for a number of seconds.
+        """
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def penalize(self, factor=0.5):
+        """
+        Lower the rate after a throttling response (multiplicative decrease).
+        """
+        with self._lock:
+            if self.rate:
+                self.rate = max(self.min_rate, self.rate * factor)
+
+            return self.rate
+
+    def reward(self):
+        """
+        Raise the rate after a successful request (additive increase).
+        """
+        with self._lock:
+            if self.rate:
+                self.rate = min(self.max_rate, self.rate + self.recovery * self.max_rate)
+
+            return self.rate
+
+
+class RateLimiter:
+    """
+    Registry of token buckets per provider and API key.
+    """
+    def __init__(self, config : dict):
+        self.config = config
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, provider : str, key=None):
+        """
+        Return the bucket for a provider and key, creating it on first use.
+        """
+        bucket_id = (provider, json.dumps(key, sort_keys=True, default=str))
+
+        with self._lock:
+            if bucket_id not in self.buckets:
+                limits = (self.config.get(provider) or {}).get('rate_limit') or {}
+                self.buckets[bucket_id] = TokenBucket(**limits)
+
+            return self.buckets[bucket_id]
+
+    def throttled(self, provider : str, key=None):
+        """
+        Register a throttling response (e.g. HTTP 429) for a provider and key.
+        """
+        bucket = self.bucket(provider, key)
+        rate = bucket.penalize()
+
+        if rate:
+            event = {
+                'state': 'lowering rate limit',
+                'field': 'qps',
+                'value': rate
+            }
+
+            logger.log_event(logging.INFO, event, provider=provider)
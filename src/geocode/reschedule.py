@@ -0,0 +1,291 @@
+"""
+Rescheduling of geocoder tasks that could not be processed now: tasks for providers that ran out
+of quota and tasks that failed for unknown reasons.
+
+Tasks are grouped by provider and by the time at which they can be processed again (the quota
+reset of the provider, or a short retry delay). Tasks due within the maximum SQS delay (15 minutes)
+are sent to the buffer queue with a per-message delay. Tasks due later are parked in a backlog and
+drained once the provider is enabled again.
+
+Re-admission is paced by the rate limit of the provider: per drain, only as many tasks are taken
+from the backlog as the provider can process in the drain interval, and their delays are spread
+over that interval. A quota reset therefore does not release the whole backlog at once. The pace
+is kept per container: every container drains at most once per DRAIN_INTERVAL, so with N warm
+containers up to N times the rate of the provider can be re-admitted.
+
+Tasks that failed for unknown reasons carry the number of failed attempts. After MAX_ATTEMPTS they
+are sent to the dead letter queue (DEAD_LETTER_QUEUE) instead, so an address that keeps failing
+does not loop through the queue forever.
+"""
+import abc
+import collections
+import decimal
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from geocode import logger
+
+
+MAX_DELAY = 900         # maximum SQS delay in seconds
+RETRY_DELAY = 300       # delay for failed tasks in seconds
+DRAIN_INTERVAL = 60     # seconds between backlog drains (per container)
+DRAIN_QPS = 10          # admission rate for providers without a rate limit
+MAX_ATTEMPTS = 5        # failed attempts before a task is dead-lettered
+
+
+def batch(iterable, batch_size=1):
+    """
+    Batches an iterable in chunks of size batch_size.
+    """
+    sourceiter = iter(iterable)
+    while True:
+        batchiter = itertools.islice(sourceiter, batch_size)
+        try:
+            first = next(batchiter)
+        except StopIteration:
+            return
+
+        yield itertools.chain([first], batchiter)
+
+
+def send_to_buffer_queue(task_batch, delays=None, queue_name=None):
+    """
+    Sends geocoder tasks to the buffer stream to be processed at a later date. Each task can be
+    delayed individually (in seconds, at most 15 minutes).
+    """
+    queue = boto3.resource('sqs').get_queue_by_name(QueueName=queue_name or os.environ.get('QUEUE'))
+    delays = delays or [0] * len(task_batch)
+
+    responses = []
+    for sqs_batch in batch(zip(task_batch, delays), batch_size=10):
+        responses.append(queue.send_messages(
+            Entries=[
+                {
+                    'Id': str(i),
+                    'MessageBody': json.dumps(task),
+                    'DelaySeconds': min(MAX_DELAY, max(0, int(delay)))
+                } for i, (task, delay) in enumerate(sqs_batch)
+            ]
+        ))
+
+    return responses
+
+
+def send_to_dead_letter_queue(task_batch):
+    """
+    Sends tasks that keep failing to the dead letter queue, if one is configured.
+    """
+    if os.environ.get('DEAD_LETTER_QUEUE'):
+        return send_to_buffer_queue(task_batch, queue_name=os.environ['DEAD_LETTER_QUEUE'])
+
+    return []
+
+
+class Backlog(metaclass=abc.ABCMeta):
+    """
+    Tasks parked per provider until a given time (epoch seconds).
+    """
+    @abc.abstractmethod
+    def park(self, provider : str, tasks : list, available_at : float):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def take(self, provider : str, limit : int, now=None) -> list:
+        """
+        Remove and return at most limit tasks for a provider that are available now.
+        """
+        raise NotImplementedError
+
+
+class MemoryBacklog(Backlog):
+    """
+    Backlog kept in process memory (tests and local runs).
+    """
+    def __init__(self):
+        self._tasks = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def park(self, provider, tasks, available_at):
+        with self._lock:
+            self._tasks[provider].extend((available_at, task) for task in tasks)
+
+    def take(self, provider, limit, now=None):
+        now = now or time.time()
+
+        with self._lock:
+            available = [item for item in self._tasks[provider] if item[0] <= now][:limit]
+
+            for item in available:
+                self._tasks[provider].remove(item)
+
+        return [task for _, task in available]
+
+
+class DynamoBacklog(Backlog):
+    """
+    Backlog kept in a DynamoDB table with hash key 'provider' and range key 'task_id'.
+    """
+    def __init__(self, table_name : str):
+        self.table = boto3.resource('dynamodb').Table(table_name)
+
+    def park(self, provider, tasks, available_at):
+        with self.table.batch_writer() as batch_writer:
+            for task in tasks:
+                batch_writer.put_item(Item={
+                    'provider': provider,
+                    'task_id': str(uuid.uuid4()),
+                    'available_at': decimal.Decimal(math.ceil(available_at)),
+                    'task': json.dumps(task)
+                })
+
+    def take(self, provider, limit, now=None):
+        now = now or time.time()
+        items = []
+        kwargs = dict(
+            KeyConditionExpression=Key('provider').eq(provider),
+            FilterExpression='available_at <= :now',
+            ExpressionAttributeValues={':now': decimal.Decimal(math.floor(now))}
+        )
+
+        while len(items) < limit:
+            response = self.table.query(**kwargs)
+            items.extend(response['Items'])
+
+            if 'LastEvaluatedKey' not in response:
+                break
+
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        # concurrent drains may read the same items, only the drain that deletes an item takes it
+        taken = []
+        for item in items[:limit]:
+            try:
+                self.table.delete_item(
+                    Key={'provider': provider, 'task_id': item['task_id']},
+                    ConditionExpression='attribute_exists(task_id)'
+                )
+            except ClientError as exception:
+                error_code = exception.response.get('Error', {}).get('Code')
+
+                if error_code != 'ConditionalCheckFailedException':
+                    raise exception
+
+                continue
+
+            taken.append(item)
+
+        return [json.loads(item['task']) for item in taken]
+
+
+def load_backlog():
+    """
+    Return the backlog for this environment.
+    """
+    if os.environ.get('BACKLOG_TABLE'):
+        return DynamoBacklog(os.environ['BACKLOG_TABLE'])
+
+    return MemoryBacklog()
+
+
+class Rescheduler:
+    """
+    Sends tasks back to the buffer queue with a delay, or parks them until their provider can
+    process them again.
+    """
+    def __init__(self, backlog : Backlog, send=send_to_buffer_queue, retry_delay=RETRY_DELAY,
+                 dead_letter=send_to_dead_letter_queue, max_attempts=MAX_ATTEMPTS):
+        self.backlog = backlog
+        self.send = send
+        self.retry_delay = retry_delay
+        self.dead_letter = dead_letter
+        self.max_attempts = max_attempts
+        self.drained = {}   # provider -> last drain (monotonic)
+
+    def reschedule(self, reschedules : list, now=None):
+        """
+        Reschedule (task, available_at) pairs. Without a time, the task failed: it is sent again
+        after the retry delay, or dead-lettered after max_attempts failed attempts.
+        """
+        now = now or time.time()
+
+        groups = collections.defaultdict(list)
+        dead = collections.defaultdict(list)
+        for task, available_at in reschedules:
+            if available_at is None:
+                task = dict(task, attempts=task.get('attempts', 0) + 1)
+
+                if task['attempts'] >= self.max_attempts:
+                    dead[task['provider']].append(task)
+                    continue
+
+                available_at = now + self.retry_delay
+
+            groups[(task['provider'], available_at)].append(task)
+
+        for provider, group in dead.items():
+            logger.log_event(logging.WARNING, {
+                'state': 'dead-lettering tasks',
+                'field': 'attempts',
+                'value': self.max_attempts,
+                'count': len(group)
+            }, provider=provider)
+
+            self.dead_letter(group)
+
+        tasks, delays = [], []
+        for (provider, available_at), group in groups.items():
+            delay = available_at - now
+
+            if delay > MAX_DELAY:
+                self.backlog.park(provider, group, available_at)
+                event = 'parking tasks'
+            else:
+                # spread the tasks over a minute past the reset
+                tasks.extend(group)
+                delays.extend(max(0, delay) + random.uniform(0, 60) for _ in group)
+                event = 'delaying tasks'
+
+            logger.log_event(logging.INFO, {
+                'state': event,
+                'field': 'timestamp',
+                'value': available_at,
+                'count': len(group)
+            }, provider=provider)
+
+        if tasks:
+            self.send(tasks, delays)
+
+    def drain(self, provider : str, qps=None, now=None):
+        """
+        Re-admit parked tasks for an enabled provider, at most as many as the provider can process
+        in the drain interval, with delays spread over that interval.
+        """
+        last = self.drained.get(provider)
+        if last is not None and time.monotonic() - last < DRAIN_INTERVAL:
+            return []
+
+        self.drained[provider] = time.monotonic()
+
+        qps = qps or DRAIN_QPS
+        tasks = self.backlog.take(provider, int(math.ceil(qps * DRAIN_INTERVAL)), now=now)
+
+        if tasks:
+            self.send(tasks, [i / qps for i in range(len(tasks))])
+
+            logger.log_event(logging.INFO, {
+                'state': 'readmitting tasks',
+                'count': len(tasks)
+            }, provider=provider)
+
+        return tasks
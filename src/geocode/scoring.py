@@ -0,0 +1,120 @@
+"""
+Batch scoring of geocoder results. Scores all results of one response at once, with the same
+scores as rate_result:
+
+- text similarity is computed over the matrix of results and scored fields. Results of one
+  response mostly share their city, region and postal code, so each distinct value is compared
+  with the supplied address only once,
+- the distance decay against the guess is computed for all results with NumPy.
+
+The best candidate is the first result with the highest score, like max() over rate_result.
+"""
+import math
+
+from fuzzywuzzy import fuzz
+import numpy as np
+
+from geocode import location
+
+
+FIELDS = ('street', 'district', 'city', 'postal_code', 'region')
+SIMILARITY_THRESHOLD = 75       # minimum token set ratio for a field to match
+DISTANCE_SCORE = 3.0            # score for a result within 10 meters of the guess
+DISTANCE_HALF_LIFE = 10.0       # meters after which the distance score halves
+
+
+def text_scores(returned_addresses : list, address : dict):
+    """
+    Return the number of matching fields for each returned address.
+    """
+    matches = np.zeros((len(returned_addresses), len(FIELDS)), dtype=bool)
+
+    for j, field in enumerate(FIELDS):
+        if field not in address:
+            continue
+
+        similarity = {}
+
+        for i, returned_address in enumerate(returned_addresses):
+            if field not in returned_address:
+                continue
+
+            value = returned_address[field]
+
+            if value not in similarity:
+                similarity[value] = fuzz.token_set_ratio(value, address[field]) > SIMILARITY_THRESHOLD
+
+            matches[i, j] = similarity[value]
+
+    return matches.sum(axis=1).astype(float)
+
+
+def distance_scores(returned_coordinates : list, guess : dict):
+    """
+    Return the distance score of each result: full score up to 10 meters from the guess, halving
+    every 10 meters further.
+    """
+    distances = location.distances_geocodes(guess, returned_coordinates)
+
+    t = -DISTANCE_HALF_LIFE / math.log(0.5)
+
+    return np.where(
+        distances > 10,
+        DISTANCE_SCORE * np.exp((10.0 - distances) / t),
+        DISTANCE_SCORE
+    )
+
+
+def score_results(returned_addresses : list, returned_coordinates : list, address : dict):
+    """
+    Return the scores of all results of a response, see rate_result.
+    """
+    for returned_address in returned_addresses:
+        if 'street' in returned_address and 'house_number' in returned_address:
+            returned_address['street'] = ' '.join([
+                returned_address['house_number'],
+                returned_address['street']
+            ])
+
+    scores = 0.0 + text_scores(returned_addresses, address)
+
+    if 'guess' in address:
+        scores = scores + distance_scores(returned_coordinates, address['guess'])
+
+    return scores
+
+
+def max_score(address : dict):
+    """
+    Return the highest score a result can obtain for an address.
+    """
+    score = float(sum(1 for field in FIELDS if field in address))
+
+    if 'guess' in address:
+        score += DISTANCE_SCORE
+
+    return score
+
+
+def rank(results : list, returned_addresses : list, address : dict):
+    """
+    Return the position and score of the result with the highest score, the first one in case of
+    ties.
+    """
+    coordinates = [
+        {'longitude': result['longitude'], 'latitude': result['latitude']} for result in results
+    ]
+
+    scores = score_results(returned_addresses, coordinates, address)
+    index = int(np.argmax(scores))
+
+    return index, float(scores[index])
+
+
+def best_candidate(results : list, returned_addresses : list, address : dict):
+    """
+    Return the result with the highest score, the first one in case of ties.
+    """
+    index, _ = rank(results, returned_addresses, address)
+
+    return results[index]
@@ -0,0 +1,74 @@
+"""
+Local HTTP stub that stands in for the geocoding APIs in tests and benchmarks. Providers are
+pointed at the stub through their endpoint override (Geocoder.endpoint).
+
+Responses are registered per path and are served for any query string. Each response can be
+delayed to simulate the latency of a real provider.
+"""
+import http.server
+import json
+import threading
+import time
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves the response registered on the server for the requested path.
+    """
+    protocol_version = 'HTTP/1.1'   # keep-alive
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        status, payload, delay = self.server.responses.get(path, (404, {}, 0.0))
+
+        self.server.requests.append(self.path)
+
+        if delay:
+            time.sleep(delay)
+
+        body = json.dumps(payload).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    """
+    Threaded HTTP server on a free local port. Use as a context manager to run it in the
+    background.
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super(StubServer, self).__init__((host, port), StubHandler)
+        self.responses = {}
+        self.requests = []
+        self._thread = None
+
+    def url(self, path='/'):
+        return 'http://{host}:{port}{path}'.format(
+            host=self.server_address[0],
+            port=self.server_address[1],
+            path=path
+        )
+
+    def respond(self, path, payload, status=200, delay=0.0):
+        """
+        Register the JSON payload returned for a path.
+        """
+        self.responses[path] = (status, payload, delay)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.shutdown()
+        self.server_close()
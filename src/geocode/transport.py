@@ -0,0 +1,141 @@
+"""
+Process-wide HTTP transport for the synchronous provider path. All Geocoder objects share one
+requests session, so keep-alive connections (and with them DNS lookups and TLS sessions) are reused
+by every request in a container, across warm invocations.
+
+- Every provider host gets its own connection pool, sized to the concurrency of the provider (or
+  POOL_SIZE), so one busy provider cannot evict the connections of another.
+- Connection failures and gateway errors (502, 503, 504) are retried at the transport layer with a
+  short back off. Throttling (429) is left to the rate limiter (see ratelimit).
+- Connection reuse is counted per host and can be logged (see log_statistics).
+"""
+import logging
+import os
+import threading
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from geocode import logger
+
+
+POOL_SIZE = int(os.environ.get('TRANSPORT_POOL_SIZE', os.environ.get('WORKERS', 10)))
+RETRIES = int(os.environ.get('TRANSPORT_RETRIES', 2))
+BACKOFF_FACTOR = 0.2
+POOL_HOSTS = 10         # hosts kept per adapter (default adapters serve all other hosts)
+
+
+def provider_url(provider : str):
+    """
+    Return the base URL the geocoder package uses for a provider, None if unknown.
+    """
+    from geocoder.api import options
+
+    try:
+        url = options[provider]['geocode']._URL
+    except (KeyError, AttributeError):
+        return None
+
+    parts = urllib.parse.urlsplit(url)
+
+    return '{scheme}://{netloc}/'.format(scheme=parts.scheme, netloc=parts.netloc)
+
+
+def retry_policy(retries=RETRIES):
+    """
+    Retry connection errors and gateway errors. Reads are not retried: the provider may already
+    have counted the request against the quota.
+    """
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        status_forcelist=(502, 503, 504),
+        backoff_factor=BACKOFF_FACTOR,
+        raise_on_status=False
+    )
+
+
+class SessionPool:
+    """
+    Shared requests session with a connection pool per provider host.
+    """
+    def __init__(self, pool_size=POOL_SIZE, retries=RETRIES):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.adapters = {}
+        self._lock = threading.Lock()
+
+        self._session = requests.Session()
+        self._mount('http://', pool_size)
+        self._mount('https://', pool_size)
+
+    def _mount(self, prefix, pool_size):
+        adapter = HTTPAdapter(
+            pool_connections=POOL_HOSTS,
+            pool_maxsize=pool_size,
+            max_retries=retry_policy(self.retries)
+        )
+
+        self._session.mount(prefix, adapter)
+        self.adapters[prefix] = adapter
+
+    def session(self, provider=None, pool_size=None):
+        """
+        Return the shared session, after giving the host of the provider its own pool.
+        """
+        prefix = provider_url(provider) if provider else None
+
+        with self._lock:
+            if prefix and prefix not in self.adapters:
+                self._mount(prefix, pool_size or self.pool_size)
+
+        return self._session
+
+    def statistics(self):
+        """
+        Return the number of requests, connections and reused connections per host.
+        """
+        statistics = {}
+
+        with self._lock:
+            adapters = list(self.adapters.values())
+
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+
+                counts = statistics.setdefault(pool.host, {'requests': 0, 'connections': 0})
+                counts['requests'] += pool.num_requests
+                counts['connections'] += pool.num_connections
+
+        for counts in statistics.values():
+            counts['reused'] = max(0, counts['requests'] - counts['connections'])
+
+        return statistics
+
+    def log_statistics(self):
+        """
+        Log the connection reuse per host (cumulative for the container).
+        """
+        for host, counts in self.statistics().items():
+            event = {
+                'state': 'connection statistics',
+                'field': host,
+                'value': counts
+            }
+
+            logger.log_event(logging.INFO, event)
+
+    def close(self):
+        self._session.close()
+
+
+SESSIONS = SessionPool()
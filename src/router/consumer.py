@@ -11,7 +11,7 @@ import protobuf_to_dict
 import rollbar
 import yaml
 
-from router import logger, streamer
+from router import logger, planner, streamer
 from router.utils import Fetcher, Stasher, CountryMapper
 from router.entity import CandidateAccommodation
 
@@ -64,13 +64,13 @@ class CandidateHandler:
 
         return candidates
 
-    def process(self, stasher : Stasher):
+    def process(self, stasher : Stasher, fetcher : Fetcher = None):
         """
         Utilise the stasher to process the candidates. The steps are as follows:
 
             - register the candidates for 3 hours TTL
             - candidates with coordinates indicated as good skip geocoding
-            - others are geocoded for a list of providers
+            - others are geocoded for a list of providers, in stages (see planner)
         """
         self.register_candidates(stasher)
         categories = self.categorize_candidates()
@@ -92,11 +92,16 @@ class CandidateHandler:
 
         stasher.stash_trivago_candidates(addresses)
 
-        providers = ('google', 'osm', 'arcgis', 'tomtom')
-        tasks = self.create_geocoder_tasks(addresses, providers)
+        fetcher = fetcher or Fetcher()
+        fan_out = planner.FanOutPlanner(
+            fetcher.fetch_ruleset_definition('geocoders', os.getenv('GEOCODER_RULESET_VERSION', '20261018')),
+            fetcher.fetch_win_rates(),
+            providers=('google', 'osm', 'arcgis', 'tomtom')
+        )
 
-        stasher.send_geocoder_tasks(tasks)
-        logger.log_message(logging.INFO, 'Sent %s geocoder tasks', len(tasks))
+        for delay, tasks in fan_out.plan(addresses):
+            stasher.send_geocoder_tasks(tasks, delay=delay)
+            logger.log_message(logging.INFO, 'Sent %s geocoder tasks (delay %ss)', len(tasks), delay)
 
     def register_candidates(self, stasher):
         """
@@ -118,17 +123,6 @@ class CandidateHandler:
 
         return categories
 
-    def create_geocoder_tasks(self, addresses : List[dict], providers : List[str]):
-        """
-        Merge addresses that need geocoding with a list of geocoder providers to create tasks.
-        """
-        tasks = []
-
-        for address in addresses:
-            tasks.extend(map(lambda x: dict(**address, provider=x), providers))
-
-        return tasks
-
 
 def lambda_handler(event, context):
     try:
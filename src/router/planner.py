@@ -0,0 +1,136 @@
+"""
+Staged provider fan-out for candidate accommodations. Instead of sending every candidate to all
+geocoding providers at once, providers are ordered by how often they win the consolidation in the
+country of the candidate, and sent in stages:
+
+    - the first stage holds the providers that together win at least COVERAGE of the
+      consolidations in the country (at least one provider), and is sent right away,
+    - the other providers follow STAGE_DELAY seconds later per stage, and are only geocoded if the
+      consolidation of the candidate is still below SCORE_THRESHOLD by then (the geocoder checks
+      the consolidation_threshold of the task).
+
+Win rates come from historical consolidations (see compute_win_rates), computed before packaging
+by `make win-rates` (see win_rates). Without win rates for a country, providers are ordered by the
+position of their first rule in the geocoders ruleset and the first stage holds the top provider.
+
+Candidates of which only the city is known (no street or name) are sent to the local city-level
+geocoder first, which costs no quota. The first stage of providers for the country follows
+STAGE_DELAY seconds later with the full address, gated like any later stage: local results are the
+last rule of the geocoders ruleset, so only candidates the local geocoder missed are sent on.
+"""
+import collections
+from typing import Iterable, List
+
+
+COVERAGE = 0.8          # share of consolidations the first stage is expected to win
+SCORE_THRESHOLD = 1.0   # consolidation score of a geocoder ruleset winner
+STAGE_DELAY = 300       # seconds between stages (at most 15 minutes, the SQS delay limit)
+ALL_COUNTRIES = 'ALL'   # win rates over all countries
+CITY_PROVIDER = 'local'
+CITY_FIELDS = ('city', 'country_code', 'guess')
+
+
+def compute_win_rates(consolidations : Iterable[dict], threshold=SCORE_THRESHOLD):
+    """
+    Return the share of consolidations won per country and provider, from historical
+    consolidations (dicts with provider, country_code and score). Rates over all countries are
+    kept under ALL_COUNTRIES.
+    """
+    totals = collections.Counter()
+    wins = collections.defaultdict(collections.Counter)
+
+    for consolidation in consolidations:
+        for country in (consolidation.get('country_code'), ALL_COUNTRIES):
+            if not country:
+                continue
+
+            totals[country] += 1
+
+            if float(consolidation.get('score') or 0) >= threshold:
+                wins[country][consolidation['provider']] += 1
+
+    return dict(
+        (country, dict((provider, count / totals[country]) for provider, count in wins[country].items()))
+        for country in totals
+    )
+
+
+class FanOutPlanner:
+    def __init__(self, ruleset : dict, win_rates : dict, providers : List[str], coverage=COVERAGE,
+                 threshold=SCORE_THRESHOLD, stage_delay=STAGE_DELAY):
+        self.rules = (ruleset or {}).get('rules', [])
+        self.win_rates = win_rates or {}
+        self.providers = list(providers)
+        self.coverage = coverage
+        self.threshold = threshold
+        self.stage_delay = stage_delay
+
+    def ruleset_order(self, country_code=None):
+        """
+        Return the providers by the position of their first rule for the country (default rules if
+        the country has no rules of its own). Providers without rules come last.
+        """
+        rules = [rule for rule in self.rules if rule.get('country_code') == country_code] or \
+            [rule for rule in self.rules if not rule.get('country_code')]
+
+        positions = {}
+        for i, rule in enumerate(rules):
+            positions.setdefault(rule['provider'], i)
+
+        return sorted(self.providers, key=lambda provider: positions.get(provider, len(rules)))
+
+    def stages(self, country_code=None) -> List[List[str]]:
+        """
+        Return the providers for a country, grouped in stages.
+        """
+        order = self.ruleset_order(country_code)
+        rates = self.win_rates.get(country_code) or self.win_rates.get(ALL_COUNTRIES)
+
+        if not rates:
+            return [order[:1], order[1:]] if order[1:] else [order]
+
+        # stable: providers with equal win rates keep the ruleset order
+        order.sort(key=lambda provider: -rates.get(provider, 0.0))
+
+        first, covered = [], 0.0
+        for provider in order:
+            if first and covered >= self.coverage:
+                break
+
+            first.append(provider)
+            covered += rates.get(provider, 0.0)
+
+        rest = order[len(first):]
+
+        return [first, rest] if rest else [first]
+
+    def plan(self, addresses : List[dict]):
+        """
+        Return (delay in seconds, tasks) per stage for the supplied addresses. Tasks of later
+        stages carry the consolidation threshold below which they are still geocoded.
+        """
+        stages = collections.defaultdict(list)
+
+        for address in addresses:
+            fields = address.get('address', {})
+
+            country_code = fields.get('country_code')
+            address_stages = self.stages(country_code)
+
+            if 'street' not in fields and 'name' not in fields:
+                city = dict((k, v) for k, v in fields.items() if k in CITY_FIELDS)
+                stages[0].append(dict(address, address=city, provider=CITY_PROVIDER))
+
+                # fallback for cities the local geocoder misses
+                address_stages = [[]] + address_stages[:1]
+
+            for i, providers in enumerate(address_stages):
+                for provider in providers:
+                    task = dict(**address, provider=provider)
+
+                    if i:
+                        task['consolidation_threshold'] = self.threshold
+
+                    stages[i].append(task)
+
+        return [(i * self.stage_delay, stages[i]) for i in sorted(stages)]
@@ -14,3 +14,17 @@ class Fetcher:
     def fetch_country_codes(self):
         with open('data/country_codes.json') as f:
             return json.load(f)
+
+    def fetch_ruleset_definition(self, name, version, data_dir='data'):
+        with open(f'{data_dir}/{name}-ruleset-{version}.json') as f:
+            return json.load(f)
+
+    def fetch_win_rates(self, data_dir='data'):
+        """
+        Win rates per country and provider (see planner.compute_win_rates), empty if not available.
+        """
+        try:
+            with open(f'{data_dir}/provider-win-rates.json') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
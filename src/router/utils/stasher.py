@@ -4,6 +4,7 @@ import functools
 import itertools
 import json
 import logging
+import math
 import os
 import random
 import time
@@ -12,7 +13,7 @@ import multiprocessing
 
 import boto3
 from boto3.dynamodb.table import BatchWriter
-from boto3.dynamodb.types import TypeDeserializer
+from boto3.dynamodb.types import Binary, TypeDeserializer
 from botocore.exceptions import ClientError
 from six import binary_type, integer_types, string_types
 
@@ -99,6 +100,63 @@ def dynamo_sanitize(data):
     return new_data
 
 
+# serialize_number, serialize_value, serialize_item and ClientBatchWriterOCC are copied in
+# geocode.helpers: each Lambda package only ships its own source folder. Keep the copies identical
+# (checked by tests/router/test_stasher.py).
+def serialize_number(data):
+    if isinstance(data, float) and not math.isfinite(data) or \
+            isinstance(data, decimal.Decimal) and not data.is_finite():
+        raise TypeError('Infinity and NaN are not supported by DynamoDB')
+
+    return str(data)
+
+
+def serialize_value(data):
+    """
+    Return the low-level DynamoDB AttributeValue of a Python value, in a single pass. Values are
+    converted like dynamo_sanitize followed by the serializer of the boto3 resource layer: blank
+    strings and empty sets are stored as NULL, floats as numbers and dictionary keys as strings.
+    """
+    if data is None:
+        return {'NULL': True}
+    if isinstance(data, string_types):
+        return {'S': data} if data.strip() else {'NULL': True}
+    if isinstance(data, bool):
+        return {'BOOL': data}
+    if isinstance(data, (float, decimal.Decimal) + integer_types):
+        return {'N': serialize_number(data)}
+    if isinstance(data, dict):
+        return {'M': dict(
+            (key if isinstance(key, string_types) else str(key), serialize_value(value))
+            for key, value in data.items()
+        )}
+    if isinstance(data, (list, tuple)):
+        return {'L': [serialize_value(item) for item in data]}
+    if isinstance(data, (binary_type, bytearray)):
+        return {'B': bytes(data)}
+    if isinstance(data, Binary):
+        return {'B': data.value}
+    if isinstance(data, (set, frozenset)):
+        if not data:
+            return {'NULL': True}
+        if all(isinstance(item, string_types) for item in data):
+            return {'SS': list(data)}
+        if all(isinstance(item, (float, decimal.Decimal) + integer_types) and not isinstance(item, bool) for item in data):
+            return {'NS': [serialize_number(item) for item in data]}
+        if all(isinstance(item, (binary_type, bytearray, Binary)) for item in data):
+            return {'BS': [bytes(getattr(item, 'value', item)) for item in data]}
+
+    raise TypeError('Unsupported type "{}" for value "{}"'.format(type(data), data))
+
+
+def serialize_item(item : dict):
+    """
+    Return a DynamoDB item in the low-level AttributeValue format (see serialize_value), as
+    expected by the client-level batch_write_item.
+    """
+    return dict((key, serialize_value(value)) for key, value in item.items())
+
+
 def dynamodb_json_to_dict(dynamodb_json):
     """
     Converts DynamoDB JSON to dict.
@@ -176,6 +234,29 @@ class BatchWriterOCC(BatchWriter):
             self._flush_with_back_off_and_jitter()
 
 
+class ClientBatchWriterOCC(BatchWriterOCC):
+    """
+    BatchWriterOCC on the low-level DynamoDB client. Items are serialized in a single pass (see
+    serialize_item) instead of being sanitized and serialized again by the boto3 resource layer.
+    """
+    def __init__(self, table_name, client, flush_amount=25, overwrite_by_pkeys=None, nr_of_retries=10):
+        BatchWriter.__init__(
+            self,
+            table_name,
+            client,
+            flush_amount=flush_amount,
+            overwrite_by_pkeys=overwrite_by_pkeys
+        )
+
+        self.back_off = 1
+        self.cap = 60
+        self.base = 1
+        self.nr_of_retries = nr_of_retries
+
+    def put_item(self, Item):
+        super(ClientBatchWriterOCC, self).put_item(Item=serialize_item(Item))
+
+
 class Stasher:
     def __init__(self):
         self.client_dynamodb = boto3.client('dynamodb')
@@ -183,7 +264,7 @@ class Stasher:
         self.client_sqs = boto3.client('sqs')
 
     @parallelize(nr_of_procs=4)
-    def send_to_sqs(self, messages : Iterator[str], queue_url):
+    def send_to_sqs(self, messages : Iterator[str], queue_url, delay=0):
         for message_batch in batch(messages, batch_size=10):
             entries = list(message_batch)
 
@@ -193,7 +274,8 @@ class Stasher:
                     Entries=[
                         {
                             'Id': str(i),
-                            'MessageBody': entry
+                            'MessageBody': entry,
+                            'DelaySeconds': delay
                         } for i, entry in enumerate(entries)
                     ]
                 )
@@ -201,10 +283,11 @@ class Stasher:
                 entries = [entries[int(i['Id'])] for i in response.get('Failed', [])]
                 time.sleep(0.1)
 
-    def send_geocoder_tasks(self, tasks : Iterator[dict]):
+    def send_geocoder_tasks(self, tasks : Iterator[dict], delay=0):
         self.send_to_sqs(
             map(lambda x: json.dumps(x), tasks),
-            queue_url=os.getenv('GEOCODER_QUEUE')
+            queue_url=os.getenv('GEOCODER_QUEUE'),
+            delay=delay
         )
 
     @parallelize(nr_of_procs=4)
@@ -241,11 +324,7 @@ class Stasher:
 
     @parallelize(nr_of_procs=4)
     def write_to_dynamo(self, records : Iterator[dict], table_name : str, pkeys : tuple):
-        dynamodb = boto3.resource('dynamodb')
-        dynamodb.meta.client = self.client_dynamodb
-
-        table = dynamodb.Table(table_name)
-        with BatchWriterOCC(table, overwrite_by_pkeys=pkeys) as batch_writer:
+        with ClientBatchWriterOCC(table_name, self.client_dynamodb, overwrite_by_pkeys=pkeys) as batch_writer:
             for record in records:
                 batch_writer.put_item(Item=record)
 
@@ -361,7 +440,7 @@ class Stasher:
         records = []
         for entity in consolidations:
             records.append(dict(
-                **dynamo_sanitize(entity),
+                **entity,
                 provider='consolidated_' + environment
             ))
 
@@ -395,7 +474,7 @@ class Stasher:
                 continue
 
         self.write_to_dynamo(
-            list(map(lambda x: dynamo_sanitize(x), candidates)),
+            candidates,
             table_name=os.getenv('GEOCODES_TABLE'),
             pkeys=('entity', 'provider')
         )
@@ -0,0 +1,79 @@
+"""
+Computes the provider win rates of the staged fan-out (see planner.compute_win_rates) from the
+consolidations in the geocodes table, and writes them to data/provider-win-rates.json where the
+router reads them (see Fetcher.fetch_win_rates). Run before packaging the router:
+
+    GEOCODES_TABLE=... make win-rates
+
+Only consolidations of the consolidator count, they record the winning provider in their meta.
+Trusted candidates consolidated by the router itself are never sent to the geocoders.
+
+The job scans the whole geocodes table, run it offline (e.g. on every release) and not from a
+Lambda function.
+"""
+import json
+import logging
+import os
+import sys
+from typing import Iterable
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+from router import logger, planner
+
+
+def scan_consolidations(table_name : str, environment : str):
+    """
+    Yield the consolidation items of an environment from the geocodes table.
+    """
+    table = boto3.resource('dynamodb').Table(table_name)
+    kwargs = {'FilterExpression': Attr('provider').eq('consolidated_' + environment)}
+
+    while True:
+        response = table.scan(**kwargs)
+        yield from response['Items']
+
+        if 'LastEvaluatedKey' not in response:
+            break
+
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def consolidations(items : Iterable[dict]):
+    """
+    Yield the winning provider, country and score of consolidation items, skipping items without a
+    winning provider.
+    """
+    for item in items:
+        meta = item.get('meta') or {}
+
+        if meta.get('provider'):
+            yield {
+                'provider': meta['provider'],
+                'country_code': meta.get('country_code'),
+                'score': item.get('score')
+            }
+
+
+def write_win_rates(items : Iterable[dict], path : str):
+    """
+    Compute the win rates of consolidation items and write them to a JSON file.
+    """
+    win_rates = planner.compute_win_rates(consolidations(items))
+
+    with open(path, 'w') as f:
+        json.dump(win_rates, f, indent=2, sort_keys=True)
+
+    return win_rates
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/provider-win-rates.json'
+
+    win_rates = write_win_rates(
+        scan_consolidations(os.environ['GEOCODES_TABLE'], os.environ['ENVIRONMENT']),
+        path
+    )
+
+    logger.log_message(logging.INFO, 'Stored win rates of %s countries in %s', len(win_rates), path)
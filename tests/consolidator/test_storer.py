@@ -49,7 +49,8 @@ class TestStorer:
                                         'timestamp': ANY,
                                         'meta': {
                                             'city': 'Boston',
-                                            'country_code': 'US'
+                                            'country_code': 'US',
+                                            'provider': 'google'
                                         }
                                     }
                                 }
@@ -66,7 +67,7 @@ class TestStorer:
                             'entity': 'accommodation:1',
                             'entity_id': 1,
                             'entity_type': 'accommodation',
-                            'provider': 'consolidated_' + os.environ['ENVIRONMENT'],
+                            'provider': 'google',
                             'longitude': 23.9482,
                             'latitude': 83.8779,
                             'score': 0.9,
@@ -3,6 +3,25 @@ import pytest
 from geocode import entity, credentials
 
 
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true', help='run the micro-benchmarks')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: timing micro-benchmark, only run with --benchmark')
+
+
+def pytest_collection_modifyitems(config, items):
+    # timings are meaningless on shared CI workers, benchmarks are opt-in
+    if config.getoption('--benchmark'):
+        return
+
+    skip = pytest.mark.skip(reason='micro-benchmark, run with --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture(scope='module')
 def setup_accommodation():
     return entity.Accommodation(1, **{
@@ -74,8 +74,10 @@ def test_arcgis_call(setup_accommodation, setup_key, setup_response, mocker):
             setup_accommodation.region,
             setup_accommodation.country_code
         ]),
-        maxRows=100,
-        #key=setup_key['key']
+        maxRows=10,
+        #key=setup_key['key'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -99,8 +101,10 @@ def test_arcgis_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.region,
                 setup_accommodation.country_code
             ]),
-            maxRows=100,
-            #key=setup_key['key']
+            maxRows=10,
+            #key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -110,8 +114,10 @@ def test_arcgis_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.region,
                 setup_accommodation.country_code
             ]),
-            maxRows=100,
-            #key=setup_key['key']
+            maxRows=10,
+            #key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -120,8 +126,10 @@ def test_arcgis_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.region,
                 setup_accommodation.country_code
             ]),
-            maxRows=100,
-            #key=setup_key['key']
+            maxRows=10,
+            #key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -129,8 +137,10 @@ def test_arcgis_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.city,
                 setup_accommodation.country_code
             ]),
-            maxRows=100,
-            #key=setup_key['key']
+            maxRows=10,
+            #key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
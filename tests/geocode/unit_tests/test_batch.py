@@ -0,0 +1,126 @@
+"""
+Tests geocoding chunks of entities with Geocoder.geocode_many.
+"""
+import json
+
+import pytest
+
+from geocode import entity, helpers, main, providers, ratelimit
+from geocode.providers import base
+
+
+@pytest.fixture
+def setup_entities():
+    return [
+        entity.Accommodation(i, street='{} Abbey Road'.format(i), city='London', country_code='UK')
+        for i in range(1, 4)
+    ]
+
+
+@pytest.fixture
+def setup_arcgis(mocker):
+    mocker.patch.object(base, 'RATE_LIMITER', ratelimit.RateLimiter({}))
+
+    service = providers.Arcgis()
+    service.batch_size = 150
+    mocker.patch.object(service, '_active_key', return_value={'key': 'arcgis_token'})
+    mocker.patch.object(service, 'session')
+
+    return service
+
+
+def locations(*result_ids):
+    return {'locations': [
+        {
+            'address': 'Abbey Road, London',
+            'location': {'x': -0.17, 'y': 51.53},
+            'score': 100,
+            'attributes': {'ResultID': i, 'Addr_type': 'PointAddress'}
+        } for i in result_ids
+    ]}
+
+
+def test_default_geocodes_one_by_one(setup_entities, mocker):
+    mocker.patch.object(base, 'RATE_LIMITER', ratelimit.RateLimiter({}))
+    service = providers.Osm()
+
+    def _geocode(address):
+        if address['street'].startswith('2'):
+            raise helpers.InvalidRequestError(service.name)
+
+        return {'longitude': 0.0, 'latitude': 0.0, 'raw': {}}
+
+    mocker.patch.object(service, '_geocode', side_effect=_geocode)
+
+    results = service.geocode_many(setup_entities)
+
+    # a result or an error per entity, in order
+    assert [result['entity_id'] for result in (results[0], results[2])] == [1, 3]
+    assert isinstance(results[1], helpers.InvalidRequestError)
+
+
+def test_native_batch(setup_arcgis, setup_entities, mocker):
+    setup_arcgis.session.post.return_value.json.return_value = locations(0, 2)
+    single = mocker.patch.object(setup_arcgis, 'geocode', side_effect=helpers.NoResultsFoundError('arcgis'))
+
+    results = setup_arcgis.geocode_many(setup_entities)
+
+    assert setup_arcgis.session.post.call_count == 1
+    params = setup_arcgis.session.post.call_args[1]['data']
+    assert params['token'] == 'arcgis_token'
+    assert len(json.loads(params['addresses'])['records']) == 3
+
+    assert [results[0]['entity_id'], results[2]['entity_id']] == [1, 3]
+    assert results[0]['longitude'] == -0.17
+    assert results[0]['meta']['rejected'] == []
+
+    # the entity without a result in the batch is geocoded on its own
+    single.assert_called_once_with(setup_entities[1])
+    assert isinstance(results[1], helpers.NoResultsFoundError)
+
+
+def test_batch_size(setup_arcgis, setup_entities):
+    setup_arcgis.batch_size = 2
+    setup_arcgis.session.post.return_value.json.side_effect = [locations(0, 1), locations(0)]
+
+    results = setup_arcgis.geocode_many(setup_entities)
+
+    assert setup_arcgis.session.post.call_count == 2
+    assert [result['entity_id'] for result in results] == [1, 2, 3]
+
+
+def test_failed_batch_falls_back(setup_arcgis, setup_entities, mocker):
+    setup_arcgis.session.post.return_value.json.return_value = {'error': {'code': 498}}
+    single = mocker.patch.object(setup_arcgis, 'geocode', return_value={'entity_id': 0})
+
+    results = setup_arcgis.geocode_many(setup_entities)
+
+    assert single.call_count == 3
+    assert results == [{'entity_id': 0}] * 3
+
+
+def test_geocode_tasks(mocker):
+    service = mocker.Mock(version='1.0.0')
+    service.geocode_many.return_value = [{'longitude': 0.0}, helpers.NoResultsFoundError('osm')]
+    mocker.patch.object(main, 'load_provider', return_value=service)
+    mocker.patch.object(main.QUOTA, 'is_disabled', return_value=False)
+    mocker.patch.object(main.NEGATIVE_CACHE, 'contains', return_value=False)
+    negative = mocker.patch.object(main.NEGATIVE_CACHE, 'add')
+
+    tasks = [
+        dict(provider='osm', entity_id=i, entity_type='accommodation', batch_id='bulk',
+             address={'street': street, 'city': 'London', 'country_code': 'GB'})
+        for i, street in enumerate(['1 Abbey Road', '1 Abbey Road', '3 Abbey Road'])
+    ]
+
+    outcomes = main.geocode_tasks(tasks, concurrency=4)
+
+    # one chunk per provider, identical addresses are sent once
+    service.geocode_many.assert_called_once()
+    entities, concurrency = service.geocode_many.call_args[0]
+    assert [e.entity_id for e in entities] == [0, 2]
+    assert concurrency == 4
+
+    assert outcomes[0] is outcomes[1]
+    assert isinstance(outcomes[2], helpers.NoResultsFoundError)
+    negative.assert_called_once()
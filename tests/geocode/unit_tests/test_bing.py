@@ -75,7 +75,9 @@ def test_bing_call(setup_accommodation, setup_key, setup_response, mocker):
         countryRegion=setup_accommodation.country_code,
         method='details',
         maxRows=100,
-        **setup_key
+        **setup_key,
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -99,7 +101,9 @@ def test_bing_iterative_addresses(setup_accommodation, setup_key, mocker):
             countryRegion=setup_accommodation.country_code,
             method='details',
             maxRows=100,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             None,
@@ -109,7 +113,9 @@ def test_bing_iterative_addresses(setup_accommodation, setup_key, mocker):
             countryRegion=setup_accommodation.country_code,
             method='details',
             maxRows=100,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             None,
@@ -118,7 +124,9 @@ def test_bing_iterative_addresses(setup_accommodation, setup_key, mocker):
             countryRegion=setup_accommodation.country_code,
             method='details',
             maxRows=100,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
@@ -0,0 +1,165 @@
+"""
+Tests the daily quota budgets.
+"""
+import datetime
+
+import pytest
+import pytz
+from botocore.exceptions import BotoCoreError, ClientError
+
+from geocode import budget, helpers, providers, quota
+from geocode.providers import base
+
+
+CONFIG = {
+    'google': {'budget': {'daily': 1000, 'reserve': 0.2, 'timezone': 'US/Pacific'}},
+    'osm': {}
+}
+
+
+def pacific(hour):
+    timezone = pytz.timezone('US/Pacific')
+
+    return timezone.localize(datetime.datetime(2030, 3, 4, hour)).timestamp()
+
+
+@pytest.fixture
+def planner():
+    return budget.Budget(CONFIG, budget.Ledger(budget.MemoryCounterStore(), sync_interval=0))
+
+
+def test_day(planner):
+    day, start, end = planner.day('google', now=pacific(23))
+
+    assert day == '2030-03-04'
+    assert (start, end) == (pacific(0), pacific(0) + budget.DAY)
+
+
+def test_bulk_is_paced(planner):
+    # at 6 AM (a quarter of the day), bulk may spend 800 * (1/4 + 1/24) calls
+    now = pacific(6)
+    for _ in range(233):
+        planner.spend('google', now=now)
+
+    planner.admit('google', budget.LOW, now=now)
+    planner.spend('google', now=now)
+
+    with pytest.raises(helpers.BudgetDeferredError) as error:
+        planner.admit('google', budget.LOW, now=now)
+
+    assert error.value.available_at == pytest.approx(now, abs=120)
+
+    # real-time tasks are still admitted
+    planner.admit('google', budget.HIGH, now=now)
+
+
+def test_reserve_and_budget_end(planner):
+    now = pacific(23)
+    for _ in range(800):
+        planner.spend('google', now=now)
+
+    # bulk stops at the reserve, real-time tasks at the budget
+    with pytest.raises(helpers.BudgetDeferredError) as error:
+        planner.admit('google', budget.LOW, now=now)
+    assert error.value.available_at == pacific(0) + budget.DAY
+
+    planner.admit('google', budget.HIGH, now=now)
+
+    for _ in range(200):
+        planner.spend('google', now=now)
+
+    with pytest.raises(helpers.BudgetDeferredError):
+        planner.admit('google', budget.HIGH, now=now)
+
+    # the budget is per key
+    assert planner.admit('google', budget.HIGH, keys=2, now=now) is None
+    assert planner.admit('osm', budget.LOW, now=now) is None
+
+
+def test_key_budget(planner):
+    for _ in range(1000):
+        planner.spend('google', 'google#a', now=pacific(12))
+
+    assert not planner.available('google', 'google#a', now=pacific(12))
+    assert planner.available('google', 'google#b', now=pacific(12))
+    assert planner.spent('google', now=pacific(12)) == 1000
+
+    # a new day starts with a new budget
+    assert planner.available('google', 'google#a', now=pacific(12) + budget.DAY)
+
+
+def test_ledger_shares_counts():
+    store = budget.MemoryCounterStore()
+    worker_a = budget.Ledger(store, sync_interval=60)
+    worker_b = budget.Ledger(store, sync_interval=60)
+
+    expires = pacific(0) + budget.DAY
+    for _ in range(3):
+        worker_a.spend('google', '2030-03-04', expires)
+    worker_b.spend('google', '2030-03-04', expires)
+
+    assert worker_a.count('google', '2030-03-04') == 3
+    assert worker_b.count('google', '2030-03-04') == 1
+
+    worker_a.sync(force=True)
+    worker_b.sync(force=True)
+    assert worker_b.count('google', '2030-03-04') == 4
+
+    worker_a.sync(force=True)
+    assert worker_a.count('google', '2030-03-04') == 4
+
+
+def test_new_worker_sees_shared_count():
+    store = budget.MemoryCounterStore()
+    store.add('google@2030-03-04', 7, pacific(0) + budget.DAY)
+
+    # before its first sync
+    assert budget.Ledger(store, sync_interval=60).count('google', '2030-03-04') == 7
+
+
+def test_ledger_keeps_counting_without_store(mocker):
+    store = mocker.Mock()
+    store.get.side_effect = BotoCoreError()
+    store.add.side_effect = [ClientError({'Error': {'Code': 'ThrottlingException'}}, 'UpdateItem'), 5]
+    ledger = budget.Ledger(store, sync_interval=60)
+
+    expires = pacific(0) + budget.DAY
+    ledger.spend('google', '2030-03-04', expires, amount=2)
+    ledger.sync(force=True)
+    assert ledger.count('google', '2030-03-04') == 2
+
+    # the calls are added once the store is back
+    ledger.sync(force=True)
+    assert store.add.call_args[0][1] == 2
+    assert ledger.count('google', '2030-03-04') == 5
+
+
+def test_dynamo_counter_store(mocker):
+    table = mocker.patch('boto3.resource').return_value.Table.return_value
+    table.update_item.return_value = {'Attributes': {'calls': 12}}
+    table.get_item.return_value = {'Item': {'name': 'google@2030-03-04', 'calls': 12}}
+
+    store = budget.DynamoCounterStore('budget')
+
+    assert store.add('google@2030-03-04', 2, 1899600000.5) == 12
+    assert table.update_item.call_args[1]['ExpressionAttributeValues'][':expires'] == 1899600001
+    assert store.get('google@2030-03-04') == 12
+
+    table.get_item.return_value = {}
+    assert store.get('google@2030-03-05') == 0
+
+
+def test_exhausted_key_is_not_called(mocker):
+    service = providers.Google()
+    mocker.patch.object(base, 'BUDGET', budget.Budget(CONFIG, budget.Ledger(budget.MemoryCounterStore())))
+    mocker.patch.object(quota, 'STORE', quota.MemoryQuotaStore())
+    geocode = mocker.patch.object(service, '_geocode')
+
+    for key in base.KEY_HANDLER.schedulers['google'].keys:
+        for _ in range(1000):
+            base.BUDGET.spend('google', base.KEY_HANDLER.key_name('google', key))
+
+    with pytest.raises(helpers.QuotaExhaustedError):
+        service._request({})
+
+    assert not geocode.called
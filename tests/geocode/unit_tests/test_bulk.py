@@ -0,0 +1,105 @@
+"""
+Tests the bulk geocoding command line.
+"""
+import json
+
+import pytest
+
+from geocode import bulk, helpers, main
+
+
+CSV = '''entity_id,provider,street,city,country_code,guess_longitude,guess_latitude
+1,osm,1 Abbey Road,London,GB,-0.17,51.53
+2,osm,2 Abbey Road,London,GB,,
+3,osm,3 Abbey Road,London,GB,,
+4,osm,4 Abbey Road,London,gb,,
+'''
+
+
+@pytest.fixture
+def setup_files(tmp_path):
+    source = tmp_path / 'addresses.csv'
+    source.write_text(CSV)
+
+    return str(source), str(tmp_path / 'results.jsonl')
+
+
+@pytest.fixture
+def setup_geocode(mocker):
+    failures = {}
+
+    def geocode_tasks(tasks, concurrency):
+        return [
+            failures.get(task['entity_id'], {'longitude': 0.0, 'latitude': 0.0, 'provider': task['provider']})
+            for task in tasks
+        ]
+
+    mocker.patch.object(main, 'geocode_tasks', side_effect=geocode_tasks)
+    mocker.patch.object(main, 'sync_budgets')
+
+    return failures
+
+
+def read_output(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_read_csv(setup_files):
+    tasks = list(bulk.read_tasks(setup_files[0]))
+
+    assert tasks[0] == {
+        'entity_id': 1,
+        'provider': 'osm',
+        'address': {
+            'street': '1 Abbey Road',
+            'city': 'London',
+            'country_code': 'GB',
+            'guess': {'longitude': -0.17, 'latitude': 51.53}
+        }
+    }
+    assert 'guess' not in tasks[1]['address']
+
+
+def test_run_writes_results_per_row(setup_files, setup_geocode):
+    setup_geocode[2] = helpers.NoResultsFoundError('osm')
+
+    counts = bulk.run(*setup_files, dict(entity_type='accommodation', batch_id='bulk'), chunk_size=3)
+
+    assert counts == dict(geocoded=4, skipped=0, deferred=0)
+
+    records = read_output(setup_files[1])
+    assert [record['row'] for record in records] == [0, 1, 2, 3]
+    assert [record['status'] for record in records] == ['OK', 'NO RESULTS', 'OK', 'INVALID TASK']
+    assert records[0]['entity'] == 'accommodation:1'
+    assert records[0]['batch_id'] == 'bulk'
+
+
+def test_resume(setup_files, setup_geocode):
+    defaults = dict(entity_type='accommodation', batch_id='bulk')
+    setup_geocode[3] = helpers.QuotaExhaustedError('osm')
+
+    counts = bulk.run(*setup_files, defaults, chunk_size=2)
+    assert counts == dict(geocoded=3, skipped=0, deferred=1)
+
+    # a line torn by a crash is dropped
+    with open(setup_files[1], 'a') as f:
+        f.write('{"row": 3, "sta')
+
+    setup_geocode.clear()
+    counts = bulk.run(*setup_files, defaults, chunk_size=2)
+
+    # only the deferred row is sent again
+    assert counts == dict(geocoded=1, skipped=3, deferred=0)
+    sent = [len(call[0][0]) for call in main.geocode_tasks.call_args_list]
+    assert sum(sent) == 3 + 1
+    assert sorted(record['row'] for record in read_output(setup_files[1])) == [0, 1, 2, 3]
+
+
+def test_cli_exit_status(setup_files, setup_geocode):
+    setup_geocode[1] = helpers.BudgetDeferredError('osm', 0)
+
+    assert bulk.cli([*setup_files, '--chunk-size', '10']) == 1
+
+    setup_geocode.clear()
+    assert bulk.cli([*setup_files]) == 0
@@ -0,0 +1,167 @@
+"""
+Tests the two-tier (LRU + Redis) cache layer of the geocoder.
+"""
+import json
+import time
+
+import pytest
+
+from geocode import cache, helpers, main
+
+
+@pytest.fixture
+def setup_task():
+    return {
+        "provider": "google",
+        "entity_id": 1,
+        "entity_type": "accommodation",
+        "address": {
+            "street": "30 Abbey Road",
+            "city": "London",
+            "country_code": "GB"
+        }
+    }
+
+
+@pytest.fixture
+def setup_result(setup_task):
+    return {
+        'longitude': -0.17,
+        'latitude': 51.53,
+        'provider': 'google',
+        'entity': 'accommodation:1',
+        'meta': {
+            'address': setup_task['address']
+        }
+    }
+
+
+@pytest.fixture
+def result_cache():
+    return cache.ResultCache(cache.LocalRedis(), maxsize=2, ttl=60)
+
+
+def test_lru_eviction():
+    lru = cache.LRUCache(maxsize=2)
+
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)
+
+    # b was least recently used
+    assert 'b' not in lru
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+    assert len(lru) == 2
+
+
+def test_lru_expiry(mocker):
+    lru = cache.LRUCache()
+
+    mocker.patch('time.time', return_value=1000.0)
+    lru.set('a', 1, ttl=10)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+
+    mocker.patch('time.time', return_value=1011.0)
+    assert lru.get('a') is None
+    assert 'a' not in lru
+    assert lru.get('b') == 2
+
+
+def test_redis_hits_expire_in_process(result_cache, setup_result, mocker):
+    result_cache.client.set('k1', json.dumps(setup_result))
+
+    mocker.patch('time.time', return_value=1000.0)
+    assert result_cache.get_many(['k1'], ['google']) == [setup_result]
+
+    # the remaining ttl in Redis is unknown, kept at most LRU_TTL in process
+    mocker.patch('time.time', return_value=1000.0 + cache.LRU_TTL)
+    assert result_cache.lru.get('k1') is None
+
+
+def test_local_redis_expiry(mocker):
+    client = cache.LocalRedis()
+
+    mocker.patch('time.time', return_value=1000.0)
+    client.set('a', 'value', ex=10)
+    assert client.mget(['a', 'b']) == [b'value', None]
+
+    mocker.patch('time.time', return_value=1011.0)
+    assert client.get('a') is None
+
+
+def test_result_cache_tiers(result_cache, setup_result):
+    assert result_cache.get_many(['k1'], ['google']) == [None]
+
+    result_cache.set_many([('k1', setup_result, None)])
+
+    # served from the LRU
+    assert result_cache.get_many(['k1'], ['google']) == [setup_result]
+
+    # served from Redis after falling out of the LRU
+    result_cache.lru.delete('k1')
+    assert result_cache.get_many(['k1'], ['google']) == [setup_result]
+    assert 'k1' in result_cache.lru
+
+    assert result_cache.stats['google'] == {
+        'misses': 1,
+        'lru_hits': 1,
+        'redis_hits': 1
+    }
+
+
+def test_result_cache_returns_copies(result_cache, setup_result):
+    result_cache.set_many([('k1', setup_result, None)])
+
+    result_cache.get_many(['k1'], ['google'])[0]['entity'] = 'accommodation:2'
+
+    assert result_cache.get_many(['k1'], ['google'])[0]['entity'] == 'accommodation:1'
+
+
+def test_load_cache(setup_task, setup_result, mocker):
+    mocker.patch.object(main, 'CACHE', cache.ResultCache(cache.LocalRedis()))
+
+    keys, cache_results = main.load_cache([setup_task])
+    assert cache_results == [None]
+
+    main.CACHE.set_many([(keys[0], setup_result, None)])
+
+    assert main.load_cache([setup_task]) == (keys, [setup_result])
+
+
+def test_negative_cache(mocker):
+    client = cache.LocalRedis()
+    negative_cache = cache.NegativeCache(client, maxsize=1, ttl=10)
+
+    assert not negative_cache.contains('k1', 'google')
+
+    negative_cache.add('k1')
+
+    assert negative_cache.contains('k1', 'google')
+    # kept apart from results with the same key
+    assert client.get('k1') is None
+
+    # expired in both tiers
+    mocker.patch('time.time', return_value=time.time() + 11)
+    assert not negative_cache.contains('k1', 'google')
+    assert len(negative_cache.lru) == 0
+
+
+def test_geocode_task_negative_cache(setup_task, mocker):
+    mocker.patch.object(main, 'NEGATIVE_CACHE', cache.NegativeCache(cache.LocalRedis()))
+    provider = mocker.Mock(version='1.0.0')
+    provider.geocode.side_effect = helpers.NoResultsFoundError('google')
+    mocker.patch.object(main, 'load_provider', return_value=provider)
+    mocker.patch.object(main, 'load_entity')
+
+    with pytest.raises(helpers.NoResultsFoundError) as error:
+        main.geocode_task(setup_task)
+    assert error.value.status == 'NO RESULTS'
+
+    # the provider is not called again for the same address
+    with pytest.raises(helpers.NegativeCacheHitError) as error:
+        main.geocode_task(setup_task)
+    assert error.value.status == 'NEGATIVE CACHE'
+    assert provider.geocode.call_count == 1
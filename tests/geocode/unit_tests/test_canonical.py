@@ -0,0 +1,64 @@
+"""
+Tests address canonicalization before hashing and dispatch.
+"""
+import pytest
+
+from geocode import canonical, main
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('  Abbey   Road ', 'abbey road'),
+    ('München', 'munchen'),
+    ('Straße', 'strasse'),
+    ('東京', '東京'),
+    ('Abbey Road,, London.', 'abbey road, london'),
+    ('Rue de la Paix , Paris', 'rue de la paix, paris')
+])
+def test_fold_and_collapse(text, expected):
+    assert canonical.collapse(canonical.fold(text)) == expected
+
+
+@pytest.mark.parametrize('street, expected', [
+    ('30 abbey road', ('30', 'abbey road')),
+    ('hauptstrasse 5a', ('5a', 'hauptstrasse')),
+    ('via roma, 12', ('12', 'via roma')),
+    ('calle 10', (None, 'calle 10')),
+    ('abbey road', (None, 'abbey road'))
+])
+def test_split_house_number(street, expected):
+    assert canonical.split_house_number(street) == expected
+
+
+def test_canonicalize():
+    address = {
+        'street': ' 30 Abbey  Road',
+        'city': 'LONDON',
+        'country_code': 'UK',
+        'guess': {'longitude': -0.17, 'latitude': 51.53}
+    }
+
+    assert canonical.canonicalize(address) == {
+        'street': 'abbey road',
+        'house_number': '30',
+        'city': 'london',
+        'country_code': 'GB',
+        'guess': {'longitude': -0.17, 'latitude': 51.53}
+    }
+
+    # memoized, but callers get their own copy
+    canonical.canonicalize(address)['city'] = 'paris'
+    assert canonical.canonicalize(address)['city'] == 'london'
+
+
+def test_canonicalize_tasks_merges_keys(mocker):
+    log_event = mocker.patch('geocode.logger.log_event')
+    tasks = [
+        {'provider': 'google', 'address': {'street': '30 Abbey Road', 'city': 'London', 'country_code': 'GB'}},
+        {'provider': 'google', 'address': {'street': 'abbey road', 'house_number': '30', 'city': 'london ', 'country_code': 'GB'}},
+        {'provider': 'osm', 'address': {'street': '30 Abbey Road', 'city': 'London', 'country_code': 'GB'}}
+    ]
+
+    main.canonicalize_tasks(tasks)
+
+    assert tasks[0]['address'] == tasks[1]['address']
+    assert log_event.call_args[0][1]['value'] == {'tasks': 3, 'keys': 2, 'merged': 1}
@@ -0,0 +1,88 @@
+"""
+Tests coalescing of identical geocoder requests.
+"""
+import threading
+import time
+
+import pytest
+
+from geocode import coalesce, helpers, main
+
+
+@pytest.fixture
+def setup_tasks():
+    address = {
+        'street': '30 Abbey Road',
+        'city': 'London',
+        'country_code': 'GB'
+    }
+
+    return [
+        dict(provider='google', entity_id=i, entity_type='accommodation', address=address.copy())
+        for i in range(3)
+    ]
+
+
+def test_group_by_key():
+    groups = coalesce.group_by_key([('a', 1), ('b', 2), ('a', 3)])
+
+    assert list(groups.items()) == [('a', [1, 3]), ('b', [2])]
+
+
+def test_single_flight_shares_call():
+    single_flight = coalesce.SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'latitude': 1.0}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight.do('key', work)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'latitude': 1.0}] * 4
+    assert len(single_flight) == 0
+
+
+def test_single_flight_shares_errors():
+    single_flight = coalesce.SingleFlight()
+
+    def work():
+        raise helpers.NoResultsFoundError('google')
+
+    with pytest.raises(helpers.NoResultsFoundError):
+        single_flight.do('key', work)
+
+    # failed calls are not remembered
+    assert single_flight.do('key', lambda: 1) == 1
+
+
+def test_rebind_result(setup_tasks):
+    result = main.rebind_result({'entity_id': 0, 'entity': 'accommodation:0'}, setup_tasks[2])
+
+    assert result['entity_id'] == 2
+    assert result['entity'] == 'accommodation:2'
+    assert result['provider'] == 'google'
+
+
+def test_coalesced_tasks_share_key(setup_tasks, mocker):
+    mocker.patch.object(main, 'geocode_task', side_effect=lambda task: time.sleep(0.1) or {})
+
+    threads = [
+        threading.Thread(target=main.geocode_task_coalesced, args=(task,)) for task in setup_tasks
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert main.geocode_task.call_count == 1
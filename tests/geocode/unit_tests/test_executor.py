@@ -0,0 +1,130 @@
+"""
+Tests concurrent task execution with per-provider concurrency limits.
+"""
+import collections
+import threading
+import time
+
+import pytest
+
+from geocode import executor, helpers, main, quota
+
+
+@pytest.fixture
+def setup_tasks():
+    return [
+        {'provider': provider, 'entity_id': i}
+        for i, provider in enumerate(['osm', 'google', 'osm', 'google', 'osm', 'here'])
+    ]
+
+
+def test_serial_execution(setup_tasks):
+    task_executor = executor.TaskExecutor(workers=1)
+
+    futures = task_executor.map(lambda task: task['entity_id'], setup_tasks)
+
+    assert [future.result() for future in futures] == list(range(len(setup_tasks)))
+
+
+def test_concurrency_limits(setup_tasks):
+    limits = {'osm': 1}
+    in_flight = collections.Counter()
+    peak = collections.Counter()
+    lock = threading.Lock()
+
+    def work(task):
+        with lock:
+            in_flight[task['provider']] += 1
+            peak[task['provider']] = max(peak[task['provider']], in_flight[task['provider']])
+
+        time.sleep(0.05)
+
+        with lock:
+            in_flight[task['provider']] -= 1
+
+        return task['entity_id']
+
+    task_executor = executor.TaskExecutor(workers=4, limit=limits.get)
+    futures = task_executor.map(work, setup_tasks)
+
+    # results are returned in task order
+    assert [future.result() for future in futures] == list(range(len(setup_tasks)))
+    assert peak['osm'] == 1
+    assert peak['google'] == 2
+
+
+def test_exceptions_are_kept_per_task(setup_tasks):
+    def work(task):
+        if task['provider'] == 'osm':
+            raise helpers.NoResultsFoundError(task['provider'])
+        return task['entity_id']
+
+    task_executor = executor.TaskExecutor(workers=4)
+    futures = task_executor.map(work, setup_tasks)
+
+    for task, future in zip(setup_tasks, futures):
+        if task['provider'] == 'osm':
+            with pytest.raises(helpers.NoResultsFoundError):
+                future.result()
+        else:
+            assert future.result() == task['entity_id']
+
+
+def test_lanes_fair_share():
+    lanes = executor.Lanes({'high': 3, 'low': 1})
+
+    for i in range(4):
+        lanes.append('low', ('low', i))
+    for i in range(6):
+        lanes.append('high', ('high', i))
+
+    order = [lanes.popleft()[0] for _ in range(len(lanes))]
+
+    # 3:1 while both lanes wait, the remaining low priority tasks take all slots
+    assert order[:8] == ['high', 'high', 'low', 'high'] * 2
+    assert order[8:] == ['low', 'low']
+
+    with pytest.raises(IndexError):
+        lanes.popleft()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_real_time_tasks_first(workers):
+    tasks = [
+        {'provider': 'osm', 'entity_id': i, 'batch_id': 'backfill'} for i in range(6)
+    ] + [
+        {'provider': 'osm', 'entity_id': 6}
+    ]
+    started = []
+
+    def work(task):
+        started.append(task['entity_id'])
+        time.sleep(0.01)
+        return task['entity_id']
+
+    task_executor = executor.TaskExecutor(
+        workers=workers,
+        limit=lambda provider: 1,
+        priority=main.task_priority,
+        weights=main.PRIORITY_WEIGHTS
+    )
+    futures = task_executor.map(work, tasks)
+
+    assert [future.result() for future in futures] == list(range(7))
+    assert started[0] == 6
+
+
+def test_disable_provider_once(mocker):
+    mocker.patch.object(main, 'QUOTA', quota.MemoryQuotaStore())
+    provider = mocker.Mock()
+    provider.quota_reset.return_value = time.time() + 3600
+    mocker.patch.object(main, 'load_provider', return_value=provider)
+
+    threads = [threading.Thread(target=main.disable_provider, args=('google',)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert main.QUOTA.is_disabled('google')
+    assert provider.quota_reset.call_count == 1
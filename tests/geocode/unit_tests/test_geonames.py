@@ -43,7 +43,9 @@ def test_geonames_call(setup_destination, setup_key, setup_response, mocker):
     geocoder.geonames.assert_called_with(
         location=setup_destination.city,
         country=setup_destination.country_code,
-        key=setup_key
+        key=setup_key,
+        session=service.session,
+        timeout=service.timeout
     )
     
 
@@ -69,5 +71,7 @@ def test_geonames_call_with_guess(setup_destination_with_guess, setup_key, setup
         north=bbox['north'],
         south=bbox['south'],
         east=bbox['east'],
-        west=bbox['west']
+        west=bbox['west'],
+        session=service.session,
+        timeout=service.timeout
     )
\ No newline at end of file
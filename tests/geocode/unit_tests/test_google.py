@@ -76,7 +76,9 @@ def test_google_call(setup_accommodation, setup_key, setup_response, mocker):
             country_code=setup_accommodation.country_code
         ),
         client=setup_key['client'],
-        client_secret=setup_key['client_secret']
+        client_secret=setup_key['client_secret'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -109,7 +111,9 @@ def test_google_call_with_guess(setup_accommodation_with_guess, setup_key, setup
         ),
         bounds=bounds,
         client=setup_key['client'],
-        client_secret=setup_key['client_secret']
+        client_secret=setup_key['client_secret'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -137,7 +141,9 @@ def test_google_iterative_addresses(setup_accommodation, setup_key, mocker):
                 country_code=setup_accommodation.country_code
             ),
             client=setup_key['client'],
-            client_secret=setup_key['client_secret']
+            client_secret=setup_key['client_secret'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             setup_accommodation.street,
@@ -147,7 +153,9 @@ def test_google_iterative_addresses(setup_accommodation, setup_key, mocker):
                 country_code=setup_accommodation.country_code
             ),
             client=setup_key['client'],
-            client_secret=setup_key['client_secret']
+            client_secret=setup_key['client_secret'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             setup_accommodation.street,
@@ -156,7 +164,9 @@ def test_google_iterative_addresses(setup_accommodation, setup_key, mocker):
                 country_code=setup_accommodation.country_code
             ),
             client=setup_key['client'],
-            client_secret=setup_key['client_secret']
+            client_secret=setup_key['client_secret'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
@@ -186,7 +196,9 @@ def test_google_incomplete_iterative_addresses(setup_accommodation_incomplete, s
                 country_code=setup_accommodation_incomplete.country_code
             ),
             client=setup_key['client'],
-            client_secret=setup_key['client_secret']
+            client_secret=setup_key['client_secret'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
@@ -75,7 +75,9 @@ def test_google_places_call(setup_accommodation, setup_key, setup_response, mock
             administrative_area=setup_accommodation.region,
             country_code=setup_accommodation.country_code
         ),
-        **setup_key
+        **setup_key,
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -108,7 +110,9 @@ def test_google_places_call_with_guess(setup_accommodation_with_guess, setup_key
         ),
         bounds=bounds,
         client=setup_key['client'],
-        client_secret=setup_key['client_secret']
+        client_secret=setup_key['client_secret'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -136,7 +140,9 @@ def test_google_places_iterative_addresses(setup_accommodation, setup_key, mocke
                 country_code=setup_accommodation.country_code
             ),
             client=setup_key['client'],
-            client_secret=setup_key['client_secret']
+            client_secret=setup_key['client_secret'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             setup_accommodation.name,
@@ -146,7 +152,9 @@ def test_google_places_iterative_addresses(setup_accommodation, setup_key, mocke
                 country_code=setup_accommodation.country_code
             ),
             client=setup_key['client'],
-            client_secret=setup_key['client_secret']
+            client_secret=setup_key['client_secret'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             setup_accommodation.name,
@@ -155,7 +163,9 @@ def test_google_places_iterative_addresses(setup_accommodation, setup_key, mocke
                 country_code=setup_accommodation.country_code
             ),
             client=setup_key['client'],
-            client_secret=setup_key['client_secret']
+            client_secret=setup_key['client_secret'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
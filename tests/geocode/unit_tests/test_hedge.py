@@ -0,0 +1,132 @@
+"""
+Tests hedged requests across providers.
+"""
+import threading
+import time
+
+import pytest
+
+from geocode import executor, hedge, helpers
+
+
+CONFIG = {
+    'osm': {'concurrency': 1, 'hedge': {'backup': 'arcgis', 'budget': 0.5}},
+    'arcgis': {}
+}
+
+
+@pytest.fixture
+def hedger():
+    hedger = hedge.Hedger(CONFIG, workers=4)
+
+    for _ in range(hedge.MIN_SAMPLES):
+        hedger.trackers['osm'].observe(0.01)
+
+    return hedger
+
+
+def test_latency_percentile():
+    tracker = hedge.LatencyTracker()
+
+    for i in range(hedge.MIN_SAMPLES - 1):
+        tracker.observe(i)
+    assert tracker.percentile(95) is None
+
+    tracker.observe(hedge.MIN_SAMPLES - 1)
+    assert tracker.percentile(95) == 18
+    assert tracker.percentile(50) == 9
+
+
+def test_hedge_budget():
+    budget = hedge.HedgeBudget(share=0.5, burst=1)
+
+    assert not budget.spend()
+
+    for _ in range(4):
+        budget.earn()
+
+    assert budget.spend()
+    assert not budget.spend()
+
+
+def test_fast_provider_is_not_hedged(hedger):
+    calls = []
+
+    def work(task):
+        calls.append(task['provider'])
+        return {'provider': task['provider']}
+
+    assert hedger.run({'provider': 'osm'}, work) == {'provider': 'osm'}
+    assert hedger.run({'provider': 'arcgis'}, work) == {'provider': 'arcgis'}
+    assert calls == ['osm', 'arcgis']
+
+
+def test_slow_provider_is_hedged(hedger):
+    def work(task):
+        if task['provider'] == 'osm':
+            time.sleep(0.5)
+        return {'provider': task['provider']}
+
+    hedger.budget('osm').earn()
+
+    start = time.monotonic()
+    assert hedger.run({'provider': 'osm'}, work) == {'provider': 'arcgis'}
+    assert time.monotonic() - start < 0.4
+
+    # the budget is spent, the next slow task waits for the primary provider
+    assert hedger.run({'provider': 'osm'}, work) == {'provider': 'osm'}
+
+
+def test_failed_hedge_waits_for_primary(hedger):
+    def work(task):
+        if task['provider'] == 'arcgis':
+            raise helpers.NoResultsFoundError(task['provider'])
+
+        time.sleep(0.1)
+        return {'provider': task['provider']}
+
+    hedger.budget('osm').earn()
+
+    assert hedger.run({'provider': 'osm'}, work) == {'provider': 'osm'}
+
+
+def test_both_failing_raises_primary_error(hedger):
+    def work(task):
+        if task['provider'] == 'osm':
+            time.sleep(0.1)
+            raise helpers.FailedRequestError(task['provider'])
+
+        raise helpers.NoResultsFoundError(task['provider'])
+
+    hedger.budget('osm').earn()
+
+    with pytest.raises(helpers.FailedRequestError):
+        hedger.run({'provider': 'osm'}, work)
+
+
+def test_hedge_keeps_concurrency_limit(hedger):
+    lock = threading.Lock()
+    running = {'osm': 0}
+    peak = []
+
+    def work(task):
+        if task['provider'] == 'osm':
+            with lock:
+                running['osm'] += 1
+                peak.append(running['osm'])
+
+            time.sleep(0.3)
+
+            with lock:
+                running['osm'] -= 1
+
+        return {'provider': task['provider']}
+
+    hedger.budget('osm').earn()
+
+    # the first task is hedged, the next one waits for the slot of the abandoned primary request
+    tasks = executor.TaskExecutor(workers=4, limit=lambda provider: 1)
+    futures = tasks.map(lambda task: hedger.run(task, work), [{'provider': 'osm'}] * 2)
+
+    assert [future.result() for future in futures] == [{'provider': 'arcgis'}, {'provider': 'osm'}]
+    assert max(peak) == 1
@@ -75,9 +75,11 @@ def test_here_call(setup_accommodation, setup_key, setup_response, mocker):
         city=setup_accommodation.city,
         state=setup_accommodation.region,
         country=setup_accommodation.country_code,
-        maxRows=100,
+        maxRows=10,
         app_id=setup_key['app_id'],
-        app_code=setup_key['app_code']
+        app_code=setup_key['app_code'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -102,9 +104,11 @@ def test_here_call_with_guess(setup_accommodation_with_guess, setup_key, setup_r
         state=setup_accommodation_with_guess.region,
         country=setup_accommodation_with_guess.country_code,
         prox='{latitude},{longitude},100000'.format(**setup_accommodation_with_guess.guess),
-        maxRows=100,
+        maxRows=10,
         app_id=setup_key['app_id'],
-        app_code=setup_key['app_code']
+        app_code=setup_key['app_code'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -127,8 +131,10 @@ def test_here_iterative_addresses(setup_accommodation, setup_key, mocker):
             city=setup_accommodation.city,
             state=setup_accommodation.region,
             country=setup_accommodation.country_code,
-            maxRows=100,
-            **setup_key
+            maxRows=10,
+            **setup_key,
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             None,
@@ -137,8 +143,10 @@ def test_here_iterative_addresses(setup_accommodation, setup_key, mocker):
             city=setup_accommodation.city,
             state=setup_accommodation.region,
             country=setup_accommodation.country_code,
-            maxRows=100,
-            **setup_key
+            maxRows=10,
+            **setup_key,
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             None,
@@ -146,16 +154,20 @@ def test_here_iterative_addresses(setup_accommodation, setup_key, mocker):
             city=setup_accommodation.city,
             state=setup_accommodation.region,
             country=setup_accommodation.country_code,
-            maxRows=100,
-            **setup_key
+            maxRows=10,
+            **setup_key,
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             None,
             street=setup_accommodation.street,
             city=setup_accommodation.city,
             country=setup_accommodation.country_code,
-            maxRows=100,
-            **setup_key
+            maxRows=10,
+            **setup_key,
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
@@ -0,0 +1,152 @@
+"""
+Tests the buffered historization sink.
+"""
+import gzip
+import json
+import pathlib
+import threading
+import time
+
+import pytest
+
+from geocode import history
+
+
+def read_batches(directory):
+    return [
+        [json.loads(line) for line in gzip.decompress(path.read_bytes()).splitlines()]
+        for path in sorted(pathlib.Path(directory).rglob('*.jsonl.gz'))
+    ]
+
+
+def records(n):
+    return [{'entity': 'accommodation:{}'.format(i), 'provider': 'osm'} for i in range(n)]
+
+
+def test_buffered_until_flush(tmp_path):
+    sink = history.HistorySink(history.DirectoryBackend(str(tmp_path)), max_records=10)
+
+    sink.add(records(3))
+    sink.batches.join()
+    assert read_batches(tmp_path) == []
+
+    sink.flush()
+    assert read_batches(tmp_path) == [records(3)]
+
+
+def test_record_threshold(tmp_path):
+    sink = history.HistorySink(history.DirectoryBackend(str(tmp_path)), max_records=2)
+
+    sink.add(records(3))
+    sink.batches.join()
+
+    assert read_batches(tmp_path) == [records(3)]
+
+
+def test_age_threshold(tmp_path):
+    sink = history.HistorySink(history.DirectoryBackend(str(tmp_path)), max_age=0.05)
+
+    sink.add(records(1))
+    sink.tick()
+    sink.batches.join()
+    assert read_batches(tmp_path) == []
+
+    time.sleep(0.05)
+    sink.tick()
+    sink.batches.join()
+    assert read_batches(tmp_path) == [records(1)]
+
+
+def test_encode_splits_batches():
+    batches = list(history.encode(records(10), max_bytes=100))
+
+    assert sum(count for _, count in batches) == 10
+    assert all(len(gzip.decompress(data)) <= 100 for data, _ in batches)
+
+
+def test_add_does_not_wait_for_backend(mocker):
+    backend = mocker.Mock()
+    release = threading.Event()
+    backend.put.side_effect = lambda data, count: release.wait()
+    sink = history.HistorySink(backend, max_records=1)
+
+    start = time.monotonic()
+    for _ in range(3):
+        sink.add(records(1))
+    assert time.monotonic() - start < 0.1
+
+    release.set()
+    sink.flush()
+    assert backend.put.call_count == 3
+
+
+def test_failed_batch_is_dropped(mocker):
+    backend = mocker.Mock()
+    backend.put.side_effect = [RuntimeError('unavailable'), None]
+    log_event = mocker.patch.object(history.logger, 'log_event')
+    sink = history.HistorySink(backend)
+
+    sink.add(records(1))
+    sink.flush()
+    sink.add(records(1))
+    sink.flush()
+
+    assert backend.put.call_count == 2
+    assert log_event.call_args[0][1]['state'] == 'dropped history batch'
+
+
+def test_unencodable_batch_is_dropped(mocker):
+    mocker.patch.object(history, 'encode', side_effect=[ValueError('circular reference'), [(b'', 1)]])
+    backend = mocker.Mock()
+    sink = history.HistorySink(backend)
+
+    sink.add(records(1))
+    assert sink.flush()
+
+    # the thread keeps writing later batches
+    sink.add(records(1))
+    assert sink.flush()
+    assert backend.put.call_count == 1
+
+
+def test_flush_timeout(mocker):
+    backend = mocker.Mock()
+    release = threading.Event()
+    backend.put.side_effect = lambda data, count: release.wait()
+    log_event = mocker.patch.object(history.logger, 'log_event')
+    sink = history.HistorySink(backend)
+
+    sink.add(records(3))
+    assert not sink.flush(timeout=0.05)
+
+    # the records at risk are logged
+    assert log_event.call_args[0][1]['state'] == 'history flush timed out'
+    assert log_event.call_args[0][1]['value']['records'] == 3
+
+    release.set()
+    assert sink.flush()
+    assert sink.pending == 0
+
+
+def test_without_backend():
+    sink = history.HistorySink(None)
+
+    sink.add(records(1))
+    sink.flush()
+
+    assert sink.records == []
+
+
+@pytest.mark.parametrize('variable, backend', [
+    ('HISTORY_STREAM', history.FirehoseBackend),
+    ('HISTORY_BUCKET', history.S3Backend),
+    ('HISTORY_DIRECTORY', history.DirectoryBackend)
+])
+def test_load_backend(variable, backend, monkeypatch, mocker):
+    mocker.patch('boto3.client')
+    for name in ('HISTORY_STREAM', 'HISTORY_BUCKET', 'HISTORY_DIRECTORY'):
+        monkeypatch.delenv(name, raising=False)
+
+    monkeypatch.setenv(variable, 'history')
+
+    assert isinstance(history.load_backend(), backend)
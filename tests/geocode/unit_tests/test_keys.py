@@ -2,9 +2,11 @@
 Tests setup and cycling through API keys to simulate switching keys in a cyclical manner when one
 key for a provider reaches its quota.
 """
+import time
+
 import pytest
 
-from geocode import credentials
+from geocode import credentials, helpers
 
 
 @pytest.fixture
@@ -63,3 +65,68 @@ def test_keys_cycle(mocked_key_handler):
         key_handler.cycle_key('here')
     with pytest.raises(KeyError):
         key_handler.get_key('here')
+
+
+def test_scheduler_round_robin():
+    scheduler = credentials.KeyScheduler(['a', 'b', 'c'])
+
+    assert [scheduler.acquire() for _ in range(6)] == ['a', 'b', 'c', 'a', 'b', 'c']
+    assert scheduler.usage == [2, 2, 2]
+    assert scheduler.in_flight == [2, 2, 2]
+
+    scheduler.release('a')
+    assert scheduler.in_flight == [1, 2, 2]
+
+
+def test_scheduler_weighted():
+    scheduler = credentials.KeyScheduler(['a', 'b'], weights=[3, 1])
+
+    # smooth: the heavy key is not used in one burst
+    assert [scheduler.acquire() for _ in range(4)] == ['a', 'a', 'b', 'a']
+
+
+def test_scheduler_skips_unavailable_and_quarantined(mocker):
+    scheduler = credentials.KeyScheduler(['a', 'b', 'c'])
+
+    assert {scheduler.acquire(available=lambda key: key != 'b') for _ in range(4)} == {'a', 'c'}
+
+    quarantined = [
+        scheduler.release('c', helpers.FailedRequestError('google'))
+        for _ in range(credentials.QUARANTINE_ERRORS)
+    ]
+
+    assert quarantined == [False] * (credentials.QUARANTINE_ERRORS - 1) + [True]
+
+    assert scheduler.healthy() == [0, 1]
+
+    # quarantine ends
+    mocker.patch('time.monotonic', return_value=time.monotonic() + credentials.QUARANTINE_TIME)
+    assert scheduler.healthy() == [0, 1, 2]
+
+    # without healthy keys, all keys are used
+    assert scheduler.acquire(available=lambda key: False) in ('a', 'b', 'c')
+
+
+def test_requests_spread_over_keys(mocked_key_handler, mocker):
+    key_handler = credentials.KeyHandler("/mysterious/key", "/some/id")
+
+    keys = [key_handler.acquire_key('google') for _ in range(4)]
+    for key in keys:
+        key_handler.release_key('google', key)
+
+    assert [key['client'] for key in keys] == ['google1', 'google2', 'google1', 'google2']
+    assert sorted(value['requests'] for value in key_handler.usage('google').values()) == [2, 2]
+
+
+def test_request_uses_scheduled_key(mocker):
+    from geocode import providers
+    from geocode.providers import base
+
+    service = providers.Google()
+    mocker.patch.object(base.KEY_HANDLER, 'acquire_key', side_effect=[{'client': 'a'}, {'client': 'b'}])
+    release_key = mocker.patch.object(base.KEY_HANDLER, 'release_key')
+    mocker.patch.object(service, '_geocode', side_effect=lambda address: service._request_key())
+
+    assert service._request({}) == {'client': 'a'}
+    assert service._request({}) == {'client': 'b'}
+    assert release_key.call_count == 2
@@ -0,0 +1,90 @@
+"""
+Tests the local city-level geocoder.
+"""
+import json
+import time
+
+import pytest
+
+from geocode import entity, helpers, providers
+from geocode.providers import local
+
+
+@pytest.fixture
+def setup_index(mocker):
+    index = local.CityIndex([
+        {'city_id': 1, 'name': 'London', 'country_code': 'GB', 'longitude': -0.1278, 'latitude': 51.5074},
+        {'city_id': 2, 'name': 'London', 'country_code': 'CA', 'longitude': -81.2453, 'latitude': 42.9849},
+        {'city_id': 3, 'name': 'Köln', 'country_code': 'DE', 'longitude': 6.9603, 'latitude': 50.9375},
+        {'city_id': 4, 'name': 'Springfield', 'country_code': 'US', 'longitude': -89.6501, 'latitude': 39.7817},
+        {'city_id': 5, 'name': 'Springfield', 'country_code': 'US', 'longitude': -72.5898, 'latitude': 42.1015}
+    ])
+    mocker.patch.object(local, 'load_index', return_value=index)
+
+    return index
+
+
+def test_local_service():
+    providers.Local()
+
+
+def test_lookup(setup_index):
+    assert [x['city_id'] for x in setup_index.lookup('London', 'GB')] == [1]
+    assert [x['city_id'] for x in setup_index.lookup('london', 'UK')] == [1]
+    assert [x['city_id'] for x in setup_index.lookup('KOLN', 'DE')] == [3]
+
+    # trigram search, scoped per country
+    assert [x['city_id'] for x in setup_index.lookup('Londn', 'CA')] == [2]
+    assert setup_index.lookup('Köln', 'GB') == []
+    assert setup_index.lookup('Paris', 'XX') == []
+
+
+def test_local_call(setup_index, setup_destination):
+    result = providers.Local().geocode(setup_destination)
+
+    assert (result['longitude'], result['latitude']) == (-0.1278, 51.5074)
+    assert result['provider'] == 'local'
+    assert result['meta']['address_out'] == {'city': 'London', 'country_code': 'GB'}
+
+
+def test_local_call_picks_closest_namesake(setup_index):
+    destination = entity.Destination(1, city='Springfield', country_code='US', guess={
+        'longitude': -72.5, 'latitude': 42.1
+    })
+
+    result = providers.Local().geocode(destination)
+
+    assert result['city_id'] == 5
+
+
+def test_local_call_no_results(setup_index):
+    destination = entity.Destination(1, city='Atlantis', country_code='GB')
+
+    with pytest.raises(helpers.NoResultsFoundError):
+        providers.Local().geocode(destination)
+
+
+def test_load_index(tmpdir):
+    path = tmpdir.join('destinations.json')
+    path.write(json.dumps([
+        {'city_id': 1, 'name': 'London', 'country_code': 'GB', 'longitude': -0.1278, 'latitude': 51.5074}
+    ]))
+
+    assert local.CityIndex.load(str(path)).lookup('London', 'GB')[0]['city_id'] == 1
+
+    # without destinations every lookup would miss
+    with pytest.raises(ValueError):
+        local.CityIndex.load(str(tmpdir.join('missing.json')))
+
+    path.write('[]')
+    with pytest.raises(ValueError):
+        local.CityIndex.load(str(path))
+
+
+@pytest.mark.benchmark
+def test_benchmark_exact_lookup(setup_index):
+    start = time.perf_counter()
+    for _ in range(10000):
+        setup_index.lookup('London', 'GB')
+
+    print('exact lookup: {:.1f} us'.format((time.perf_counter() - start) / 10000 * 1e6))
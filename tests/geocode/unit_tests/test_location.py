@@ -0,0 +1,117 @@
+"""
+Tests the NumPy geodesic computations against geopy.
+"""
+import random
+import timeit
+import warnings
+
+import geopy
+import geopy.distance
+import numpy as np
+import pytest
+
+from geocode import location
+
+
+@pytest.fixture
+def setup_points():
+    generator = random.Random(0)
+    return [
+        {'latitude': generator.uniform(-80, 80), 'longitude': generator.uniform(-180, 180)}
+        for _ in range(200)
+    ]
+
+
+@pytest.fixture
+def setup_origin():
+    return {'latitude': 51.5320, 'longitude': -0.1779}
+
+
+def geopy_distance(p1, p2):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return geopy.distance.vincenty(geopy.Point(**p1), geopy.Point(**p2)).meters
+
+
+def geopy_bounding_box(point, buffer_size):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        start = geopy.Point(**point)
+        translate = geopy.distance.VincentyDistance(meters=buffer_size)
+
+        return {
+            'north': translate.destination(point=start, bearing=0).latitude,
+            'south': translate.destination(point=start, bearing=180).latitude,
+            'east': translate.destination(point=start, bearing=90).longitude,
+            'west': translate.destination(point=start, bearing=270).longitude
+        }
+
+
+def test_ellipsoidal_distances(setup_origin, setup_points):
+    expected = [geopy_distance(setup_origin, point) for point in setup_points]
+
+    np.testing.assert_allclose(
+        location.distances_geocodes(setup_origin, setup_points), expected, rtol=0, atol=1e-3
+    )
+    assert location.distance_geocodes(setup_origin, setup_origin) == 0.0
+
+
+def test_spherical_error_bound(setup_origin, setup_points):
+    expected = np.array([geopy_distance(setup_origin, point) for point in setup_points])
+    distances = location.distances_geocodes(setup_origin, setup_points, mode='spherical')
+
+    assert np.max(np.abs(distances - expected) / expected) < 0.0056
+
+
+def test_pairwise_distances(setup_points):
+    matrix = location.pairwise_distances(setup_points[:5], setup_points[5:8])
+
+    assert matrix.shape == (5, 3)
+    assert matrix[3, 1] == pytest.approx(geopy_distance(setup_points[3], setup_points[6]), abs=1e-3)
+
+
+def test_antipodal_points():
+    with pytest.raises(ValueError):
+        location.distance_geocodes({'latitude': 0.0, 'longitude': 0.0}, {'latitude': 0.5, 'longitude': 179.7})
+
+
+@pytest.mark.parametrize('buffer_size', [1000, 100000])
+def test_bounding_box(setup_origin, buffer_size):
+    expected = geopy_bounding_box(setup_origin, buffer_size)
+
+    for mode, tolerance in (('ellipsoidal', 1e-9), ('spherical', 1e-2)):
+        bbox = location.bounding_box(setup_origin, buffer_size, mode=mode)
+
+        for side in ('north', 'south', 'east', 'west'):
+            assert bbox[side] == pytest.approx(expected[side], abs=tolerance)
+
+
+def test_bounding_boxes(setup_points):
+    bboxes = location.bounding_boxes(setup_points[:3], [1000, 2000, 3000])
+
+    assert bboxes['north'].shape == (3,)
+    assert bboxes['north'][1] == pytest.approx(geopy_bounding_box(setup_points[1], 2000)['north'], abs=1e-9)
+
+
+@pytest.mark.benchmark
+def test_benchmark_geopy(setup_origin, setup_points):
+    timings = {
+        'geopy': min(timeit.repeat(
+            lambda: [geopy_distance(setup_origin, point) for point in setup_points],
+            number=3, repeat=3
+        )),
+        'ellipsoidal': min(timeit.repeat(
+            lambda: location.distances_geocodes(setup_origin, setup_points),
+            number=3, repeat=3
+        )),
+        'spherical': min(timeit.repeat(
+            lambda: location.distances_geocodes(setup_origin, setup_points, mode='spherical'),
+            number=3, repeat=3
+        ))
+    }
+
+    print(', '.join(
+        '{}: {:.2f} ms'.format(name, timing / 3 * 1000) for name, timing in timings.items()
+    ))
+
+    assert timings['spherical'] < timings['ellipsoidal'] < timings['geopy']
@@ -75,7 +75,9 @@ def test_mapbox_call(setup_accommodation, setup_key, setup_response, mocker):
             setup_accommodation.region
         ]),
         country=setup_accommodation.country_code,
-        key=setup_key['key']
+        key=setup_key['key'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -113,7 +115,9 @@ def test_mapbox_call_with_guess(setup_accommodation_with_guess, setup_key, setup
         ]),
         country=setup_accommodation_with_guess.country_code,
         bbox=bbox,
-        key=setup_key['key']
+        key=setup_key['key'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -137,7 +141,9 @@ def test_mapbox_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.region
             ]),
             country=setup_accommodation.country_code,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -147,7 +153,9 @@ def test_mapbox_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.region
             ]),
             country=setup_accommodation.country_code,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -156,7 +164,9 @@ def test_mapbox_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.region
             ]),
             country=setup_accommodation.country_code,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -164,7 +174,9 @@ def test_mapbox_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.city,
             ]),
             country=setup_accommodation.country_code,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
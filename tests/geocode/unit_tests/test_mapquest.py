@@ -76,7 +76,9 @@ def test_mapquest_call(setup_accommodation, setup_key, setup_response, mocker):
             setup_accommodation.country_code
         ]),
         maxRows=100,
-        key=setup_key['key']
+        key=setup_key['key'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -115,7 +117,9 @@ def test_mapbox_call_with_guess(setup_accommodation_with_guess, setup_key, setup
         ]),
         bbox=bbox,
         maxRows=100,
-        key=setup_key['key']
+        key=setup_key['key'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -140,7 +144,9 @@ def test_mapquest_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.country_code
             ]),
             maxRows=100,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -151,7 +157,9 @@ def test_mapquest_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.country_code
             ]),
             maxRows=100,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -161,7 +169,9 @@ def test_mapquest_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.country_code
             ]),
             maxRows=100,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -170,7 +180,9 @@ def test_mapquest_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.country_code
             ]),
             maxRows=100,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
@@ -82,7 +82,9 @@ def test_osm_call(setup_accommodation, setup_url, setup_response, mocker):
         country=setup_accommodation.country,
         countrycodes=setup_accommodation.country_code,
         method='details',
-        url=setup_url['url']
+        url=setup_url['url'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -116,7 +118,9 @@ def test_osm_call_with_guess(setup_accommodation_with_guess, setup_url, setup_re
         method='details',
         viewbox=bbox,
         bounded='1',
-        url=setup_url['url']
+        url=setup_url['url'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -140,7 +144,9 @@ def test_osm_iterative_addresses(setup_accommodation, setup_url, mocker):
             country=setup_accommodation.country,
             countrycodes=setup_accommodation.country_code,
             method='details',
-            url=setup_url['url']
+            url=setup_url['url'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             None,
@@ -150,7 +156,9 @@ def test_osm_iterative_addresses(setup_accommodation, setup_url, mocker):
             state=setup_accommodation.region,
             countrycodes=setup_accommodation.country_code,
             method='details',
-            url=setup_url['url']
+            url=setup_url['url'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             None,
@@ -159,7 +167,9 @@ def test_osm_iterative_addresses(setup_accommodation, setup_url, mocker):
             state=setup_accommodation.region,
             countrycodes=setup_accommodation.country_code,
             method='details',
-            url=setup_url['url']
+            url=setup_url['url'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             None,
@@ -167,7 +177,9 @@ def test_osm_iterative_addresses(setup_accommodation, setup_url, mocker):
             city=setup_accommodation.city,
             countrycodes=setup_accommodation.country_code,
             method='details',
-            url=setup_url['url']
+            url=setup_url['url'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
@@ -0,0 +1,117 @@
+"""
+Tests adaptive result paging.
+"""
+import geocoder
+import pytest
+
+from geocode import helpers, paging, providers, ratelimit
+from geocode.providers import base
+
+
+def test_page_size_tuning():
+    sizer = paging.PageSizer(initial=10, minimum=2, maximum=100)
+
+    for _ in range(paging.MIN_OBSERVATIONS - 1):
+        sizer.observe(0)
+    assert sizer.size() == 10
+
+    sizer.observe(0)
+    assert sizer.size() == 2
+
+    # the page covers the 95th percentile of winner positions
+    for position in range(paging.OBSERVATIONS):
+        sizer.observe(position % 20)
+    assert sizer.size() == 19
+
+
+def test_widen():
+    sizer = paging.PageSizer(initial=10, maximum=100)
+
+    assert sizer.widen(10) == 40
+    assert sizer.widen(40) == 100
+    assert sizer.widen(100) is None
+
+    # tuned pages never ask for more rows than the initial page by default
+    assert sizer.minimum == 10
+
+    # otherwise they widen at most once
+    assert paging.PageSizer(initial=50, maximum=100).minimum == 25
+
+
+def test_arcgis_page_size():
+    sizer = paging.Pager(base.CONFIG).sizer('arcgis')
+
+    for _ in range(paging.MIN_OBSERVATIONS):
+        sizer.observe(0)
+
+    # tuning keeps the initial page of 10 rows, scores are not compared so it is never widened
+    assert sizer.size() == 10
+    assert sizer.confident(0, 1)
+
+
+def test_pager():
+    pager = paging.Pager({'here': {'paging': {'initial': 5}}, 'osm': {}})
+
+    assert pager.sizer('here').size() == 5
+    assert pager.sizer('here') is pager.sizer('here')
+    assert pager.sizer('osm') is None
+
+
+def setup_page(mocker, size, city):
+    # only the last result can match the accommodation, and only in London
+    matching = {'City': city}
+    if city == 'London':
+        matching.update({'District': 'Camden', 'State': 'Greater London', 'Street': 'Abbey Road'})
+
+    m = mocker.MagicMock()
+    m.ok = True
+    m.__iter__.return_value = [
+        mocker.Mock(json={
+            'lng': 0.0,
+            'lat': 0.0,
+            'raw': {'Address': matching if i == size - 1 else {'City': 'Paris'}}
+        }) for i in range(size)
+    ]
+
+    return m
+
+
+@pytest.mark.parametrize('city, calls', [('London', 2), ('Lyon', 3)])
+def test_here_widens_page(setup_accommodation, mocker, city, calls):
+    mocker.patch.object(base, 'RATE_LIMITER', ratelimit.RateLimiter({}))
+    mocker.patch.object(base, 'PAGER', paging.Pager({'here': {'paging': {'initial': 10}}}))
+
+    service = providers.Here()
+    mocker.patch.object(service, '_request_key', return_value={'app_id': 'id', 'app_code': 'code'})
+    mocker.patch('geocoder.here', side_effect=[
+        setup_page(mocker, 10, 'Lyon'),
+        setup_page(mocker, 40, city),
+        setup_page(mocker, 100, 'Lyon')
+    ])
+
+    result = service.geocode(setup_accommodation)
+
+    assert [call[1]['maxRows'] for call in geocoder.here.call_args_list] == [10, 40, 100][:calls]
+    if city == 'London':
+        assert result['raw']['Address']['City'] == 'London'
+        assert base.PAGER.sizer('here').positions[-1] == 39
+
+
+def test_widened_page_is_a_request(setup_accommodation, mocker):
+    mocker.patch.object(base, 'RATE_LIMITER', ratelimit.RateLimiter({}))
+    mocker.patch.object(base, 'PAGER', paging.Pager({'here': {'paging': {'initial': 10}}}))
+    spend = mocker.patch.object(base.BUDGET, 'spend')
+
+    service = providers.Here()
+    mocker.patch.object(service, '_request_key', return_value={'app_id': 'id', 'app_code': 'code'})
+    mocker.patch('geocoder.here', side_effect=[setup_page(mocker, 10, 'Lyon')])
+
+    # the budget runs out after the first page
+    mocker.patch.object(base.BUDGET, 'available', side_effect=lambda *args: not geocoder.here.called)
+
+    # the budget is checked before the wider page is sent
+    with pytest.raises(helpers.QuotaExhaustedError):
+        service.geocode(setup_accommodation)
+
+    assert geocoder.here.call_count == 1
+    assert spend.call_count == 1
@@ -0,0 +1,102 @@
+"""
+Tests the compact stored representation of geocoder results.
+"""
+import os
+
+import pytest
+
+from geocode import helpers, projection
+
+
+@pytest.fixture
+def setup_result():
+    component = {'long_name': 'Abbey Road', 'short_name': 'Abbey Rd', 'types': ['route']}
+
+    return {
+        'entity': 'accommodation:1',
+        'provider': 'google',
+        'entity_id': 1,
+        'entity_type': 'accommodation',
+        'batch_id': None,
+        'timestamp': 1899600000,
+        'longitude': -0.1779,
+        'latitude': 51.5321,
+        'accuracy': 'ROOFTOP',
+        'quality': 'street_address',
+        'address': '3 Abbey Rd, London NW8 9AY, UK',
+        'place': 'ChIJs8Xq7yUFdkgR3L5NPQ3nH0A',
+        'bbox': {'northeast': [51.5334, -0.1765], 'southwest': [51.5307, -0.1792]},
+        'status': 'OK',
+        'raw': {
+            'address_components': [dict(component, long_name=str(i)) for i in range(8)],
+            'formatted_address': '3 Abbey Rd, London NW8 9AY, UK',
+            'geometry': {
+                'location': {'lat': 51.5321, 'lng': -0.1779},
+                'location_type': 'ROOFTOP',
+                'viewport': {
+                    'northeast': {'lat': 51.5334, 'lng': -0.1765},
+                    'southwest': {'lat': 51.5307, 'lng': -0.1792}
+                }
+            },
+            'place_id': 'ChIJs8Xq7yUFdkgR3L5NPQ3nH0A',
+            'types': ['street_address']
+        },
+        'meta': {
+            'rejected': [],
+            'supplied': ['street', 'city', 'postal_code', 'country_code'],
+            'address': {'street': 'Abbey Road', 'house_number': '3', 'city': 'London', 'country_code': 'GB'},
+            'address_out': {'city': 'London', 'country_code': 'GB'}
+        }
+    }
+
+
+def test_project_keeps_consolidator_fields(setup_result):
+    item = projection.project(setup_result, store_payload=False)
+
+    assert set(item) == {
+        'entity', 'provider', 'entity_id', 'entity_type', 'timestamp',
+        'longitude', 'latitude', 'accuracy', 'quality', 'meta'
+    }
+    assert item['meta'] == {
+        'address_out': {'city': 'London', 'country_code': 'GB'},
+        'address': setup_result['meta']['address']
+    }
+
+    # the item can still be written
+    helpers.serialize_item(item)
+
+
+def test_payload_round_trip(setup_result):
+    item = projection.project(setup_result, store_payload=True)
+
+    assert isinstance(item[projection.PAYLOAD], bytes)
+    assert projection.expand(item) == setup_result
+
+
+def test_large_payload_is_dropped(setup_result):
+    setup_result['raw']['noise'] = os.urandom(projection.PAYLOAD_LIMIT).hex()
+
+    assert projection.PAYLOAD not in projection.project(setup_result, store_payload=True)
+
+
+def test_item_size():
+    assert projection.item_size({'name': 'abc'}) == 7
+    assert projection.item_size({'n': 123.45}) == 1 + 4
+    assert projection.item_size({'m': {'a': None}}) == 1 + 3 + 1 + 1 + 1
+    assert projection.write_units(1025) == 2
+    assert projection.read_units(1025) == 1
+
+
+def test_projection_saves_write_units(setup_result):
+    full = projection.item_size(setup_result)
+    compact = projection.item_size(projection.project(setup_result, store_payload=False))
+    compressed = projection.item_size(projection.project(setup_result, store_payload=True))
+
+    assert projection.write_units(full) == 2
+    assert projection.write_units(compact) == projection.write_units(compressed) == 1
+    assert compact < compressed < full
+
+    statistics = projection.Statistics()
+    statistics.observe(setup_result, projection.project(setup_result, store_payload=False))
+    assert statistics.counts['google']['full_write_units'] == 2
+    assert statistics.counts['google']['stored_write_units'] == 1
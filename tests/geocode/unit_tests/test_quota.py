@@ -0,0 +1,107 @@
+"""
+Tests the shared quota exhaustion state.
+"""
+import time
+
+import decimal
+
+import pytest
+
+from geocode import credentials, quota
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmpdir):
+    if request.param == 'memory':
+        return quota.MemoryQuotaStore()
+    else:
+        return quota.SQLiteQuotaStore(str(tmpdir.join('quota.db')))
+
+
+def test_store_disable_enable(store):
+    until = time.time() + 3600
+
+    store.disable('google', until)
+    store.disable('google', until - 60)     # never shortened
+
+    assert store.is_disabled('google')
+    assert not store.is_disabled('here')
+    assert store.disabled()['google'] == pytest.approx(until, abs=1)
+
+    store.enable('google')
+    assert store.disabled() == {}
+
+
+def test_store_expired(store):
+    store.disable('google', time.time() - 1)
+
+    assert not store.is_disabled('google')
+
+
+def test_dynamo_store(mocker):
+    table = mocker.Mock()
+    table.scan.side_effect = [
+        {'Items': [{'name': 'google', 'disabled_until': decimal.Decimal(2000000000)}], 'LastEvaluatedKey': 'x'},
+        {'Items': [{'name': 'google#abc', 'disabled_until': decimal.Decimal(2000000001)}]}
+    ]
+    mocker.patch('boto3.resource').return_value.Table.return_value = table
+
+    store = quota.DynamoQuotaStore('quota')
+
+    assert store.disabled() == {'google': 2000000000.0, 'google#abc': 2000000001.0}
+    table.scan.assert_called_with(ExclusiveStartKey='x')
+
+    store.disable('here', 1999999999.5)
+    assert table.update_item.call_args[1]['ExpressionAttributeValues'] == {
+        ':until': decimal.Decimal(2000000000)
+    }
+
+
+def test_cached_store(mocker):
+    shared = quota.MemoryQuotaStore()
+    worker_a = quota.CachedQuotaStore(shared, ttl=30)
+    worker_b = quota.CachedQuotaStore(shared, ttl=30)
+
+    assert not worker_b.is_disabled('google')
+
+    worker_a.disable('google', time.time() + 3600)
+    assert worker_a.is_disabled('google')
+
+    # worker b only sees the change once its local copy expires
+    mocker.patch.object(shared, 'disabled', wraps=shared.disabled)
+    assert not worker_b.is_disabled('google')
+    assert shared.disabled.call_count == 0
+
+    worker_b.invalidate()
+    assert worker_b.is_disabled('google')
+
+
+def test_cached_store_error(mocker):
+    shared = quota.MemoryQuotaStore()
+    worker = quota.CachedQuotaStore(shared, ttl=30)
+
+    worker.disable('google', time.time() + 3600)
+    worker.invalidate()
+
+    # a failing store keeps the last known state until the next refresh
+    error = quota.ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException'}}, 'Scan')
+    mocker.patch.object(shared, 'disabled', side_effect=error)
+
+    assert worker.is_disabled('google')
+    assert worker.is_disabled('google')
+    assert shared.disabled.call_count == 1
+
+
+def test_key_handler_skips_unavailable_keys(ssm_parameter, mocker):
+    mocker.patch.object(credentials.KeyHandler, '_retrieve_parameter', return_value=ssm_parameter)
+    key_handler = credentials.KeyHandler('/mysterious/key', '/some/id')
+
+    exhausted = credentials.KeyHandler.key_name('google', ssm_parameter['google'][0])
+
+    key = key_handler.get_key(
+        'google',
+        available=lambda key: credentials.KeyHandler.key_name('google', key) != exhausted
+    )
+
+    assert key == ssm_parameter['google'][1]
+    assert 'client_secret' not in exhausted
@@ -0,0 +1,75 @@
+"""
+Tests the shared token bucket rate limiter.
+"""
+import geocoder
+import pytest
+
+from geocode import helpers, providers, ratelimit
+from geocode.providers import base
+
+
+@pytest.fixture
+def clock(mocker):
+    now = [1000.0]
+    mocker.patch('time.monotonic', side_effect=lambda: now[0])
+    return now
+
+
+def test_bucket_schedules_slots(clock):
+    bucket = ratelimit.TokenBucket(qps=2, burst=2)
+
+    # burst is available immediately, later requests get consecutive slots
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+
+    clock[0] += 1.0
+    assert bucket.reserve() == 0.5
+
+
+def test_bucket_unlimited_defer(clock):
+    bucket = ratelimit.TokenBucket()
+
+    assert bucket.reserve() == 0.0
+
+    bucket.defer(3.0)
+    assert bucket.reserve() == 3.0
+
+    clock[0] += 3.0
+    assert bucket.reserve() == 0.0
+
+
+def test_bucket_adapts_rate():
+    bucket = ratelimit.TokenBucket(qps=10)
+
+    assert bucket.penalize() == 5.0
+    assert bucket.penalize() == 2.5
+    assert bucket.reward() == 3.0
+
+    for _ in range(100):
+        bucket.reward()
+
+    # never above the configured rate
+    assert bucket.rate == 10
+
+
+def test_buckets_per_provider_and_key():
+    limiter = ratelimit.RateLimiter({'google': {'rate_limit': {'qps': 50, 'burst': 10}}})
+
+    bucket = limiter.bucket('google', {'key': 'a'})
+
+    assert bucket is limiter.bucket('google', {'key': 'a'})
+    assert bucket is not limiter.bucket('google', {'key': 'b'})
+    assert bucket.max_rate == 50 and bucket.burst == 10
+    assert limiter.bucket('here').rate is None
+
+
+def test_throttling_lowers_rate(setup_accommodation, mocker):
+    mocker.patch.object(base, 'RATE_LIMITER', ratelimit.RateLimiter(base.CONFIG))
+    mocker.patch('geocoder.osm', return_value=mocker.Mock(ok=False, status_code=429))
+
+    service = providers.Osm()
+    service.nr_of_retries = 0
+
+    with pytest.raises(helpers.RateLimitExceededError):
+        service.geocode(setup_accommodation)
+
+    assert base.RATE_LIMITER.bucket('osm', service._active_key()).rate == 0.5
@@ -0,0 +1,162 @@
+"""
+Tests rescheduling of quota-exhausted and failed tasks.
+"""
+import pathlib
+import time
+
+import pytest
+import yaml
+from botocore.exceptions import ClientError
+
+from geocode import reschedule
+
+
+@pytest.fixture
+def setup_tasks():
+    return [
+        {'provider': provider, 'entity_id': i, 'entity_type': 'hotel', 'address': {}}
+        for i, provider in enumerate(['google', 'google', 'osm', 'here'])
+    ]
+
+
+def test_batch():
+    batches = [list(chunk) for chunk in reschedule.batch(range(25), batch_size=10)]
+
+    assert [len(chunk) for chunk in batches] == [10, 10, 5]
+    assert list(reschedule.batch([], batch_size=10)) == []
+
+
+def test_send_to_buffer_queue(mocker):
+    queue = mocker.Mock()
+    resource = mocker.patch('boto3.resource')
+    resource.return_value.get_queue_by_name.return_value = queue
+
+    tasks = [{'entity_id': i} for i in range(12)]
+    reschedule.send_to_buffer_queue(tasks, [0, 2000] + [5] * 10, queue_name='queue')
+
+    assert queue.send_messages.call_count == 2
+
+    entries = queue.send_messages.call_args_list[0][1]['Entries']
+    assert [entry['DelaySeconds'] for entry in entries[:3]] == [0, reschedule.MAX_DELAY, 5]
+
+
+def test_reschedule_delays_and_parks(setup_tasks):
+    sent = []
+    backlog = reschedule.MemoryBacklog()
+    rescheduler = reschedule.Rescheduler(backlog, send=lambda tasks, delays: sent.append((tasks, delays)))
+
+    now = time.time()
+    rescheduler.reschedule([
+        (setup_tasks[0], now + 3600),
+        (setup_tasks[1], now + 3600),
+        (setup_tasks[2], now + 120),
+        (setup_tasks[3], None)
+    ], now=now)
+
+    # only tasks due within the maximum SQS delay are sent
+    (tasks, delays), = sent
+    assert [task['provider'] for task in tasks] == ['osm', 'here']
+    assert 120 <= delays[0] <= 180
+    assert reschedule.RETRY_DELAY <= delays[1] <= reschedule.RETRY_DELAY + 60
+
+    assert backlog.take('google', 10, now=now) == []
+    assert backlog.take('google', 10, now=now + 3600) == setup_tasks[:2]
+
+
+def test_failed_tasks_are_dead_lettered(setup_tasks):
+    sent, dead = [], []
+    rescheduler = reschedule.Rescheduler(
+        reschedule.MemoryBacklog(),
+        send=lambda tasks, delays: sent.extend(tasks),
+        dead_letter=dead.extend,
+        max_attempts=3
+    )
+
+    task = setup_tasks[0]
+    for _ in range(3):
+        rescheduler.reschedule([(task, None)])
+        task = sent[-1] if sent else task
+
+    # the attempts are counted on the task itself
+    assert [task['attempts'] for task in sent] == [1, 2]
+    assert [task['attempts'] for task in dead] == [3]
+    assert 'attempts' not in setup_tasks[0]
+
+    # tasks waiting for their provider are not failed attempts
+    rescheduler.reschedule([(dict(task, attempts=2), time.time() + 60)])
+    assert sent[-1]['attempts'] == 2
+
+
+def test_dynamo_backlog_take_is_conditional(mocker):
+    table = mocker.patch('boto3.resource').return_value.Table.return_value
+    table.query.return_value = {'Items': [
+        {'provider': 'google', 'task_id': str(i), 'task': '{{"entity_id": {}}}'.format(i)} for i in range(3)
+    ]}
+
+    # the second task was taken by a concurrent drain
+    conflict = ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'DeleteItem')
+    table.delete_item.side_effect = [None, conflict, None]
+
+    tasks = reschedule.DynamoBacklog('backlog').take('google', 10)
+
+    assert tasks == [{'entity_id': 0}, {'entity_id': 2}]
+    assert table.delete_item.call_args[1]['ConditionExpression'] == 'attribute_exists(task_id)'
+
+
+def test_drain_is_rate_aware(setup_tasks):
+    sent = []
+    backlog = reschedule.MemoryBacklog()
+    backlog.park('google', [setup_tasks[0]] * 100, time.time() - 1)
+    rescheduler = reschedule.Rescheduler(backlog, send=lambda tasks, delays: sent.append((tasks, delays)))
+
+    tasks = rescheduler.drain('google', qps=1)
+
+    assert len(tasks) == reschedule.DRAIN_INTERVAL
+    assert sent[0][1] == list(range(reschedule.DRAIN_INTERVAL))
+
+    # drained at most once per interval
+    assert rescheduler.drain('google', qps=1) == []
+
+
+def template_actions(resource):
+    """
+    Return the IAM actions the geocoder role of the CloudFormation template allows on a resource.
+    """
+    class Loader(yaml.SafeLoader):
+        pass
+
+    def intrinsic(loader, suffix, node):
+        if isinstance(node, yaml.ScalarNode):
+            return loader.construct_scalar(node)
+        if isinstance(node, yaml.SequenceNode):
+            return loader.construct_sequence(node)
+        return loader.construct_mapping(node)
+
+    Loader.add_multi_constructor('!', intrinsic)
+
+    path = pathlib.Path(__file__).resolve().parents[3] / 'cloudformation' / 'geocode.yaml'
+    template = yaml.load(path.read_text(), Loader=Loader)
+
+    actions = set()
+    for role in template['Resources'].values():
+        for policy in (role.get('Properties') or {}).get('Policies', []):
+            for statement in policy['PolicyDocument']['Statement']:
+                if resource in statement['Resource']:
+                    actions.update(statement['Action'])
+
+    return actions
+
+
+def test_backlog_calls_are_allowed(mocker):
+    table = mocker.patch('boto3.resource').return_value.Table.return_value
+    table.query.return_value = {'Items': [{'provider': 'google', 'task_id': '1', 'task': '{}'}]}
+
+    backlog = reschedule.DynamoBacklog('backlog')
+    backlog.park('google', [{'entity_id': 1}], time.time())
+    backlog.take('google', 10)
+
+    operations = dict(batch_writer='BatchWriteItem', query='Query', delete_item='DeleteItem')
+    called = set(call[0].split('(')[0].split('.')[0] for call in table.method_calls)
+
+    assert set(operations) >= called
+    assert template_actions('BacklogTable.Arn') >= set('dynamodb:' + operations[name] for name in called)
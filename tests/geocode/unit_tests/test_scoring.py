@@ -0,0 +1,115 @@
+"""
+Tests batch scoring of geocoder results against rate_result.
+"""
+import copy
+import random
+import timeit
+
+import numpy as np
+import pytest
+
+from geocode import location, scoring
+from geocode.providers import base
+
+
+STREETS = ['Abbey Road', 'Abbey Rd', 'Abbey Gardens', 'Grove End Road', 'Baker Street', None]
+CITIES = ['London', 'Londres', 'Camden Town', 'Westminster']
+REGIONS = ['Greater London', 'England']
+
+
+@pytest.fixture
+def setup_address():
+    return {
+        'street': '30 Abbey Road',
+        'district': 'Camden',
+        'city': 'London',
+        'region': 'Greater London',
+        'postal_code': 'NW8 9AY',
+        'guess': {'longitude': -0.1779, 'latitude': 51.5320}
+    }
+
+
+def random_response(size, seed):
+    generator = random.Random(seed)
+    results, returned_addresses = [], []
+
+    for _ in range(size):
+        returned_address = {
+            'city': generator.choice(CITIES),
+            'region': generator.choice(REGIONS),
+            'postal_code': 'NW8 {}'.format(generator.choice(['9AY', '0DU', '7BS']))
+        }
+
+        street = generator.choice(STREETS)
+        if street:
+            returned_address['street'] = street
+            if generator.random() < 0.5:
+                returned_address['house_number'] = str(generator.randint(1, 40))
+
+        returned_addresses.append(returned_address)
+        results.append({
+            'longitude': -0.1779 + generator.gauss(0, 0.001),
+            'latitude': 51.5320 + generator.gauss(0, 0.001)
+        })
+
+    return results, returned_addresses
+
+
+def reference_best_candidate(results, returned_addresses, address):
+    scores = [
+        base.rate_result(copy.deepcopy(returned_address), result, address)
+        for result, returned_address in zip(results, returned_addresses)
+    ]
+
+    return results[scores.index(max(scores))], scores
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_identical_winners(setup_address, seed):
+    results, returned_addresses = random_response(100, seed)
+
+    expected, expected_scores = reference_best_candidate(results, returned_addresses, setup_address)
+    scores = scoring.score_results(copy.deepcopy(returned_addresses), results, setup_address)
+
+    np.testing.assert_allclose(scores, expected_scores, rtol=0, atol=1e-9)
+    assert scoring.best_candidate(results, returned_addresses, setup_address) is expected
+
+
+def test_ties_pick_first(setup_address):
+    address = dict((k, v) for k, v in setup_address.items() if k != 'guess')
+    results, returned_addresses = random_response(10, 0)
+
+    returned_addresses = [{'city': 'London'} for _ in results]
+
+    assert scoring.best_candidate(results, returned_addresses, address) is results[0]
+
+
+def test_distances_match_vincenty(setup_address):
+    results, _ = random_response(50, 1)
+    results.append(dict(setup_address['guess']))
+
+    expected = [location.distance_geocodes(setup_address['guess'], result) for result in results]
+
+    np.testing.assert_allclose(
+        location.distances_geocodes(setup_address['guess'], results), expected, rtol=0, atol=1e-6
+    )
+
+
+@pytest.mark.benchmark
+def test_benchmark_100_results(setup_address):
+    results, returned_addresses = random_response(100, 2)
+
+    reference = min(timeit.repeat(
+        lambda: reference_best_candidate(results, returned_addresses, setup_address),
+        number=5, repeat=3
+    ))
+    batch = min(timeit.repeat(
+        lambda: scoring.best_candidate(results, copy.deepcopy(returned_addresses), setup_address),
+        number=5, repeat=3
+    ))
+
+    print('rate_result: {:.2f} ms, batch: {:.2f} ms, speed-up: {:.1f}x'.format(
+        reference / 5 * 1000, batch / 5 * 1000, reference / batch
+    ))
+
+    assert batch < reference
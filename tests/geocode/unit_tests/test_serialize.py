@@ -0,0 +1,136 @@
+"""
+Tests the single-pass DynamoDB serializer.
+"""
+import decimal
+import timeit
+import tracemalloc
+
+import pytest
+from boto3.dynamodb.types import Binary, TypeSerializer
+
+from geocode import helpers, main, projection
+
+
+def reference_serialize_item(item):
+    # dynamo_sanitize followed by the serializer of the boto3 resource layer
+    serializer = TypeSerializer()
+
+    return dict((k, serializer.serialize(v)) for k, v in helpers.dynamo_sanitize(item).items())
+
+
+@pytest.fixture
+def setup_result():
+    components = [
+        {'long_name': 'Abbey Road {}'.format(i), 'short_name': 'Abbey Rd', 'types': ['route', 'political']}
+        for i in range(8)
+    ]
+
+    return {
+        'entity': 'accommodation:1',
+        'provider': 'google',
+        'entity_id': 1,
+        'entity_type': 'accommodation',
+        'batch_id': None,
+        'timestamp': 1899600000,
+        'longitude': -0.1779,
+        'latitude': 51.5321,
+        'accuracy': 'ROOFTOP',
+        'confidence': 9,
+        'ok': True,
+        'postal': ' ',
+        'raw': {
+            'address_components': components,
+            'geometry': {
+                'location': {'lat': 51.5321, 'lng': -0.1779},
+                'viewport': {
+                    'northeast': {'lat': 51.5334, 'lng': -0.1765},
+                    'southwest': {'lat': 51.5307, 'lng': -0.1792}
+                }
+            },
+            'types': ('street_address',),
+            1: 'numeric key'
+        },
+        'meta': {
+            'rejected': [],
+            'supplied': ['street', 'city'],
+            'address_out': {'city': 'London', 'country_code': 'GB'},
+            'distance': decimal.Decimal('12.5')
+        },
+        'payload': b'\x1f\x8b'
+    }
+
+
+def test_matches_sanitize_and_resource_serializer(setup_result):
+    assert helpers.serialize_item(setup_result) == reference_serialize_item(setup_result)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('', {'NULL': True}),
+    (set(), {'NULL': True}),
+    (True, {'BOOL': True}),
+    (0.5, {'N': '0.5'}),
+    ({'a', 'b'}, {'SS': ['a', 'b']}),
+    ({1, 2}, {'NS': ['1', '2']}),
+    (Binary(b'x'), {'B': b'x'}),
+    (bytearray(b'x'), {'B': b'x'})
+])
+def test_serialize_value(value, expected):
+    result = helpers.serialize_value(value)
+
+    if 'SS' in result or 'NS' in result:
+        result = dict((k, sorted(v)) for k, v in result.items())
+
+    assert result == expected
+
+
+@pytest.mark.parametrize('value', [float('nan'), float('inf'), object(), {1, 'a'}])
+def test_unsupported_values(value):
+    with pytest.raises(TypeError):
+        helpers.serialize_value(value)
+
+
+def test_client_batch_writer(setup_result, mocker):
+    client = mocker.Mock()
+    client.batch_write_item.return_value = {'UnprocessedItems': {}}
+
+    with helpers.ClientBatchWriterOCC('geocodes', client, overwrite_by_pkeys=('entity', 'provider')) as batch_writer:
+        batch_writer.put_item(Item=dict(setup_result, accuracy='APPROXIMATE'))
+        batch_writer.put_item(Item=setup_result)
+
+    # duplicate keys are written once, the last item wins
+    items = client.batch_write_item.call_args[1]['RequestItems']['geocodes']
+    assert items == [{'PutRequest': {'Item': helpers.serialize_item(setup_result)}}]
+
+
+def test_dynamodb_client_is_shared(mocker):
+    mocker.patch.object(main, 'DYNAMODB', None)
+    client = mocker.patch('boto3.client')
+
+    assert main.dynamodb_client() is main.dynamodb_client()
+    client.assert_called_once_with('dynamodb')
+
+
+@pytest.mark.benchmark
+def test_benchmark_serialize_items(setup_result):
+    items = [projection.project(setup_result, store_payload=True), setup_result] * 50
+
+    reference = min(timeit.repeat(lambda: [reference_serialize_item(i) for i in items], number=5, repeat=3))
+    single_pass = min(timeit.repeat(lambda: [helpers.serialize_item(i) for i in items], number=5, repeat=3))
+
+    def peak(function):
+        # peak memory of serializing the largest item, sanitized copies included
+        tracemalloc.start()
+        function(setup_result)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    reference_peak = peak(reference_serialize_item)
+    single_pass_peak = peak(helpers.serialize_item)
+
+    print('sanitize + serializer: {:.2f} ms, {} B; single pass: {:.2f} ms, {} B'.format(
+        reference / 5 * 1000, reference_peak, single_pass / 5 * 1000, single_pass_peak
+    ))
+
+    assert single_pass < reference
+    assert single_pass_peak < reference_peak
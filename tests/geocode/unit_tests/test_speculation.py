@@ -0,0 +1,63 @@
+"""
+Tests speculative field omission in Geocoder.geocode.
+"""
+import threading
+
+import pytest
+
+from geocode import helpers, providers, ratelimit
+from geocode.providers import base
+
+
+@pytest.fixture
+def setup_service(mocker):
+    mocker.patch.object(base, 'RATE_LIMITER', ratelimit.RateLimiter({}))
+
+    service = providers.Osm()
+    service.calls = []
+    lock = threading.Lock()
+
+    def _geocode(address):
+        with lock:
+            service.calls.append(sorted(address))
+
+        # only addresses without a postal code give results
+        if 'postal_code' in address:
+            raise helpers.NoResultsFoundError(service.name)
+
+        return {'longitude': 0.0, 'latitude': 0.0, 'raw': {}}
+
+    mocker.patch.object(service, '_geocode', side_effect=_geocode)
+
+    return service
+
+
+@pytest.mark.parametrize('speculation', [None, 1, 2, 3])
+def test_speculation_keeps_meta(setup_service, setup_accommodation, speculation):
+    setup_service.speculation = speculation
+
+    result = setup_service.geocode(setup_accommodation)
+
+    # the most complete successful address is used, like in serial mode
+    assert result['meta']['rejected'] == ['country', 'postal_code']
+    assert 'region' in result['meta']['supplied']
+    assert 'postal_code' not in result['meta']['supplied']
+
+
+def test_speculation_budget(setup_service, setup_accommodation, mocker):
+    submit = mocker.spy(base.SPECULATION_POOL, 'submit')
+    setup_service.speculation = 1
+
+    setup_service.geocode(setup_accommodation)
+
+    # one speculative call, the second reduction is sent serially
+    assert submit.call_count == 1
+    assert len(setup_service.calls) == 3
+
+
+def test_speculation_no_results(setup_service, setup_accommodation_incomplete):
+    setup_service.speculation = 3
+    setup_service._geocode.side_effect = helpers.NoResultsFoundError(setup_service.name)
+
+    with pytest.raises(helpers.NoResultsFoundError):
+        setup_service.geocode(setup_accommodation_incomplete)
@@ -0,0 +1,43 @@
+"""
+Tests skipping tasks of later fan-out stages for entities that are consolidated already.
+"""
+import decimal
+
+from geocode import main
+
+
+def test_filter_staged_tasks(mocker):
+    mocker.patch.dict('os.environ', {'TABLE': 'geocodes', 'ENVIRONMENT': 'test'})
+    dynamodb = mocker.patch('boto3.resource').return_value
+    dynamodb.batch_get_item.side_effect = [
+        {
+            'Responses': {'geocodes': [{'entity': 'candidate_accommodation:1', 'score': decimal.Decimal('1.0')}]},
+            'UnprocessedKeys': {'geocodes': {'Keys': [{'entity': 'candidate_accommodation:2'}]}}
+        },
+        {
+            'Responses': {'geocodes': [{'entity': 'candidate_accommodation:2', 'score': decimal.Decimal('0.5')}]}
+        }
+    ]
+
+    tasks = [
+        {'entity_type': 'candidate_accommodation', 'entity_id': 1, 'provider': 'arcgis'},
+        {'entity_type': 'candidate_accommodation', 'entity_id': 1, 'provider': 'osm', 'consolidation_threshold': 1.0},
+        {'entity_type': 'candidate_accommodation', 'entity_id': 2, 'provider': 'osm', 'consolidation_threshold': 1.0},
+        {'entity_type': 'candidate_accommodation', 'entity_id': 3, 'provider': 'osm', 'consolidation_threshold': 1.0}
+    ]
+
+    remaining = main.filter_staged_tasks(tasks)
+
+    assert remaining == [tasks[0], tasks[2], tasks[3]]
+    assert dynamodb.batch_get_item.call_args_list[0][1]['RequestItems']['geocodes']['Keys'][0] == {
+        'entity': 'candidate_accommodation:1',
+        'provider': 'consolidated_test'
+    }
+
+
+def test_unstaged_tasks_are_not_looked_up(mocker):
+    resource = mocker.patch('boto3.resource')
+    tasks = [{'entity_type': 'accommodation', 'entity_id': 1, 'provider': 'osm'}]
+
+    assert main.filter_staged_tasks(tasks) == tasks
+    assert not resource.called
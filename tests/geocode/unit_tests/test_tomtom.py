@@ -74,9 +74,11 @@ def test_tomtom_call(setup_accommodation, setup_key, setup_response, mocker):
             setup_accommodation.city,
             setup_accommodation.region
         ]),
-        maxRows=100,
+        maxRows=10,
         countrySet=setup_accommodation.country_code,
-        key=setup_key['key']
+        key=setup_key['key'],
+        session=service.session,
+        timeout=service.timeout
     )
 
 
@@ -99,9 +101,11 @@ def test_tomtom_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.city,
                 setup_accommodation.region
             ]),
-            maxRows=100,
+            maxRows=10,
             countrySet=setup_accommodation.country_code,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -110,9 +114,11 @@ def test_tomtom_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.city,
                 setup_accommodation.region
             ]),
-            maxRows=100,
+            maxRows=10,
             countrySet=setup_accommodation.country_code,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
@@ -120,18 +126,22 @@ def test_tomtom_iterative_addresses(setup_accommodation, setup_key, mocker):
                 setup_accommodation.city,
                 setup_accommodation.region
             ]),
-            maxRows=100,
+            maxRows=10,
             countrySet=setup_accommodation.country_code,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         ),
         mocker.call(
             ', '.join([
                 setup_accommodation.street,
                 setup_accommodation.city,
             ]),
-            maxRows=100,
+            maxRows=10,
             countrySet=setup_accommodation.country_code,
-            key=setup_key['key']
+            key=setup_key['key'],
+            session=service.session,
+            timeout=service.timeout
         )
     ]
 
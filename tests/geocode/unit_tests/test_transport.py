@@ -0,0 +1,114 @@
+"""
+Tests the shared keep-alive transport of the synchronous provider path.
+"""
+import time
+
+import pytest
+
+from geocode import helpers, providers, ratelimit, stub, transport
+
+
+@pytest.fixture
+def stub_server():
+    with stub.StubServer() as server:
+        yield server
+
+
+@pytest.fixture
+def session_pool():
+    session_pool = transport.SessionPool(pool_size=2, retries=2)
+
+    yield session_pool
+
+    session_pool.close()
+
+
+def test_connections_are_reused(stub_server, session_pool):
+    stub_server.respond('/search', [])
+    session = session_pool.session()
+
+    for _ in range(5):
+        assert session.get(stub_server.url('/search')).status_code == 200
+
+    assert session_pool.statistics() == {
+        '127.0.0.1': {'requests': 5, 'connections': 1, 'reused': 4}
+    }
+
+
+def test_gateway_errors_are_retried(stub_server, session_pool):
+    stub_server.respond('/search', {}, status=503)
+
+    response = session_pool.session().get(stub_server.url('/search'))
+
+    # the last response is returned to the provider once retries are exhausted
+    assert response.status_code == 503
+    assert len(stub_server.requests) == 3
+
+
+def test_pool_per_provider_host(session_pool):
+    session = session_pool.session('osm', 3)
+
+    assert session is session_pool.session('here')
+    assert session_pool.adapters['https://nominatim.openstreetmap.org/']._pool_maxsize == 3
+    assert session.get_adapter('https://nominatim.openstreetmap.org/search') is \
+        session_pool.adapters['https://nominatim.openstreetmap.org/']
+
+
+def test_providers_share_session():
+    assert providers.Osm().session is providers.Google().session is transport.SESSIONS.session()
+
+
+@pytest.fixture
+def setup_payload():
+    return [
+        {
+            'lat': '51.532',
+            'lon': '-0.177',
+            'display_name': '3 Abbey Road, London',
+            'address': {
+                'road': 'Abbey Road',
+                'house_number': '3',
+                'city': 'London',
+                'country_code': 'gb'
+            }
+        }
+    ]
+
+
+def test_provider_through_stub(stub_server, setup_accommodation, setup_payload, mocker):
+    mocker.patch.object(providers.base, 'RATE_LIMITER', ratelimit.RateLimiter({}))
+    stub_server.respond('/search', setup_payload)
+
+    service = providers.Osm()
+    service.endpoint = stub_server.url('/search')
+
+    result = service.geocode(setup_accommodation)
+
+    assert result['latitude'] == 51.532
+    assert result['longitude'] == -0.177
+    assert result['meta']['address_out']['street'] == 'Abbey Road'
+    assert len(stub_server.requests) == 1
+
+    # errors are mapped as for the real API
+    stub_server.respond('/search', [])
+
+    with pytest.raises(helpers.NoResultsFoundError):
+        service.geocode(setup_accommodation)
+
+
+def test_requests_time_out(stub_server, setup_accommodation, setup_payload, mocker):
+    mocker.patch.object(providers.base, 'RATE_LIMITER', ratelimit.RateLimiter({}))
+    stub_server.respond('/search', setup_payload, delay=1.0)
+
+    service = providers.Osm()
+    assert service.timeout == providers.base.CONFIG['osm']['timeout']
+
+    service.endpoint = stub_server.url('/search')
+    service.timeout = 0.1
+    service.nr_of_retries = 0
+
+    start = time.monotonic()
+    with pytest.raises(helpers.GeocoderError):
+        service.geocode(setup_accommodation)
+
+    assert time.monotonic() - start < 1.0
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from router import planner
+
+
+@pytest.fixture
+def ruleset():
+    with open('data/geocoders-ruleset-20180823.json') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def addresses():
+    return [
+        {
+            'entity_id': 1,
+            'entity_type': 'candidate_accommodation',
+            'batch_id': 'a',
+            'address': {'street': 'Abbey Road', 'city': 'London', 'country_code': 'GB'}
+        },
+        {
+            'entity_id': 2,
+            'entity_type': 'candidate_accommodation',
+            'batch_id': 'a',
+            'address': {'street': 'Hauptstrasse', 'city': 'Berlin', 'country_code': 'DE'}
+        }
+    ]
+
+
+class TestPlanner:
+    providers = ('google', 'osm', 'arcgis', 'tomtom')
+
+    def test_compute_win_rates(self):
+        consolidations = [
+            {'provider': 'arcgis', 'country_code': 'GB', 'score': 1.0},
+            {'provider': 'arcgis', 'country_code': 'GB', 'score': 1.0},
+            {'provider': 'osm', 'country_code': 'GB', 'score': 1.0},
+            {'provider': 'trivago', 'country_code': 'GB', 'score': 0.0},
+            {'provider': 'google', 'country_code': 'DE', 'score': 1.0}
+        ]
+
+        win_rates = planner.compute_win_rates(consolidations)
+
+        assert win_rates['GB'] == {'arcgis': 0.5, 'osm': 0.25}
+        assert win_rates['DE'] == {'google': 1.0}
+        assert win_rates[planner.ALL_COUNTRIES]['arcgis'] == 0.4
+
+    def test_ruleset_order(self, ruleset):
+        fan_out = planner.FanOutPlanner(ruleset, {}, self.providers)
+
+        assert fan_out.ruleset_order('GB') == ['arcgis', 'osm', 'tomtom', 'google']
+        assert fan_out.stages('GB') == [['arcgis'], ['osm', 'tomtom', 'google']]
+
+    def test_stages_by_win_rate(self, ruleset):
+        win_rates = {
+            'GB': {'google': 0.5, 'osm': 0.35, 'arcgis': 0.1},
+            'ALL': {'arcgis': 0.9}
+        }
+        fan_out = planner.FanOutPlanner(ruleset, win_rates, self.providers)
+
+        assert fan_out.stages('GB') == [['google', 'osm'], ['arcgis', 'tomtom']]
+        assert fan_out.stages('DE') == [['arcgis'], ['osm', 'tomtom', 'google']]
+
+    def test_plan(self, ruleset, addresses):
+        fan_out = planner.FanOutPlanner(ruleset, {'GB': {'osm': 0.9}}, self.providers)
+
+        plan = fan_out.plan(addresses)
+
+        assert [delay for delay, _ in plan] == [0, planner.STAGE_DELAY]
+        assert [(task['entity_id'], task['provider']) for task in plan[0][1]] == [(1, 'osm'), (2, 'arcgis')]
+        assert len(plan[1][1]) == 6
+        assert all(task['consolidation_threshold'] == planner.SCORE_THRESHOLD for task in plan[1][1])
+        assert all('consolidation_threshold' not in task for task in plan[0][1])
+
+        # one provider call per candidate instead of four, until the consolidation falls short
+        assert len(plan[0][1]) == len(addresses)
+
+    def test_city_only_candidates_are_geocoded_locally(self, ruleset):
+        fan_out = planner.FanOutPlanner(ruleset, {}, self.providers)
+        address = {
+            'entity_id': 3,
+            'entity_type': 'candidate_accommodation',
+            'batch_id': 'a',
+            'address': {'city': 'London', 'region': 'England', 'country_code': 'GB'}
+        }
+
+        plan = fan_out.plan([address])
+
+        assert plan == [
+            (0, [{
+                'entity_id': 3,
+                'entity_type': 'candidate_accommodation',
+                'batch_id': 'a',
+                'address': {'city': 'London', 'country_code': 'GB'},
+                'provider': 'local'
+            }]),
+            # the top provider follows in case the local geocoder misses the city
+            (fan_out.stage_delay, [dict(
+                address,
+                provider=fan_out.stages('GB')[0][0],
+                consolidation_threshold=planner.SCORE_THRESHOLD
+            )])
+        ]
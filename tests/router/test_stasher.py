@@ -1,4 +1,6 @@
+import ast
 import json
+import pathlib
 
 from botocore.stub import Stubber
 
@@ -62,3 +64,64 @@ class TestStasher:
 
             #TODO: fails even though responses are triggered
             #stubber.assert_no_pending_responses()
+
+    def test_serialize_item(self):
+        item = {
+            'entity': 'candidate_accommodation:1',
+            'provider': 'trivago',
+            'longitude': 13.4,
+            'batch_id': '',
+            'meta': {'city': 'Berlin', 'tags': {'a'}, 'empty': set()}
+        }
+
+        assert stasher.serialize_item(item) == {
+            'entity': {'S': 'candidate_accommodation:1'},
+            'provider': {'S': 'trivago'},
+            'longitude': {'N': '13.4'},
+            'batch_id': {'NULL': True},
+            'meta': {'M': {'city': {'S': 'Berlin'}, 'tags': {'SS': ['a']}, 'empty': {'NULL': True}}}
+        }
+
+    def test_client_batch_writer(self):
+        data_stasher = stasher.Stasher()
+        item = {'entity': 'candidate_accommodation:1', 'provider': 'trivago', 'longitude': 13.4}
+
+        stubber = Stubber(data_stasher.client_dynamodb)
+        stubber.add_response(
+            'batch_write_item',
+            service_response={'UnprocessedItems': {}},
+            expected_params={
+                'RequestItems': {
+                    'geocodes': [{'PutRequest': {'Item': stasher.serialize_item(item)}}]
+                }
+            }
+        )
+
+        with stubber:
+            with stasher.ClientBatchWriterOCC('geocodes', data_stasher.client_dynamodb) as batch_writer:
+                batch_writer.put_item(Item=item)
+
+            stubber.assert_no_pending_responses()
+
+
+class TestSerializerCopies:
+    SHARED = ('serialize_number', 'serialize_value', 'serialize_item', 'ClientBatchWriterOCC')
+
+    @staticmethod
+    def definitions(path):
+        source = path.read_text()
+
+        return dict(
+            (node.name, ast.get_source_segment(source, node)) for node in ast.parse(source).body
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef))
+        )
+
+    def test_copies_are_identical(self):
+        # each Lambda package only ships its own source folder, so the geocoder keeps a copy
+        src = pathlib.Path(__file__).resolve().parents[2] / 'src'
+
+        router = self.definitions(src / 'router' / 'utils' / 'stasher.py')
+        geocode = self.definitions(src / 'geocode' / 'helpers.py')
+
+        for name in self.SHARED:
+            assert router[name] == geocode[name], name
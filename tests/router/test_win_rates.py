@@ -0,0 +1,33 @@
+import decimal
+import json
+
+from router import planner, win_rates
+
+
+class TestWinRates:
+    def test_consolidations(self):
+        items = [
+            {'score': decimal.Decimal('1'), 'meta': {'country_code': 'GB', 'provider': 'arcgis'}},
+            {'score': decimal.Decimal('0.5'), 'meta': {'country_code': 'GB', 'provider': 'osm'}},
+            # consolidated by the router, never geocoded
+            {'score': decimal.Decimal('1'), 'meta': {'country_code': 'GB'}}
+        ]
+
+        assert list(win_rates.consolidations(items)) == [
+            {'provider': 'arcgis', 'country_code': 'GB', 'score': decimal.Decimal('1')},
+            {'provider': 'osm', 'country_code': 'GB', 'score': decimal.Decimal('0.5')}
+        ]
+
+    def test_write_win_rates(self, tmp_path):
+        items = [
+            {'score': decimal.Decimal('1'), 'meta': {'country_code': 'DE', 'provider': 'google'}},
+            {'score': decimal.Decimal('0.4'), 'meta': {'country_code': 'DE', 'provider': 'osm'}}
+        ]
+
+        win_rates.write_win_rates(items, str(tmp_path / 'provider-win-rates.json'))
+
+        with open(tmp_path / 'provider-win-rates.json') as f:
+            rates = json.load(f)
+
+        assert rates['DE'] == {'google': 0.5}
+        assert rates[planner.ALL_COUNTRIES] == {'google': 0.5}